@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import json
+import zipfile
 from pathlib import Path
 from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.orm import Session
@@ -12,8 +13,12 @@ from sqlalchemy.orm import Session
 from app.config import settings
 from app.db import get_db
 from app.models import Person, ReferenceImage
-from app.services.matcher import Matcher
-from app.services.storage import build_abs_path, save_upload, to_relative_path
+from app.services.ann_index import IvfGallery, gallery_index_store, measure_recall, synthetic_queries
+from app.services.gallery import embedding_to_bytes
+from app.services.gallery_cache import gallery_cache
+from app.services.model_registry import registry
+from app.services.reference_ingest import BulkItem, ingest_references, read_limited, read_zip_archive
+from app.services.storage import build_abs_path, file_sha256, save_upload, to_relative_path
 
 router = APIRouter(prefix="/references", tags=["references"])
 
@@ -47,6 +52,32 @@ class ReferenceCreateOut(BaseModel):
     metadata: Optional[dict[str, Any]]
 
 
+class BulkItemOut(BaseModel):
+    index: int
+    name: str
+    filename: str
+    status: str
+    person_id: Optional[int]
+    image_id: Optional[int]
+
+
+class BulkReferenceOut(BaseModel):
+    ok: int
+    no_face: int
+    duplicate: int
+    invalid: int
+    items: list[BulkItemOut]
+
+
+class AnnIndexOut(BaseModel):
+    enabled: bool
+    rows: int
+    min_rows: int
+    training: bool = False
+    info: Optional[dict[str, Any]] = None
+    measured: Optional[dict[str, Any]] = None
+
+
 @router.post("", response_model=ReferenceCreateOut)
 def create_reference(
     name: str = Form(...),
@@ -68,24 +99,26 @@ def create_reference(
     saved_path = save_upload(file, target_dir)
     relative_path = to_relative_path(Path(settings.data_dir), saved_path)
 
-    matcher = Matcher()
-    if not matcher.available:
-        saved_path.unlink(missing_ok=True)
-        raise HTTPException(status_code=503, detail="face model is not available")
+    with registry.checkout_matcher() as matcher:
+        if not matcher.available:
+            saved_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=503, detail="face model is not available")
 
-    embedding = matcher.extract_embedding_from_image_path(str(saved_path))
+        embedding = matcher.extract_embedding_from_image_path(str(saved_path))
     if embedding is None:
         saved_path.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail="no face detected in reference image")
-    embedding_json = json.dumps(embedding.tolist())
 
     image = ReferenceImage(
         person_id=person.id,
         image_path=relative_path,
-        embedding_json=embedding_json,
+        embedding=embedding_to_bytes(embedding),
+        ann_list=gallery_index_store.assign(embedding),
+        content_sha256=file_sha256(saved_path),
     )
     db.add(image)
     db.commit()
+    gallery_cache.invalidate()
 
     return ReferenceCreateOut(
         person_id=person.id,
@@ -114,6 +147,83 @@ def list_references(db: Session = Depends(get_db)) -> list[PersonOut]:
     return response
 
 
+@router.post("/bulk", response_model=BulkReferenceOut)
+def create_references_bulk(
+    archive: Optional[UploadFile] = File(None),
+    files: Optional[list[UploadFile]] = File(None),
+    names: Optional[list[str]] = Form(None),
+    metadata: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+) -> BulkReferenceOut:
+    # Either a zip archive (`<name>/<image>` entries, optional metadata.json) or a multipart batch of
+    # `files` with one `names` value per file (defaulting to the file name without extension).
+    if (archive is None) == (not files):
+        raise HTTPException(status_code=400, detail="send either an archive or files")
+    metadata_dict = parse_metadata(metadata) or {}
+    if not isinstance(metadata_dict, dict):
+        raise HTTPException(status_code=400, detail="metadata must map person names to objects")
+
+    if archive is not None:
+        try:
+            items, archive_metadata = read_zip_archive(archive.file)
+        except (zipfile.BadZipFile, ValueError) as exc:
+            raise HTTPException(status_code=400, detail=f"invalid archive: {exc}") from exc
+        metadata_dict = {**archive_metadata, **metadata_dict}
+    else:
+        if names is not None and len(names) != len(files):
+            raise HTTPException(status_code=400, detail="names must have one entry per file")
+        items = (
+            BulkItem(
+                index,
+                names[index] if names is not None else Path(upload.filename or "").stem,
+                upload.filename or "",
+                read_limited(upload.file),
+            )
+            for index, upload in enumerate(files)
+        )
+
+    try:
+        results = ingest_references(db, items, metadata_dict)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    finally:
+        gallery_cache.invalidate()
+
+    counts = {status: 0 for status in ("ok", "no_face", "duplicate", "invalid")}
+    for result in results:
+        counts[result.status] += 1
+    return BulkReferenceOut(**counts, items=[BulkItemOut(**vars(result)) for result in results])
+
+
+@router.get("/ann", response_model=AnnIndexOut)
+def get_ann_index(
+    measure: bool = Query(False),
+    nprobe: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+) -> AnnIndexOut:
+    gallery = gallery_cache.get(db, ann=True)
+    if not isinstance(gallery, IvfGallery):
+        return AnnIndexOut(
+            enabled=False,
+            rows=len(gallery),
+            min_rows=settings.ann_min_rows,
+            training=gallery_cache.training,
+        )
+
+    measured = None
+    if measure:
+        # recall@1 against an exact scan, on gallery rows perturbed to look like video faces.
+        probe = gallery.with_nprobe(nprobe) if nprobe is not None else gallery
+        measured = measure_recall(probe, synthetic_queries(gallery.matrix, 256))
+    return AnnIndexOut(
+        enabled=True,
+        rows=len(gallery),
+        min_rows=settings.ann_min_rows,
+        info=gallery_index_store.info(),
+        measured=measured,
+    )
+
+
 @router.get("/{person_id}", response_model=PersonOut)
 def get_reference(person_id: int, db: Session = Depends(get_db)) -> PersonOut:
     person = db.get(Person, person_id)
@@ -144,4 +254,5 @@ def delete_reference(person_id: int, db: Session = Depends(get_db)) -> dict:
 
     db.delete(person)
     db.commit()
+    gallery_cache.invalidate()
     return {"deleted": True}
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.video import SSE_KEEPALIVE_SEC, ProcessParams, sse_event, validate_process_params
+from app.config import settings
+from app.db import SessionLocal, get_db
+from app.models import VideoStream
+from app.services.events import event_bus
+from app.services.streams import (
+    STREAM_SCHEMES,
+    STREAM_TERMINAL_STATUSES,
+    StreamLimitReached,
+    is_file_source,
+    resolve_stream_source,
+    stream_manager,
+)
+
+router = APIRouter(prefix="/streams", tags=["streams"])
+
+STREAM_PARAMS = (
+    "min_confidence",
+    "frame_interval_sec",
+    "use_yolo",
+    "use_tracking",
+    "yolo_confidence",
+    "yolo_iou",
+    "detect_max_side",
+    "face_det_size",
+    "use_ann",
+)
+
+
+class StreamIn(BaseModel):
+    source: str
+    loop: bool = False
+    max_latency_sec: Optional[float] = None
+    min_confidence: float = 0.6
+    frame_interval_sec: float = 1.0
+    use_yolo: bool = True
+    use_tracking: bool = False
+    yolo_confidence: float = settings.yolo_confidence
+    yolo_iou: float = settings.yolo_iou
+    detect_max_side: Optional[int] = None
+    face_det_size: Optional[int] = None
+    use_ann: bool = False
+
+
+class StreamOut(BaseModel):
+    stream_id: str
+    status: str
+    source: str
+    params: dict[str, Any]
+    stats: Optional[dict[str, Any]]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+
+@router.post("", response_model=StreamOut, status_code=202)
+def start_stream(body: StreamIn) -> StreamOut:
+    # source is an RTSP/HTTP/... URL, or a file or named pipe under the data directory.
+    if stream_manager.running >= stream_manager.max_streams:
+        raise HTTPException(status_code=429, detail="too many live streams running")
+    params = validate_process_params(ProcessParams(**body.model_dump(include=set(STREAM_PARAMS))))
+    params = {name: params[name] for name in STREAM_PARAMS}
+    if body.max_latency_sec is not None and body.max_latency_sec <= 0:
+        raise HTTPException(status_code=400, detail="max_latency_sec must be > 0")
+    source = stream_source(body.source)
+    if body.loop and not is_file_source(resolve_stream_source(source)):
+        raise HTTPException(status_code=400, detail="loop is only supported for file sources")
+    params.update(loop=body.loop, max_latency_sec=body.max_latency_sec)
+    try:
+        stream = stream_manager.submit(source, params)
+    except StreamLimitReached as exc:
+        raise HTTPException(status_code=429, detail="too many live streams running") from exc
+    return stream_out(stream)
+
+
+def stream_source(source: str) -> str:
+    scheme = urlparse(source).scheme.lower()
+    if scheme in STREAM_SCHEMES:
+        return source
+    if scheme:
+        raise HTTPException(status_code=400, detail=f"source scheme must be one of {', '.join(STREAM_SCHEMES)}")
+    root = Path(settings.data_dir).resolve()
+    target = (root / source).resolve()
+    if not target.is_relative_to(root):
+        raise HTTPException(status_code=400, detail="source must be inside the data directory")
+    if not target.exists():
+        raise HTTPException(status_code=404, detail="source not found")
+    return str(target.relative_to(root))
+
+
+@router.get("", response_model=list[StreamOut])
+def list_streams(
+    status: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+) -> list[StreamOut]:
+    query = select(VideoStream).order_by(VideoStream.created_at.desc()).limit(limit)
+    if status is not None:
+        query = query.where(VideoStream.status == status)
+    return [stream_out(stream) for stream in db.execute(query).scalars()]
+
+
+@router.get("/{stream_id}", response_model=StreamOut)
+def get_stream(stream_id: str, db: Session = Depends(get_db)) -> StreamOut:
+    stream = db.get(VideoStream, stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="stream not found")
+    return stream_out(stream)
+
+
+@router.post("/{stream_id}/stop", response_model=StreamOut)
+def stop_stream(stream_id: str) -> StreamOut:
+    stream = stream_manager.stop(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="stream not found")
+    return stream_out(stream)
+
+
+@router.get("/{stream_id}/events")
+async def stream_live_events(stream_id: str) -> StreamingResponse:
+    queue = event_bus.subscribe(stream_id)
+    stream = await run_in_threadpool(_load_stream, stream_id)
+    if stream is None:
+        event_bus.unsubscribe(stream_id, queue)
+        raise HTTPException(status_code=404, detail="stream not found")
+    return StreamingResponse(
+        live_event_stream(stream, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def live_event_stream(stream: VideoStream, queue: asyncio.Queue) -> AsyncIterator[str]:
+    try:
+        if stream.status in STREAM_TERMINAL_STATUSES:
+            yield sse_event("status", {"status": stream.status, "error": stream.error})
+            return
+
+        yield sse_event("status", {"status": stream.status, "error": None})
+        while True:
+            try:
+                kind, data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_event(kind, data)
+            if kind == "status" and data["status"] in STREAM_TERMINAL_STATUSES:
+                return
+    finally:
+        event_bus.unsubscribe(stream.id, queue)
+
+
+def _load_stream(stream_id: str) -> Optional[VideoStream]:
+    with SessionLocal() as db:
+        stream = db.get(VideoStream, stream_id)
+        if stream is not None:
+            db.expunge(stream)
+        return stream
+
+
+def stream_out(stream: VideoStream) -> StreamOut:
+    # Running streams report live counters; finished ones the counters saved when they ended.
+    stats = stream_manager.counters(stream.id)
+    if stats is None and stream.stats_json:
+        stats = json.loads(stream.stats_json)
+    return StreamOut(
+        stream_id=stream.id,
+        status=stream.status,
+        source=stream.source,
+        params=json.loads(stream.params_json),
+        stats=stats,
+        error=stream.error,
+        created_at=stream.created_at,
+        started_at=stream.started_at,
+        finished_at=stream.finished_at,
+    )
@@ -1,22 +1,45 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+from datetime import datetime
 from pathlib import Path
+from typing import Annotated, Any, AsyncIterator, Optional
+from uuid import uuid4
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.db import get_db
-from app.models import Person, ReferenceImage
+from app.db import SessionLocal, get_db
+from app.models import Person, VideoBatch, VideoJob
+from app.services.batch_jobs import BatchQueueFull, batch_manager
 from app.services.csv_writer import write_results_csv
-from app.services.storage import save_upload, to_relative_path
-from app.services.video_processor import process_video
+from app.services.events import TERMINAL_STATUSES, event_bus
+from app.services.face_index import search_face_indexes
+from app.services.gallery_cache import gallery_cache
+from app.services.ingest import LiveUpload, ingest_stream
+from app.services.jobs import JobQueueFull, job_manager
+from app.services.result_cache import process_video_cached
+from app.services.storage import (
+    build_abs_path,
+    new_upload_path,
+    save_upload_deduplicated,
+    store_by_hash,
+    to_relative_path,
+)
+from app.services.timeline import TIMELINE_FORMATS, parquet_available, timeline_suffix
+from app.services.video_processor import ProcessingStats
 
 router = APIRouter(prefix="/videos", tags=["videos"])
 
+SSE_KEEPALIVE_SEC = 15.0
+VIDEO_SUFFIXES = {".mp4", ".m4v", ".mov", ".mkv", ".webm", ".avi", ".mpg", ".mpeg", ".ts", ".wmv"}
+
 
 class ResultItem(BaseModel):
     name: str
@@ -28,18 +51,139 @@ class ProcessResponse(BaseModel):
     results: list[ResultItem]
     csv_path: str
     video_path: str
+    timeline_path: Optional[str] = None
+    stats: Optional[dict[str, Any]] = None
 
 
-@router.post("/process", response_model=ProcessResponse)
-def process_video_api(
-    file: UploadFile = File(...),
+class JobOut(BaseModel):
+    job_id: str
+    status: str
+    frames_done: int
+    frames_total: int
+    video_path: str
+    video_sha256: Optional[str]
+    results: Optional[list[ResultItem]]
+    csv_path: Optional[str]
+    timeline_path: Optional[str]
+    stats: Optional[dict[str, Any]]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+
+class BatchItemOut(BaseModel):
+    video_path: str
+    video_sha256: Optional[str]
+    status: str
+    results: Optional[list[ResultItem]]
+    stats: Optional[dict[str, Any]]
+    error: Optional[str]
+
+
+class BatchOut(BaseModel):
+    batch_id: str
+    status: str
+    videos_total: int
+    videos_done: int
+    csv_path: Optional[str]
+    parquet_path: Optional[str]
+    stats: Optional[dict[str, Any]]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    items: list[BatchItemOut]
+
+
+class IndexMatch(BaseModel):
+    video_sha256: str
+    video_path: Optional[str]
+    name: str
+    confidence: float
+    first_seen_sec: float
+    matches: int
+
+
+class ProcessParams(BaseModel):
+    min_confidence: float = 0.6
+    frame_interval_sec: float = 1.0
+    use_yolo: bool = True
+    use_tracking: bool = False
+    motion_gate: bool = False
+    yolo_confidence: float = settings.yolo_confidence
+    yolo_iou: float = settings.yolo_iou
+    segment_workers: int = 1
+    shared_decode: bool = False
+    pipelined: bool = False
+    yolo_batch_size: int = settings.yolo_batch_size
+    adaptive: bool = False
+    idle_tail_sec: Optional[float] = None
+    detect_max_side: Optional[int] = None
+    face_det_size: Optional[int] = None
+    index_faces: bool = False
+    use_ann: bool = False
+    timeline: bool = False
+    timeline_format: str = "parquet"
+
+
+def process_params(
     min_confidence: float = Form(0.6),
     frame_interval_sec: float = Form(1.0),
     use_yolo: bool = Form(True),
+    use_tracking: bool = Form(False),
+    motion_gate: bool = Form(False),
     yolo_confidence: float = Form(settings.yolo_confidence),
     yolo_iou: float = Form(settings.yolo_iou),
-    db: Session = Depends(get_db),
-) -> ProcessResponse:
+    segment_workers: int = Form(1),
+    shared_decode: bool = Form(False),
+    pipelined: bool = Form(False),
+    yolo_batch_size: int = Form(settings.yolo_batch_size),
+    adaptive: bool = Form(False),
+    idle_tail_sec: Optional[float] = Form(None),
+    detect_max_side: Optional[int] = Form(None),
+    face_det_size: Optional[int] = Form(None),
+    index_faces: bool = Form(False),
+    use_ann: bool = Form(False),
+    timeline: bool = Form(False),
+    timeline_format: str = Form("parquet"),
+) -> dict:
+    return validate_process_params(
+        ProcessParams(
+            min_confidence=min_confidence,
+            frame_interval_sec=frame_interval_sec,
+            use_yolo=use_yolo,
+            use_tracking=use_tracking,
+            motion_gate=motion_gate,
+            yolo_confidence=yolo_confidence,
+            yolo_iou=yolo_iou,
+            segment_workers=segment_workers,
+            shared_decode=shared_decode,
+            pipelined=pipelined,
+            yolo_batch_size=yolo_batch_size,
+            adaptive=adaptive,
+            idle_tail_sec=idle_tail_sec,
+            detect_max_side=detect_max_side,
+            face_det_size=face_det_size,
+            index_faces=index_faces,
+            use_ann=use_ann,
+            timeline=timeline,
+            timeline_format=timeline_format,
+        )
+    )
+
+
+def stream_params(query: Annotated[ProcessParams, Query()]) -> dict:
+    return validate_process_params(query)
+
+
+def validate_process_params(params: ProcessParams) -> dict:
+    min_confidence = params.min_confidence
+    frame_interval_sec = params.frame_interval_sec
+    yolo_confidence = params.yolo_confidence
+    yolo_iou = params.yolo_iou
+    segment_workers = params.segment_workers
+    yolo_batch_size = params.yolo_batch_size
     if min_confidence < 0 or min_confidence > 1:
         raise HTTPException(status_code=400, detail="min_confidence must be between 0 and 1")
     if frame_interval_sec <= 0:
@@ -48,44 +192,414 @@ def process_video_api(
         raise HTTPException(status_code=400, detail="yolo_confidence must be between 0 and 1")
     if yolo_iou < 0 or yolo_iou > 1:
         raise HTTPException(status_code=400, detail="yolo_iou must be between 0 and 1")
+    if segment_workers < 1 or segment_workers > settings.segment_workers:
+        raise HTTPException(
+            status_code=400,
+            detail=f"segment_workers must be between 1 and {settings.segment_workers}",
+        )
+    if yolo_batch_size < 1 or yolo_batch_size > 64:
+        raise HTTPException(status_code=400, detail="yolo_batch_size must be between 1 and 64")
+    if params.shared_decode and segment_workers == 1:
+        raise HTTPException(status_code=400, detail="shared_decode requires segment_workers > 1")
+    if params.adaptive and segment_workers > 1:
+        raise HTTPException(status_code=400, detail="adaptive mode requires segment_workers=1")
+    if params.idle_tail_sec is not None and params.idle_tail_sec <= 0:
+        raise HTTPException(status_code=400, detail="idle_tail_sec must be > 0")
+    if params.detect_max_side not in (None, 0) and not 160 <= params.detect_max_side <= 4096:
+        raise HTTPException(status_code=400, detail="detect_max_side must be 0 or between 160 and 4096")
+    if params.face_det_size is not None and (
+        not 160 <= params.face_det_size <= 1280 or params.face_det_size % 32
+    ):
+        raise HTTPException(status_code=400, detail="face_det_size must be a multiple of 32 between 160 and 1280")
+    if params.index_faces and params.adaptive:
+        raise HTTPException(status_code=400, detail="index_faces requires adaptive=false")
+    if params.timeline_format not in TIMELINE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"timeline_format must be one of {', '.join(TIMELINE_FORMATS)}")
+    if params.timeline and (params.adaptive or segment_workers > 1):
+        raise HTTPException(status_code=400, detail="timeline requires adaptive=false and segment_workers=1")
+    if params.timeline and params.timeline_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet timelines need pyarrow; use timeline_format=jsonl")
+    return params.model_dump()
 
+
+@router.post("/process", response_model=ProcessResponse)
+def process_video_api(
+    file: UploadFile = File(...),
+    params: dict = Depends(process_params),
+    db: Session = Depends(get_db),
+) -> ProcessResponse:
     data_dir = Path(settings.data_dir)
     video_dir = data_dir / "videos"
-    video_path = save_upload(file, video_dir)
+    video_path, video_sha256 = save_upload_deduplicated(file, video_dir)
     video_rel = to_relative_path(data_dir, video_path)
 
-    reference_items: list[dict] = []
-    images = db.execute(select(ReferenceImage, Person).join(Person)).all()
-    for image, person in images:
-        embedding = json.loads(image.embedding_json) if image.embedding_json else None
-        reference_items.append(
-            {
-                "name": person.name,
-                "embedding": embedding,
-                "image_path": data_dir / image.image_path,
-            }
-        )
+    gallery = gallery_cache.get(db, ann=params["use_ann"])
+    stats = ProcessingStats()
+    result_dir = data_dir / "results"
+    result_id = uuid4().hex
+    timeline_path = result_dir / f"{result_id}{timeline_suffix(params['timeline_format'])}"
+    if not params["timeline"]:
+        timeline_path = None
 
     try:
-        results = process_video(
+        results = process_video_cached(
             video_path,
-            reference_items,
-            min_confidence=min_confidence,
-            frame_interval_sec=frame_interval_sec,
-            use_yolo=use_yolo,
-            yolo_confidence=yolo_confidence,
-            yolo_iou=yolo_iou,
+            video_sha256,
+            gallery,
+            params,
+            stats=stats,
+            timeline_path=timeline_path,
         )
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
 
-    result_dir = data_dir / "results"
     result_dir.mkdir(parents=True, exist_ok=True)
-    csv_path = result_dir / f"{video_path.stem}.csv"
-    write_results_csv(csv_path, results)
+    csv_path = result_dir / f"{result_id}.csv"
+    stats.add_time("csv", write_results_csv(csv_path, results))
 
     return ProcessResponse(
         results=[ResultItem(**item) for item in results],
         csv_path=to_relative_path(data_dir, csv_path),
         video_path=video_rel,
+        timeline_path=to_relative_path(data_dir, timeline_path)
+        if timeline_path is not None and timeline_path.exists()
+        else None,
+        stats=stats.as_dict(),
+    )
+
+
+@router.post("/jobs", response_model=JobOut, status_code=202)
+def submit_video_job(
+    file: UploadFile = File(...),
+    params: dict = Depends(process_params),
+) -> JobOut:
+    if job_manager.pending >= job_manager.max_pending:
+        raise HTTPException(status_code=429, detail="too many video jobs in progress")
+
+    data_dir = Path(settings.data_dir)
+    video_path, video_sha256 = save_upload_deduplicated(file, data_dir / "videos")
+    try:
+        job = job_manager.submit(to_relative_path(data_dir, video_path), params, video_sha256=video_sha256)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail="too many video jobs in progress") from exc
+    return job_out(job)
+
+
+@router.post("/jobs/stream", response_model=JobOut, status_code=202)
+async def submit_streamed_video_job(
+    request: Request,
+    params: dict = Depends(stream_params),
+    filename: str = Query("upload.mp4"),
+    overlap: bool = Query(False),
+    job_id: Optional[str] = Query(None, pattern="^[0-9a-f]{32}$"),
+) -> JobOut:
+    # The raw request body is the video; it is hashed and written to data/videos in a single pass.
+    if job_manager.pending >= job_manager.max_pending:
+        raise HTTPException(status_code=429, detail="too many video jobs in progress")
+    if overlap and not hasattr(os, "mkfifo"):
+        raise HTTPException(status_code=400, detail="overlap is not supported on this platform")
+    if overlap and (params["adaptive"] or params["segment_workers"] > 1 or params["index_faces"]):
+        raise HTTPException(
+            status_code=400,
+            detail="overlap requires adaptive=false, segment_workers=1 and index_faces=false",
+        )
+
+    data_dir = Path(settings.data_dir)
+    video_dir = data_dir / "videos"
+
+    if not overlap:
+        partial_path = new_upload_path(video_dir, "upload.part")
+        video_sha256, size = await ingest_stream(request.stream(), partial_path)
+        if not size:
+            partial_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail="empty upload")
+        video_rel = to_relative_path(data_dir, store_by_hash(partial_path, video_sha256, filename))
+        job = await run_in_threadpool(_submit_job, video_rel, params, job_id, video_sha256, None)
+        return job_out(job)
+
+    # Decoding starts while the body is still arriving; pass job_id to follow the job's events meanwhile.
+    # The job reads this file while it is written, so it keeps its own name instead of the content hash.
+    video_path = new_upload_path(video_dir, filename)
+    video_rel = to_relative_path(data_dir, video_path)
+    # Created before the job is queued: a worker may start following it before the first chunk arrives.
+    video_path.touch()
+    live = LiveUpload(video_path, data_dir / "tmp" / "fifos")
+    job = await run_in_threadpool(_submit_job, video_rel, params, job_id, None, live)
+    try:
+        video_sha256, _ = await ingest_stream(request.stream(), video_path, live.file)
+    except BaseException:
+        await run_in_threadpool(job_manager.cancel, job.id)
+        raise
+    job = await run_in_threadpool(job_manager.record_upload, job.id, video_sha256)
+    return job_out(job)
+
+
+def _submit_job(
+    video_rel: str,
+    params: dict,
+    job_id: Optional[str],
+    video_sha256: Optional[str],
+    live: Optional[LiveUpload],
+) -> VideoJob:
+    try:
+        return job_manager.submit(video_rel, params, job_id=job_id, video_sha256=video_sha256, live=live)
+    except (JobQueueFull, ValueError) as exc:
+        if live is not None:
+            live.close()
+            build_abs_path(Path(settings.data_dir), video_rel).unlink(missing_ok=True)
+        if isinstance(exc, JobQueueFull):
+            raise HTTPException(status_code=429, detail="too many video jobs in progress") from exc
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@router.post("/batches", response_model=BatchOut, status_code=202)
+def submit_video_batch(
+    files: Optional[list[UploadFile]] = File(None),
+    directory: Optional[str] = Form(None),
+    params: dict = Depends(process_params),
+) -> BatchOut:
+    # Either uploaded files or a directory under data_dir whose videos are processed in place.
+    if batch_manager.pending >= batch_manager.max_pending:
+        raise HTTPException(status_code=429, detail="too many video batches in progress")
+    if bool(files) == bool(directory):
+        raise HTTPException(status_code=400, detail="send either files or directory")
+    if params["timeline"]:
+        raise HTTPException(status_code=400, detail="timeline is not supported for batches")
+    if files and len(files) > settings.batch_max_videos:
+        raise HTTPException(status_code=400, detail=f"a batch holds at most {settings.batch_max_videos} videos")
+
+    data_dir = Path(settings.data_dir)
+    if directory:
+        videos = [(to_relative_path(data_dir, path), None) for path in directory_videos(data_dir, directory)]
+    else:
+        videos = []
+        for file in files:
+            video_path, video_sha256 = save_upload_deduplicated(file, data_dir / "videos")
+            videos.append((to_relative_path(data_dir, video_path), video_sha256))
+    if not videos:
+        raise HTTPException(status_code=400, detail="no videos found")
+    if len(videos) > settings.batch_max_videos:
+        raise HTTPException(status_code=400, detail=f"a batch holds at most {settings.batch_max_videos} videos")
+
+    try:
+        batch = batch_manager.submit(videos, params)
+    except BatchQueueFull as exc:
+        raise HTTPException(status_code=429, detail="too many video batches in progress") from exc
+    return batch_out(batch)
+
+
+def directory_videos(data_dir: Path, directory: str) -> list[Path]:
+    root = data_dir.resolve()
+    target = (root / directory).resolve()
+    if not target.is_relative_to(root):
+        raise HTTPException(status_code=400, detail="directory must be inside the data directory")
+    if not target.is_dir():
+        raise HTTPException(status_code=404, detail="directory not found")
+    return sorted(
+        data_dir / path.relative_to(root)
+        for path in target.rglob("*")
+        if path.suffix.lower() in VIDEO_SUFFIXES and path.is_file()
+    )
+
+
+@router.get("/batches/{batch_id}", response_model=BatchOut)
+def get_video_batch(batch_id: str, db: Session = Depends(get_db)) -> BatchOut:
+    batch = db.get(VideoBatch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return batch_out(batch)
+
+
+@router.get("/batches/{batch_id}/csv")
+def get_video_batch_csv(batch_id: str, db: Session = Depends(get_db)) -> FileResponse:
+    path = batch_result_path(db, batch_id, "csv_path")
+    return FileResponse(path, media_type="text/csv", filename=path.name)
+
+
+@router.get("/batches/{batch_id}/parquet")
+def get_video_batch_parquet(batch_id: str, db: Session = Depends(get_db)) -> FileResponse:
+    path = batch_result_path(db, batch_id, "parquet_path")
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=path.name)
+
+
+def batch_result_path(db: Session, batch_id: str, attribute: str) -> Path:
+    batch = db.get(VideoBatch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    if batch.status != "completed":
+        raise HTTPException(status_code=409, detail=f"batch is {batch.status}")
+    relative_path = getattr(batch, attribute)
+    path = build_abs_path(Path(settings.data_dir), relative_path) if relative_path else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="result file not found")
+    return path
+
+
+@router.post("/batches/{batch_id}/cancel", response_model=BatchOut)
+def cancel_video_batch(batch_id: str) -> BatchOut:
+    batch = batch_manager.cancel(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return batch_out(batch)
+
+
+def batch_out(batch: VideoBatch) -> BatchOut:
+    return BatchOut(
+        batch_id=batch.id,
+        status=batch.status,
+        videos_total=batch.videos_total,
+        videos_done=batch.videos_done,
+        csv_path=batch.csv_path,
+        parquet_path=batch.parquet_path,
+        stats=json.loads(batch.stats_json) if batch.stats_json else None,
+        error=batch.error,
+        created_at=batch.created_at,
+        started_at=batch.started_at,
+        finished_at=batch.finished_at,
+        items=[
+            BatchItemOut(
+                video_path=item.video_path,
+                video_sha256=item.video_sha256,
+                status=item.status,
+                results=[ResultItem(**result) for result in json.loads(item.results_json)]
+                if item.results_json
+                else None,
+                stats=json.loads(item.stats_json) if item.stats_json else None,
+                error=item.error,
+            )
+            for item in batch.items
+        ],
+    )
+
+
+@router.get("/index/search", response_model=list[IndexMatch])
+def search_indexed_videos(
+    person_id: Optional[int] = Query(None),
+    min_confidence: float = Query(0.6, ge=0, le=1),
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+) -> list[IndexMatch]:
+    # Matches the current gallery, or one person of it, against the face embeddings stored by earlier
+    # index_faces runs, without decoding video.
+    gallery = gallery_cache.get(db)
+    if person_id is not None:
+        person = db.get(Person, person_id)
+        if person is None:
+            raise HTTPException(status_code=404, detail="person not found")
+        gallery = gallery.subset([person.name])
+        if not len(gallery):
+            raise HTTPException(status_code=409, detail="person has no reference embeddings")
+    return [IndexMatch(**item) for item in search_face_indexes(gallery, min_confidence, limit=limit)]
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+def get_video_job(job_id: str, db: Session = Depends(get_db)) -> JobOut:
+    job = db.get(VideoJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job_out(job)
+
+
+@router.get("/jobs/{job_id}/csv")
+def get_video_job_csv(job_id: str, db: Session = Depends(get_db)) -> FileResponse:
+    job = db.get(VideoJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.status != "completed" or not job.csv_path:
+        raise HTTPException(status_code=409, detail=f"job is {job.status}")
+    csv_path = build_abs_path(Path(settings.data_dir), job.csv_path)
+    if not csv_path.exists():
+        raise HTTPException(status_code=404, detail="result CSV not found")
+    return FileResponse(csv_path, media_type="text/csv", filename=csv_path.name)
+
+
+@router.get("/jobs/{job_id}/timeline")
+def get_video_job_timeline(job_id: str, db: Session = Depends(get_db)) -> FileResponse:
+    job = db.get(VideoJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"job is {job.status}")
+    timeline_path = build_abs_path(Path(settings.data_dir), job.timeline_path) if job.timeline_path else None
+    if timeline_path is None or not timeline_path.exists():
+        raise HTTPException(status_code=404, detail="timeline not found")
+    media_type = "application/vnd.apache.parquet" if timeline_path.suffix == ".parquet" else "application/x-ndjson"
+    return FileResponse(timeline_path, media_type=media_type, filename=timeline_path.name)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_video_job_events(job_id: str) -> StreamingResponse:
+    # Subscribe before reading the job so no event between the read and the subscription is lost.
+    queue = event_bus.subscribe(job_id)
+    job = await run_in_threadpool(_load_job, job_id)
+    if job is None:
+        event_bus.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="job not found")
+    return StreamingResponse(
+        job_event_stream(job, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def job_event_stream(job: VideoJob, queue: asyncio.Queue) -> AsyncIterator[str]:
+    try:
+        if job.status in TERMINAL_STATUSES:
+            for item in json.loads(job.results_json) if job.results_json else []:
+                yield sse_event("first_seen", item)
+            yield sse_event("progress", {"frames_done": job.frames_done, "frames_total": job.frames_total})
+            yield sse_event("status", {"status": job.status, "error": job.error, "csv_path": job.csv_path})
+            return
+
+        yield sse_event("status", {"status": job.status, "error": None, "csv_path": None})
+        while True:
+            try:
+                kind, data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_event(kind, data)
+            if kind == "status" and data["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        event_bus.unsubscribe(job.id, queue)
+
+
+def sse_event(kind: str, data: dict) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+def _load_job(job_id: str) -> Optional[VideoJob]:
+    with SessionLocal() as db:
+        job = db.get(VideoJob, job_id)
+        if job is not None:
+            db.expunge(job)
+        return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobOut)
+def cancel_video_job(job_id: str) -> JobOut:
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job_out(job)
+
+
+def job_out(job: VideoJob) -> JobOut:
+    results = json.loads(job.results_json) if job.results_json else None
+    return JobOut(
+        job_id=job.id,
+        status=job.status,
+        frames_done=job.frames_done,
+        frames_total=job.frames_total,
+        video_path=job.video_path,
+        video_sha256=job.video_sha256,
+        results=[ResultItem(**item) for item in results] if results is not None else None,
+        csv_path=job.csv_path,
+        timeline_path=job.timeline_path,
+        stats=json.loads(job.stats_json) if job.stats_json else None,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
     )
@@ -11,12 +11,58 @@ class Settings(BaseModel):
     yolo_model_path: str = os.getenv("PIV_YOLO_MODEL_PATH", "")
     yolo_confidence: float = float(os.getenv("PIV_YOLO_CONFIDENCE", "0.35"))
     yolo_iou: float = float(os.getenv("PIV_YOLO_IOU", "0.5"))
+    yolo_export_format: str = os.getenv("PIV_YOLO_EXPORT_FORMAT", "")
+    yolo_batch_size: int = int(os.getenv("PIV_YOLO_BATCH_SIZE", "4"))
+    detect_max_side: int = int(os.getenv("PIV_DETECT_MAX_SIDE", "640"))
+    face_det_max_side: int = int(os.getenv("PIV_FACE_DET_MAX_SIDE", "640"))
+    face_det_auto: bool = os.getenv("PIV_FACE_DET_AUTO", "false").lower() in ("1", "true", "yes")
+    # 0 sizes the pool to the job workers, so every running job holds a model instance.
+    model_pool_size: int = int(os.getenv("PIV_MODEL_POOL_SIZE", "0"))
+    # 0 leaves the inference thread count to the runtime; segment workers set their share of the CPUs.
+    inference_threads: int = int(os.getenv("PIV_INFERENCE_THREADS", "0"))
+    job_cpu_budget: int = int(os.getenv("PIV_JOB_CPU_BUDGET", str(os.cpu_count() or 1)))
+    job_cpus_per_job: int = int(os.getenv("PIV_JOB_CPUS_PER_JOB", "2"))
+    job_max_pending: int = int(os.getenv("PIV_JOB_MAX_PENDING", "32"))
+    batch_max_videos: int = int(os.getenv("PIV_BATCH_MAX_VIDEOS", "1000"))
+    batch_short_clip_sec: float = float(os.getenv("PIV_BATCH_SHORT_CLIP_SEC", "60"))
+    batch_group_size: int = int(os.getenv("PIV_BATCH_GROUP_SIZE", "8"))
+    stream_max: int = int(os.getenv("PIV_STREAM_MAX", "16"))
+    stream_max_latency_sec: float = float(os.getenv("PIV_STREAM_MAX_LATENCY_SEC", "2.0"))
+    stream_reseen_sec: float = float(os.getenv("PIV_STREAM_RESEEN_SEC", "30.0"))
+    stream_reconnect_sec: float = float(os.getenv("PIV_STREAM_RECONNECT_SEC", "5.0"))
+    segment_workers: int = int(os.getenv("PIV_SEGMENT_WORKERS", str(os.cpu_count() or 1)))
+    frame_ring_slots: int = int(os.getenv("PIV_FRAME_RING_SLOTS", "0"))
+    pipeline_queue_size: int = int(os.getenv("PIV_PIPELINE_QUEUE_SIZE", "4"))
+    track_iou: float = float(os.getenv("PIV_TRACK_IOU", "0.3"))
+    track_max_age_sec: float = float(os.getenv("PIV_TRACK_MAX_AGE_SEC", "2.0"))
+    track_reverify_sec: float = float(os.getenv("PIV_TRACK_REVERIFY_SEC", "10.0"))
+    motion_threshold: float = float(os.getenv("PIV_MOTION_THRESHOLD", "0.005"))
+    motion_refresh_sec: float = float(os.getenv("PIV_MOTION_REFRESH_SEC", "10.0"))
+    timeline_gap_sec: float = float(os.getenv("PIV_TIMELINE_GAP_SEC", "0"))
+    timeline_row_group_rows: int = int(os.getenv("PIV_TIMELINE_ROW_GROUP_ROWS", "4096"))
+    reference_max_mb: float = float(os.getenv("PIV_REFERENCE_MAX_MB", "20"))
+    result_cache_max_mb: float = float(os.getenv("PIV_RESULT_CACHE_MAX_MB", "64"))
+    result_cache_max_entries: int = int(os.getenv("PIV_RESULT_CACHE_MAX_ENTRIES", "2000"))
+    ann_nlist: int = int(os.getenv("PIV_ANN_NLIST", "0"))
+    ann_nprobe: int = int(os.getenv("PIV_ANN_NPROBE", "32"))
+    ann_min_rows: int = int(os.getenv("PIV_ANN_MIN_ROWS", "2048"))
+    ann_retrain_growth: float = float(os.getenv("PIV_ANN_RETRAIN_GROWTH", "2.0"))
+    metrics_enabled: bool = os.getenv("PIV_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
 
     def resolved_model_dir(self) -> str:
         if self.model_dir:
             return self.model_dir
         return os.path.join(self.data_dir, "models", "insightface")
 
+    def model_post_init(self, __context) -> None:
+        if self.model_pool_size <= 0:
+            self.model_pool_size = self.job_workers()
+
+    def job_workers(self) -> int:
+        # A job blocks on the model pool while it runs, so workers beyond the pool size would only wait.
+        workers = max(1, self.job_cpu_budget // max(1, self.job_cpus_per_job))
+        return min(workers, self.model_pool_size) if self.model_pool_size > 0 else workers
+
     def resolved_yolo_model_path(self) -> str:
         if self.yolo_model_path:
             return self.yolo_model_path
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
 from typing import Iterator
 
@@ -8,6 +9,7 @@ from sqlalchemy.orm import Session, sessionmaker
 
 from app.config import settings
 from app.models import Base
+from app.services.gallery import embedding_to_bytes
 
 
 def build_db_url() -> str:
@@ -24,17 +26,48 @@ SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
-    _ensure_reference_embedding_column()
+    _ensure_columns(
+        "reference_images",
+        {"embedding_json": "TEXT", "embedding": "BLOB", "ann_list": "INTEGER", "content_sha256": "VARCHAR(64)"},
+    )
+    _ensure_columns(
+        "video_jobs",
+        {"stats_json": "TEXT", "video_sha256": "VARCHAR(64)", "timeline_path": "VARCHAR(500)"},
+    )
+    _migrate_json_embeddings()
 
 
-def _ensure_reference_embedding_column() -> None:
+def _ensure_columns(table: str, columns: dict[str, str]) -> None:
     if engine.dialect.name != "sqlite":
         return
-    with engine.connect() as connection:
-        rows = connection.execute(text("PRAGMA table_info(reference_images)")).fetchall()
-        columns = {row[1] for row in rows}
-        if "embedding_json" not in columns and rows:
-            connection.execute(text("ALTER TABLE reference_images ADD COLUMN embedding_json TEXT"))
+    with engine.begin() as connection:
+        rows = connection.execute(text(f"PRAGMA table_info({table})")).fetchall()
+        existing = {row[1] for row in rows}
+        for name, column_type in columns.items():
+            if name not in existing and rows:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+
+def _migrate_json_embeddings(batch_size: int = 500) -> None:
+    with engine.begin() as connection:
+        rows = connection.execute(
+            text(
+                "SELECT id, embedding_json FROM reference_images "
+                "WHERE embedding IS NULL AND embedding_json IS NOT NULL"
+            )
+        ).fetchall()
+        for start in range(0, len(rows), batch_size):
+            params = [
+                {"id": row_id, "embedding": embedding_to_bytes(json.loads(raw))}
+                for row_id, raw in rows[start : start + batch_size]
+            ]
+            connection.execute(
+                text(
+                    "UPDATE reference_images SET embedding = :embedding, embedding_json = NULL "
+                    "WHERE id = :id"
+                ),
+                params,
+            )
 
 
 def get_db() -> Iterator[Session]:
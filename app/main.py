@@ -1,31 +1,56 @@
-import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.api.reference import router as reference_router
+from app.api.stream import router as stream_router
 from app.api.video import router as video_router
 from app.db import init_db
-from app.services.matcher import warm_up_models
-from app.services.yolo_detector import warm_up_yolo
-
-logger = logging.getLogger(__name__)
+from app.services.batch_jobs import batch_manager
+from app.services.jobs import job_manager
+from app.services.metrics import metrics
+from app.services.model_registry import model_warmup
+from app.services.segment_processor import segment_pool
+from app.services.streams import stream_manager
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     init_db()
-    if not warm_up_models():
-        logger.warning("InsightFace warm-up failed; model may be unavailable")
-    if not warm_up_yolo():
-        logger.warning("YOLO warm-up failed; model may be unavailable")
+    # Models load in the background; /ready turns 200 once all of them are usable.
+    model_warmup.start()
+    job_manager.start()
+    batch_manager.start()
+    stream_manager.start()
     yield
+    stream_manager.shutdown()
+    batch_manager.shutdown()
+    job_manager.shutdown()
+    segment_pool.shutdown()
 
 
 app = FastAPI(title="Persons In A Video", lifespan=lifespan)
 
 app.include_router(reference_router)
 app.include_router(video_router)
+app.include_router(stream_router)
 
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    models = model_warmup.status()
+    if model_warmup.ready:
+        return JSONResponse({"status": "ready", "models": models})
+    failed = any(model["state"] == "failed" for model in models.values())
+    return JSONResponse({"status": "failed" if failed else "loading", "models": models}, status_code=503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import DateTime, ForeignKey, String, Text
+from sqlalchemy import DateTime, ForeignKey, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -32,6 +32,82 @@ class ReferenceImage(Base):
     person_id: Mapped[int] = mapped_column(ForeignKey("persons.id"), index=True)
     image_path: Mapped[str] = mapped_column(String(500))
     embedding_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    ann_list: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    content_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     person: Mapped[Person] = relationship(back_populates="images")
+
+
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="queued")
+    video_path: Mapped[str] = mapped_column(String(500))
+    video_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    params_json: Mapped[str] = mapped_column(Text)
+    frames_done: Mapped[int] = mapped_column(Integer, default=0)
+    frames_total: Mapped[int] = mapped_column(Integer, default=0)
+    results_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    csv_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    timeline_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    stats_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class VideoBatch(Base):
+    __tablename__ = "video_batches"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="queued")
+    params_json: Mapped[str] = mapped_column(Text)
+    videos_total: Mapped[int] = mapped_column(Integer, default=0)
+    videos_done: Mapped[int] = mapped_column(Integer, default=0)
+    csv_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    parquet_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    stats_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    items: Mapped[List["VideoBatchItem"]] = relationship(
+        back_populates="batch",
+        cascade="all, delete-orphan",
+        order_by="VideoBatchItem.position",
+    )
+
+
+class VideoBatchItem(Base):
+    __tablename__ = "video_batch_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    batch_id: Mapped[str] = mapped_column(ForeignKey("video_batches.id"), index=True)
+    position: Mapped[int] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    video_path: Mapped[str] = mapped_column(String(500))
+    video_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    results_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    stats_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    batch: Mapped[VideoBatch] = relationship(back_populates="items")
+
+
+class VideoStream(Base):
+    __tablename__ = "video_streams"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="running")
+    source: Mapped[str] = mapped_column(String(1000))
+    params_json: Mapped[str] = mapped_column(Text)
+    stats_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
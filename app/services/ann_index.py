@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.gallery import ReferenceGallery, normalize_rows
+
+CENTROIDS_FILE = "centroids.npy"
+INFO_FILE = "index.json"
+TRAIN_ROWS_PER_LIST = 64
+ASSIGN_CHUNK_ROWS = 8192
+MEASURE_BATCH = 4
+
+
+class IvfGallery(ReferenceGallery):
+    # Inverted-file index: rows are bucketed by their nearest centroid and a query only scans
+    # the rows of its `nprobe` closest buckets. Matches are approximate; person_scores stays exact.
+    # Rows are also kept sorted by list so each probed list is a contiguous slice, at the cost of a
+    # second copy of the matrix; pass list_matrix (e.g. a memory-mapped export) to share that copy.
+    def __init__(
+        self,
+        names: list[str],
+        matrix: np.ndarray,
+        person_index: np.ndarray,
+        centroids: np.ndarray,
+        lists: np.ndarray,
+        nprobe: int,
+        list_matrix: Optional[np.ndarray] = None,
+    ) -> None:
+        super().__init__(names, matrix, person_index)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.lists = np.ascontiguousarray(lists, dtype=np.int32)
+        self.nprobe = max(1, min(nprobe, len(self.centroids)))
+        order = np.argsort(self.lists, kind="stable")
+        self._list_offsets = np.searchsorted(self.lists[order], np.arange(len(self.centroids) + 1))
+        self._list_matrix = np.ascontiguousarray(self.matrix[order]) if list_matrix is None else list_matrix
+        self._list_people = self.person_index[order]
+
+    @property
+    def list_matrix(self) -> np.ndarray:
+        return self._list_matrix
+
+    def state(self) -> tuple[np.ndarray, np.ndarray, int]:
+        return self.centroids, self.lists, self.nprobe
+
+    def with_nprobe(self, nprobe: int) -> IvfGallery:
+        return IvfGallery(
+            self.names, self.matrix, self.person_index, self.centroids, self.lists, nprobe, self._list_matrix
+        )
+
+    def match(self, embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not len(self) or not len(embeddings) or self.nprobe >= len(self.centroids):
+            return super().match(embeddings)
+        queries = normalize_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        probes = np.argpartition(-(queries @ self.centroids.T), self.nprobe - 1, axis=1)[:, : self.nprobe]
+        # Each probed list is read once per batch and scored against all the queries that probe it.
+        # Query/list pairs are sorted by list, so every list scores one contiguous block of pairs.
+        order = np.argsort(probes.ravel(), kind="stable")
+        probed, counts = np.unique(probes.ravel()[order], return_counts=True)
+        pair_queries = queries[order // self.nprobe]
+        pair_rows = np.zeros(len(order), dtype=np.int64)
+        pair_scores = np.full(len(order), -np.inf, dtype=np.float32)
+        first = 0
+        for start, end, count in zip(
+            self._list_offsets[probed].tolist(), self._list_offsets[probed + 1].tolist(), counts.tolist()
+        ):
+            if start < end:
+                similarities = self._list_matrix[start:end] @ pair_queries[first : first + count].T
+                pair_rows[first : first + count] = start + similarities.argmax(axis=0)
+                pair_scores[first : first + count] = similarities.max(axis=0)
+            first += count
+        # Back in query order, each query's best pair is the best row over its probed lists.
+        grid_scores = np.empty_like(pair_scores)
+        grid_scores[order] = pair_scores
+        grid_rows = np.empty_like(pair_rows)
+        grid_rows[order] = pair_rows
+        grid_scores = grid_scores.reshape(len(queries), self.nprobe)
+        top = grid_scores.argmax(axis=1)
+        scores = grid_scores[np.arange(len(queries)), top]
+        best = self._list_people[grid_rows.reshape(len(queries), self.nprobe)[np.arange(len(queries)), top]]
+        best = best.astype(np.int64)
+        empty = np.isneginf(scores)
+        if empty.any():
+            # Every probed list of these queries is empty: fall back to an exact scan for them.
+            best[empty], scores[empty] = super().match(queries[empty])
+        return best, scores
+
+
+def default_nlist(rows: int) -> int:
+    return settings.ann_nlist or max(1, int(round(math.sqrt(rows))))
+
+
+def train_centroids(matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    # Spherical k-means on a sample of the gallery; empty clusters are re-seeded from random rows.
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(matrix))
+    sample_size = min(len(matrix), nlist * TRAIN_ROWS_PER_LIST)
+    sample = np.asarray(matrix[rng.choice(len(matrix), sample_size, replace=False)], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(centroids, sample)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(centroids: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    lists = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(matrix[start : start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        lists[start : start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+    return lists
+
+
+def synthetic_queries(matrix: np.ndarray, count: int, similarity: float = 0.6, seed: int = 0) -> np.ndarray:
+    # Gallery rows perturbed by random noise so that each query has roughly `similarity` cosine to
+    # its source row, which is about how far a video face is from its reference photos.
+    rng = np.random.default_rng(seed)
+    source = np.asarray(matrix[rng.choice(len(matrix), min(count, len(matrix)), replace=False)])
+    scale = math.sqrt((1.0 / similarity**2 - 1.0) / matrix.shape[1])
+    return normalize_rows(source + rng.normal(scale=scale, size=source.shape).astype(np.float32))
+
+
+def measure_recall(gallery: IvfGallery, queries: np.ndarray) -> dict:
+    # recall@1: fraction of queries matched to the same person as an exact scan. Queries are sent in
+    # small batches, like the faces of one frame.
+    batches = [queries[start : start + MEASURE_BATCH] for start in range(0, len(queries), MEASURE_BATCH)]
+    started = time.perf_counter()
+    exact = [ReferenceGallery.match(gallery, batch)[0] for batch in batches]
+    exact_ms = (time.perf_counter() - started) * 1000.0
+    started = time.perf_counter()
+    approximate = [gallery.match(batch)[0] for batch in batches]
+    ann_ms = (time.perf_counter() - started) * 1000.0
+    hits = np.concatenate(approximate) == np.concatenate(exact) if batches else np.zeros(0, dtype=bool)
+    return {
+        "queries": len(queries),
+        "nprobe": gallery.nprobe,
+        "recall_at_1": round(float(hits.mean()), 4) if len(queries) else None,
+        "exact_ms_per_query": round(exact_ms / max(1, len(queries)), 4),
+        "ann_ms_per_query": round(ann_ms / max(1, len(queries)), 4),
+    }
+
+
+class GalleryIndexStore:
+    # Centroids live under data_dir; each reference row keeps its list id in the database, so adding
+    # or deleting a reference only touches that row.
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cached: Optional[tuple[float, np.ndarray, dict]] = None
+
+    def load(self) -> Optional[tuple[np.ndarray, dict]]:
+        path = self.directory / CENTROIDS_FILE
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self._cached is None or self._cached[0] != mtime:
+                info = json.loads((self.directory / INFO_FILE).read_text(encoding="utf-8"))
+                self._cached = (mtime, np.load(path), info)
+            return self._cached[1], self._cached[2]
+
+    def save(self, centroids: np.ndarray, info: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        info_tmp = self.directory / f"{INFO_FILE}{suffix}"
+        info_tmp.write_text(json.dumps(info), encoding="utf-8")
+        centroids_tmp = self.directory / f"{CENTROIDS_FILE}{suffix}"
+        with centroids_tmp.open("wb") as handle:
+            np.save(handle, np.ascontiguousarray(centroids, dtype=np.float32))
+        info_tmp.replace(self.directory / INFO_FILE)
+        centroids_tmp.replace(self.directory / CENTROIDS_FILE)
+
+    def info(self) -> Optional[dict]:
+        loaded = self.load()
+        return loaded[1] if loaded is not None else None
+
+    def assign(self, embedding: np.ndarray) -> Optional[int]:
+        loaded = self.load()
+        if loaded is None:
+            return None
+        centroids, _ = loaded
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        if vector.shape[0] != centroids.shape[1]:
+            return None
+        return int(assign_lists(centroids, normalize_rows(vector[None, :]))[0])
+
+
+gallery_index_store = GalleryIndexStore(Path(settings.data_dir) / "ann")
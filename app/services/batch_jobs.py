@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import VideoBatch, VideoBatchItem
+from app.services.batch_processor import GROUP_PARAMS, groupable, process_video_group
+from app.services.csv_writer import BATCH_RESULT_FIELDS, write_results_csv, write_results_parquet
+from app.services.gallery import ReferenceGallery
+from app.services.gallery_cache import gallery_cache
+from app.services.jobs import JobManager, job_manager
+from app.services.metrics import metrics, videos_processed
+from app.services.result_cache import process_video_cached, result_cache
+from app.services.storage import build_abs_path, file_sha256, to_relative_path
+from app.services.video_processor import ProcessingCancelled, ProcessingStats, probe_video
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class BatchQueueFull(Exception):
+    pass
+
+
+class BatchManager:
+    # Batches run one at a time on a runner thread that fans their videos out to the job workers, so
+    # one gallery snapshot serves the whole batch and batches share the model pool budget with single
+    # jobs. Short videos are scanned in groups that share detector batches; longer ones, and every
+    # video if the options require it, run one by one.
+    def __init__(self, jobs: JobManager, max_pending: int) -> None:
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._cancel_events)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-batch")
+        with SessionLocal() as db:
+            unfinished = db.execute(
+                select(VideoBatch)
+                .where(VideoBatch.status.in_(ACTIVE_STATUSES))
+                .order_by(VideoBatch.created_at)
+            ).scalars().all()
+            for batch in unfinished:
+                batch.status = "queued"
+            db.commit()
+            batch_ids = [batch.id for batch in unfinished]
+        for batch_id in batch_ids:
+            self._schedule(batch_id)
+        if batch_ids:
+            logger.info("Resumed %d unfinished video batches", len(batch_ids))
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        if self._runner is not None:
+            self._runner.shutdown(wait=True, cancel_futures=True)
+            self._runner = None
+
+    def submit(self, videos: list[tuple[str, Optional[str]]], params: dict) -> VideoBatch:
+        batch_id = uuid4().hex
+        with self._lock:
+            if len(self._cancel_events) >= self.max_pending:
+                raise BatchQueueFull()
+            self._cancel_events[batch_id] = threading.Event()
+
+        try:
+            with SessionLocal() as db:
+                batch = VideoBatch(
+                    id=batch_id,
+                    status="queued",
+                    params_json=json.dumps(params),
+                    videos_total=len(videos),
+                    items=[
+                        VideoBatchItem(position=position, video_path=video_path, video_sha256=video_sha256)
+                        for position, (video_path, video_sha256) in enumerate(videos)
+                    ],
+                )
+                db.add(batch)
+                db.commit()
+                batch = _detached(db, batch)
+        except Exception:
+            with self._lock:
+                self._cancel_events.pop(batch_id, None)
+            raise
+        self._submit_to_runner(batch_id)
+        return batch
+
+    def cancel(self, batch_id: str) -> Optional[VideoBatch]:
+        with SessionLocal() as db:
+            batch = db.get(VideoBatch, batch_id)
+            if batch is None:
+                return None
+            if batch.status in ACTIVE_STATUSES:
+                with self._lock:
+                    event = self._cancel_events.get(batch_id)
+                if event is not None:
+                    event.set()
+                if batch.status == "queued" or event is None:
+                    _finish(batch, "cancelled")
+                    db.commit()
+            return _detached(db, batch)
+
+    def _schedule(self, batch_id: str) -> None:
+        with self._lock:
+            self._cancel_events.setdefault(batch_id, threading.Event())
+        self._submit_to_runner(batch_id)
+
+    def _submit_to_runner(self, batch_id: str) -> None:
+        if self._runner is None:
+            raise RuntimeError("batch manager is not running")
+        self._runner.submit(self._run, batch_id)
+
+    def _run(self, batch_id: str) -> None:
+        with self._lock:
+            cancel_event = self._cancel_events.setdefault(batch_id, threading.Event())
+        try:
+            with SessionLocal() as db:
+                batch = db.get(VideoBatch, batch_id)
+                if batch is None or batch.status != "queued":
+                    return
+                if cancel_event.is_set():
+                    _finish(batch, "cancelled")
+                    db.commit()
+                    return
+                batch.status = "running"
+                batch.started_at = datetime.utcnow()
+                db.commit()
+                self._execute(db, batch, cancel_event)
+        finally:
+            with self._lock:
+                self._cancel_events.pop(batch_id, None)
+
+    def _execute(self, db: Session, batch: VideoBatch, cancel_event: threading.Event) -> None:
+        started = time.perf_counter()
+        data_dir = Path(settings.data_dir)
+        params = json.loads(batch.params_json)
+        stats = {"groups": 0, "grouped_videos": 0, "cache_hits": 0, "failed": 0, "timings": {}}
+        try:
+            gallery = gallery_cache.get(db, ann=params.get("use_ann", False))
+            pending = [item for item in batch.items if item.status != "completed"]
+            paths = {item.id: build_abs_path(data_dir, item.video_path) for item in pending}
+            # Hashing, the cache lookup and probing the length are I/O bound and run on the pool too.
+            prepared = self.jobs.executor.map(
+                _prepare,
+                [paths[item.id] for item in pending],
+                [item.video_sha256 for item in pending],
+                [gallery] * len(pending),
+                [params] * len(pending),
+            )
+            singles: list[VideoBatchItem] = []
+            short: list[VideoBatchItem] = []
+            can_group = groupable(params)
+            for item, (video_sha256, cached, duration_sec) in zip(pending, list(prepared)):
+                item.video_sha256 = video_sha256
+                if cached is not None:
+                    stats["cache_hits"] += 1
+                    videos_processed.inc("hit")
+                    self._complete(db, batch, item, cached, ProcessingStats(cache_hit=True), stats)
+                elif can_group and duration_sec is not None and duration_sec <= settings.batch_short_clip_sec:
+                    short.append(item)
+                else:
+                    singles.append(item)
+
+            futures: dict[Future, list[VideoBatchItem]] = {}
+            for item in singles:
+                futures[self._submit_single(item, paths, gallery, params, cancel_event)] = [item]
+            group_size = max(1, settings.batch_group_size)
+            for start in range(0, len(short), group_size):
+                group = short[start : start + group_size]
+                future = self.jobs.executor.submit(
+                    _process_group,
+                    [paths[item.id] for item in group],
+                    [item.video_sha256 for item in group],
+                    gallery,
+                    params,
+                    cancel_event,
+                )
+                futures[future] = group
+
+            cancelled = False
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    items = futures.pop(future)
+                    try:
+                        outputs = future.result()
+                    except ProcessingCancelled:
+                        cancelled = True
+                        continue
+                    except Exception as exc:
+                        if len(items) > 1:
+                            # One unreadable video fails the whole group: retry its videos one by one.
+                            for item in items:
+                                futures[self._submit_single(item, paths, gallery, params, cancel_event)] = [item]
+                            continue
+                        logger.warning("Video %s in batch %s failed: %s", items[0].video_path, batch.id, exc)
+                        items[0].status = "failed"
+                        items[0].error = str(exc)
+                        stats["failed"] += 1
+                        db.commit()
+                        continue
+                    if len(items) > 1:
+                        stats["groups"] += 1
+                        stats["grouped_videos"] += len(items)
+                    for item, (results, item_stats) in zip(items, outputs):
+                        self._complete(db, batch, item, results, item_stats, stats)
+            if cancelled:
+                raise ProcessingCancelled()
+        except ProcessingCancelled:
+            if self._stopping.is_set():
+                # Interrupted by shutdown rather than by the user: resume on next start.
+                batch.status = "queued"
+                batch.started_at = None
+            else:
+                _finish(batch, "cancelled")
+            db.commit()
+            return
+        except Exception as exc:
+            logger.exception("Video batch %s failed", batch.id)
+            batch.error = str(exc)
+            _finish(batch, "failed")
+            db.commit()
+            return
+
+        rows = [
+            {"video_path": item.video_path, **result}
+            for item in batch.items
+            if item.status == "completed"
+            for result in json.loads(item.results_json)
+        ]
+        result_dir = data_dir / "results"
+        csv_path = result_dir / f"batch-{batch.id}.csv"
+        csv_started = time.perf_counter()
+        write_results_csv(csv_path, rows, BATCH_RESULT_FIELDS)
+        batch.csv_path = to_relative_path(data_dir, csv_path)
+        parquet_path = result_dir / f"batch-{batch.id}.parquet"
+        if write_results_parquet(parquet_path, rows, BATCH_RESULT_FIELDS):
+            batch.parquet_path = to_relative_path(data_dir, parquet_path)
+        stats["timings"]["write"] = time.perf_counter() - csv_started
+        stats["timings"]["total"] = time.perf_counter() - started
+        stats["timings"] = {stage: round(seconds, 4) for stage, seconds in stats["timings"].items()}
+        batch.stats_json = json.dumps(stats)
+        _finish(batch, "completed")
+        db.commit()
+
+    def _submit_single(
+        self,
+        item: VideoBatchItem,
+        paths: dict[int, Path],
+        gallery: ReferenceGallery,
+        params: dict,
+        cancel_event: threading.Event,
+    ) -> Future:
+        return self.jobs.executor.submit(
+            _process_single, paths[item.id], item.video_sha256, gallery, params, cancel_event
+        )
+
+    def _complete(
+        self,
+        db: Session,
+        batch: VideoBatch,
+        item: VideoBatchItem,
+        results: list[dict],
+        item_stats: ProcessingStats,
+        stats: dict,
+    ) -> None:
+        item.status = "completed"
+        item.error = None
+        item.results_json = json.dumps(results)
+        item.stats_json = json.dumps(item_stats.as_dict())
+        batch.videos_done += 1
+        for stage, seconds in item_stats.timings.items():
+            if stage != "total":
+                stats["timings"][stage] = stats["timings"].get(stage, 0.0) + seconds
+        db.commit()
+
+
+def _prepare(
+    video_path: Path,
+    video_sha256: Optional[str],
+    gallery: ReferenceGallery,
+    params: dict,
+) -> tuple[Optional[str], Optional[list[dict]], Optional[float]]:
+    if not video_path.exists():
+        return video_sha256, None, None
+    video_sha256 = video_sha256 or file_sha256(video_path)
+    cached = None
+    if not params.get("index_faces"):
+        cached = result_cache.get(result_cache.key(video_sha256, gallery, params))
+    if cached is not None:
+        return video_sha256, cached, None
+    try:
+        fps, frames_total = probe_video(video_path)
+    except RuntimeError:
+        return video_sha256, None, None
+    return video_sha256, None, frames_total / fps if frames_total else None
+
+
+def _process_single(
+    video_path: Path,
+    video_sha256: Optional[str],
+    gallery: ReferenceGallery,
+    params: dict,
+    cancel_event: threading.Event,
+) -> list[tuple[list[dict], ProcessingStats]]:
+    if not video_path.exists():
+        raise RuntimeError(f"video not found: {video_path.name}")
+    stats = ProcessingStats()
+    results = process_video_cached(
+        video_path,
+        video_sha256,
+        gallery,
+        params,
+        stats=stats,
+        cancel_event=cancel_event,
+    )
+    return [(results, stats)]
+
+
+def _process_group(
+    video_paths: list[Path],
+    video_sha256s: list[Optional[str]],
+    gallery: ReferenceGallery,
+    params: dict,
+    cancel_event: threading.Event,
+) -> list[tuple[list[dict], ProcessingStats]]:
+    outputs = process_video_group(
+        video_paths,
+        gallery,
+        cancel_event=cancel_event,
+        **{name: params[name] for name in GROUP_PARAMS},
+    )
+    for video_sha256, (results, _) in zip(video_sha256s, outputs):
+        videos_processed.inc("miss")
+        if video_sha256 is not None:
+            result_cache.put(result_cache.key(video_sha256, gallery, params), results)
+    return outputs
+
+
+def _finish(batch: VideoBatch, status: str) -> None:
+    batch.status = status
+    batch.finished_at = datetime.utcnow()
+
+
+def _detached(db: Session, batch: VideoBatch) -> VideoBatch:
+    db.refresh(batch)
+    # Items are loaded before detaching so callers can still read them.
+    _ = batch.items
+    db.expunge(batch)
+    return batch
+
+
+batch_manager = BatchManager(job_manager, settings.job_max_pending)
+metrics.gauge("piv_batches_pending", "Video batches queued or running.", lambda: batch_manager.pending)
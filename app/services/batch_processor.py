@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.services.gallery import ReferenceGallery
+from app.services.metrics import record_video_metrics
+from app.services.model_registry import ModelRegistry, registry as default_registry
+from app.services.resolution import ResolutionPolicy
+from app.services.tracker import IouTracker
+from app.services.video_processor import (
+    FrameEmbedder,
+    FrameSampler,
+    MotionGate,
+    ProcessingStats,
+    batch_frame_regions,
+    checkout_models,
+    format_results,
+    iter_frame_batches,
+    record_matches,
+    video_resolution_policy,
+)
+
+# Sampled frames are shared across the clips of a group, so these params must hold for all of them.
+GROUP_PARAMS = (
+    "min_confidence",
+    "frame_interval_sec",
+    "use_yolo",
+    "use_tracking",
+    "motion_gate",
+    "yolo_confidence",
+    "yolo_iou",
+    "yolo_batch_size",
+    "detect_max_side",
+    "face_det_size",
+)
+
+
+@dataclass
+class _Clip:
+    cap: cv2.VideoCapture
+    fps: float
+    frames_total: int
+    sampler: FrameSampler
+    gate: MotionGate | None
+    policy: ResolutionPolicy
+    embedder: FrameEmbedder
+    stats: ProcessingStats = field(default_factory=ProcessingStats)
+    results: dict[str, dict] = field(default_factory=dict)
+
+
+def groupable(params: dict) -> bool:
+    # Grouping is a plain sequential scan; options that change the scan itself run videos one by one.
+    return not (
+        params.get("adaptive")
+        or params.get("index_faces")
+        or params.get("pipelined")
+        or params.get("segment_workers", 1) > 1
+    )
+
+
+def process_video_group(
+    video_paths: list[Path],
+    gallery: ReferenceGallery,
+    min_confidence: float = 0.6,
+    frame_interval_sec: float = 1.0,
+    use_yolo: bool = True,
+    use_tracking: bool = False,
+    motion_gate: bool = False,
+    yolo_confidence: float | None = None,
+    yolo_iou: float | None = None,
+    yolo_batch_size: int | None = None,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    registry: ModelRegistry | None = None,
+    cancel_event: threading.Event | None = None,
+) -> list[tuple[list[dict], ProcessingStats]]:
+    # Scans several short videos in one pass: their sampled frames are chained so that YOLO batches
+    # run full across clip boundaries, while tracking, matching and results stay per video.
+    started = time.perf_counter()
+    clips: list[_Clip] = []
+    with checkout_models(registry or default_registry, use_yolo, yolo_confidence, yolo_iou) as (
+        matcher,
+        yolo_detector,
+    ):
+        if not len(gallery):
+            return [([], ProcessingStats()) for _ in video_paths]
+        try:
+            for video_path in video_paths:
+                clips.append(
+                    _open_clip(
+                        video_path,
+                        gallery,
+                        matcher,
+                        yolo_detector,
+                        min_confidence,
+                        frame_interval_sec,
+                        use_tracking,
+                        motion_gate,
+                        detect_max_side,
+                        face_det_size,
+                        cancel_event,
+                    )
+                )
+            group_timings = _scan_group(
+                clips,
+                gallery,
+                yolo_detector,
+                min_confidence,
+                yolo_batch_size or settings.yolo_batch_size,
+            )
+        finally:
+            for clip in clips:
+                clip.cap.release()
+
+    # Batches mix clips, so shared stage time is split by each clip's share of the decoded frames.
+    wall = time.perf_counter() - started
+    decoded_total = sum(clip.stats.frames_decoded for clip in clips)
+    for clip in clips:
+        share = clip.stats.frames_decoded / decoded_total if decoded_total else 1.0 / len(clips)
+        for stage, seconds in group_timings.items():
+            clip.stats.add_time(stage, seconds * share)
+        clip.stats.timings["total"] = wall * share
+        record_video_metrics(clip.stats, clip.stats.timings["total"])
+    return [(format_results(clip.results), clip.stats) for clip in clips]
+
+
+def _open_clip(
+    video_path: Path,
+    gallery: ReferenceGallery,
+    matcher,
+    yolo_detector,
+    min_confidence: float,
+    frame_interval_sec: float,
+    use_tracking: bool,
+    motion_gate: bool,
+    detect_max_side: int | None,
+    face_det_size: int | None,
+    cancel_event: threading.Event | None,
+) -> _Clip:
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"unable to open video {video_path.name}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    policy = video_resolution_policy(cap, yolo_detector is not None, detect_max_side, face_det_size)
+    sampler = FrameSampler(cap, max(1, int(round(frame_interval_sec * fps))), cancel_event=cancel_event)
+    gate = None
+    if motion_gate:
+        gate = MotionGate(sampler, settings.motion_threshold, int(round(settings.motion_refresh_sec * fps)))
+    tracker = None
+    if use_tracking and yolo_detector is not None:
+        tracker = IouTracker(
+            iou_threshold=settings.track_iou,
+            max_missed=int(settings.track_max_age_sec / frame_interval_sec),
+        )
+    embedder = FrameEmbedder(
+        matcher,
+        gallery,
+        min_confidence,
+        tracker,
+        int(round(settings.track_reverify_sec * fps)),
+        policy.det_size,
+    )
+    return _Clip(cap, fps, max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))), sampler, gate, policy, embedder)
+
+
+def _scan_group(
+    clips: list[_Clip],
+    gallery: ReferenceGallery,
+    yolo_detector,
+    min_confidence: float,
+    batch_size: int,
+) -> dict[str, float]:
+    timings: dict[str, float] = {}
+
+    def timed(stage: str, started: float) -> None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+    for keys, frames in iter_frame_batches(_chain_frames(clips), batch_size):
+        started = time.perf_counter()
+        per_frame = batch_frame_regions(frames, yolo_detector, [clips[clip].policy for clip, _ in keys])
+        timed("detect", started)
+
+        started = time.perf_counter()
+        faces_per_frame: list[list] = []
+        for clip_index, run in _runs(keys):
+            frame_indices = tuple(frame_index for _, frame_index in run)
+            run_regions = per_frame[len(faces_per_frame) : len(faces_per_frame) + len(run)]
+            faces_per_frame.extend(clips[clip_index].embedder((frame_indices, run_regions)))
+        timed("embed", started)
+
+        for (clip_index, frame_index), faces in zip(keys, faces_per_frame):
+            clip = clips[clip_index]
+            started = time.perf_counter()
+            record_matches(clip.results, gallery, faces, frame_index, clip.fps, min_confidence)
+            clip.stats.add_time("match", time.perf_counter() - started)
+            clip.stats.faces_detected += len(faces)
+
+    for clip in clips:
+        clip.stats.frames_total = clip.frames_total
+        clip.stats.frames_read = clip.sampler.position
+        clip.stats.frames_decoded = clip.sampler.decoded
+        clip.stats.frames_skipped = clip.gate.skipped if clip.gate is not None else 0
+        clip.stats.regions_detected = clip.embedder.regions_detected
+        clip.stats.regions_embedded = clip.embedder.regions_embedded
+    return timings
+
+
+def _chain_frames(clips: list[_Clip]) -> Iterator[tuple[tuple[int, int], np.ndarray]]:
+    for clip_index, clip in enumerate(clips):
+        frames = iter(clip.gate if clip.gate is not None else clip.sampler)
+        while True:
+            started = time.perf_counter()
+            item = next(frames, None)
+            clip.stats.add_time("decode", time.perf_counter() - started)
+            if item is None:
+                break
+            frame_index, frame = item
+            yield (clip_index, frame_index), frame
+
+
+def _runs(keys: tuple[tuple[int, int], ...]) -> Iterator[tuple[int, list[tuple[int, int]]]]:
+    run: list[tuple[int, int]] = []
+    for key in keys:
+        if run and key[0] != run[0][0]:
+            yield run[0][0], run
+            run = []
+        run.append(key)
+    if run:
+        yield run[0][0], run
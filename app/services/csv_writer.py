@@ -1,13 +1,35 @@
 from __future__ import annotations
 
 import csv
+import time
 from pathlib import Path
 
+from app.services.metrics import csv_write_seconds
 
-def write_results_csv(path: Path, results: list[dict]) -> None:
+RESULT_FIELDS = ["name", "confidence", "first_seen_sec"]
+BATCH_RESULT_FIELDS = ["video_path", *RESULT_FIELDS]
+
+
+def write_results_csv(path: Path, results: list[dict], fieldnames: list[str] = RESULT_FIELDS) -> float:
+    started = time.perf_counter()
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("w", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=["name", "confidence", "first_seen_sec"])
+        writer = csv.DictWriter(handle, fieldnames=fieldnames)
         writer.writeheader()
         for item in results:
             writer.writerow(item)
+    elapsed = time.perf_counter() - started
+    csv_write_seconds.observe(elapsed)
+    return elapsed
+
+
+def write_results_parquet(path: Path, results: list[dict], fieldnames: list[str] = RESULT_FIELDS) -> bool:
+    # pandas needs pyarrow or fastparquet for Parquet; without either only the CSV is written.
+    import pandas as pd
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        pd.DataFrame(results, columns=fieldnames).to_parquet(path, index=False)
+    except ImportError:
+        return False
+    return True
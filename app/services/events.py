@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import defaultdict
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+PROGRESS_BACKLOG = 32
+
+Event = tuple[str, dict]
+
+
+class JobEventBus:
+    # Job threads publish; each listener is an asyncio.Queue fed through its own loop, so streaming
+    # to a client never holds a worker thread. first_seen and first_seen_refined events are kept per running job
+    # for replay.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(list)
+        self._history: dict[str, list[Event]] = defaultdict(list)
+        self._progress: dict[str, Event] = {}
+
+    def publish(self, job_id: str, kind: str, data: dict) -> None:
+        event = (kind, data)
+        with self._lock:
+            if kind in ("first_seen", "first_seen_refined"):
+                self._history[job_id].append(event)
+            elif kind == "progress":
+                self._progress[job_id] = event
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                self.unsubscribe(job_id, queue)
+
+    def close(self, job_id: str) -> None:
+        with self._lock:
+            self._history.pop(job_id, None)
+            self._progress.pop(job_id, None)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            for event in self._history.get(job_id, ()):
+                queue.put_nowait(event)
+            if job_id in self._progress:
+                queue.put_nowait(self._progress[job_id])
+            self._subscribers[job_id].append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is None:
+                return
+            subscribers[:] = [item for item in subscribers if item[1] is not queue]
+            if not subscribers:
+                del self._subscribers[job_id]
+
+
+def _deliver(queue: asyncio.Queue, event: Event) -> None:
+    # A slow client loses intermediate progress updates, never first_seen or status events.
+    if event[0] == "progress" and queue.qsize() >= PROGRESS_BACKLOG:
+        return
+    queue.put_nowait(event)
+
+
+event_bus = JobEventBus()
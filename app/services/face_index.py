@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+from uuid import uuid4
+
+import numpy as np
+
+from app.config import settings
+from app.services.gallery import ReferenceGallery, normalize_rows
+from app.services.matcher import DetectedFace
+
+EMBEDDINGS_FILE = "embeddings.f32"
+META_FILE = "meta.bin"
+INFO_FILE = "index.json"
+SEARCH_CHUNK_ROWS = 65536
+
+META_DTYPE = np.dtype(
+    [
+        ("frame_index", "<i8"),
+        ("timestamp_sec", "<f8"),
+        ("x1", "<f4"),
+        ("y1", "<f4"),
+        ("x2", "<f4"),
+        ("y2", "<f4"),
+        ("det_score", "<f4"),
+    ]
+)
+
+
+def face_index_root() -> Path:
+    return Path(settings.data_dir) / "indexes"
+
+
+def face_index_path(video_sha256: str) -> Path:
+    return face_index_root() / video_sha256
+
+
+class FaceIndexWriter:
+    # Rows are appended to two raw files (normalized float32 embeddings and META_DTYPE records),
+    # so memory use does not grow with video length and readers can memory-map both.
+    def __init__(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+        self.dim = 0
+        self._embeddings = (directory / EMBEDDINGS_FILE).open("wb")
+        self._meta = (directory / META_FILE).open("wb")
+
+    def add(self, frame_index: int, timestamp_sec: float, faces: list[DetectedFace]) -> None:
+        if not faces:
+            return
+        matrix = normalize_rows(np.stack([face.embedding for face in faces]))
+        meta = np.zeros(len(faces), dtype=META_DTYPE)
+        meta["frame_index"] = frame_index
+        meta["timestamp_sec"] = timestamp_sec
+        boxes = np.stack([np.asarray(face.bbox, dtype=np.float32)[:4] for face in faces])
+        for column, name in enumerate(("x1", "y1", "x2", "y2")):
+            meta[name] = boxes[:, column]
+        meta["det_score"] = [face.det_score for face in faces]
+        self._append(matrix, meta)
+
+    def append_index(self, directory: Path) -> None:
+        index = FaceIndex.open(directory)
+        if index is not None and index.count:
+            self._append(np.asarray(index.embeddings), np.asarray(index.meta))
+
+    def close(self, info: dict) -> None:
+        self._embeddings.close()
+        self._meta.close()
+        payload = {**info, "count": self.count, "dim": self.dim}
+        (self.directory / INFO_FILE).write_text(json.dumps(payload), encoding="utf-8")
+
+    def abort(self) -> None:
+        self._embeddings.close()
+        self._meta.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _append(self, matrix: np.ndarray, meta: np.ndarray) -> None:
+        if self.dim and matrix.shape[1] != self.dim:
+            raise ValueError("embedding dimension changed while indexing")
+        self.dim = matrix.shape[1]
+        self._embeddings.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+        self._meta.write(np.ascontiguousarray(meta, dtype=META_DTYPE).tobytes())
+        self.count += len(meta)
+
+
+class FaceIndex:
+    def __init__(self, directory: Path, info: dict, embeddings: np.ndarray, meta: np.ndarray) -> None:
+        self.directory = directory
+        self.info = info
+        self.embeddings = embeddings
+        self.meta = meta
+
+    @property
+    def count(self) -> int:
+        return len(self.meta)
+
+    @classmethod
+    def open(cls, directory: Path) -> Optional[FaceIndex]:
+        info_path = directory / INFO_FILE
+        if not info_path.exists():
+            return None
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+        count, dim = info["count"], info["dim"]
+        if not count:
+            return cls(directory, info, np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=META_DTYPE))
+        embeddings = np.memmap(directory / EMBEDDINGS_FILE, dtype=np.float32, mode="r", shape=(count, dim))
+        meta = np.memmap(directory / META_FILE, dtype=META_DTYPE, mode="r", shape=(count,))
+        return cls(directory, info, embeddings, meta)
+
+
+@contextmanager
+def build_face_index(target: Optional[Path], info: dict) -> Iterator[Optional[FaceIndexWriter]]:
+    # Written to a staging directory and swapped in only when the scan succeeds.
+    if target is None:
+        yield None
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    writer = FaceIndexWriter(target.parent / f".{target.name}.{uuid4().hex}")
+    try:
+        yield writer
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close({**info, "created_at": datetime.utcnow().isoformat()})
+    replace_directory(writer.directory, target)
+
+
+def replace_directory(source: Path, target: Path) -> None:
+    stale = target.parent / f".{target.name}.{uuid4().hex}.old"
+    if target.exists():
+        target.replace(stale)
+    source.replace(target)
+    shutil.rmtree(stale, ignore_errors=True)
+
+
+def search_face_indexes(
+    gallery: ReferenceGallery,
+    min_confidence: float,
+    limit: Optional[int] = None,
+    root: Optional[Path] = None,
+) -> list[dict]:
+    root = root or face_index_root()
+    if not len(gallery) or not root.exists():
+        return []
+
+    directories = [path for path in root.iterdir() if path.is_dir() and not path.name.startswith(".")]
+    directories.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    hits: list[dict] = []
+    for directory in directories[:limit]:
+        index = FaceIndex.open(directory)
+        if index is None or not index.count or index.info["dim"] != gallery.dim:
+            continue
+        hits.extend(search_face_index(index, gallery, min_confidence))
+    hits.sort(key=lambda item: (item["video_sha256"], item["first_seen_sec"]))
+    return hits
+
+
+def search_face_index(index: FaceIndex, gallery: ReferenceGallery, min_confidence: float) -> list[dict]:
+    people = len(gallery.names)
+    best = np.full(people, -np.inf, dtype=np.float32)
+    first_seen = np.full(people, np.inf)
+    matches = np.zeros(people, dtype=np.int64)
+    for start in range(0, index.count, SEARCH_CHUNK_ROWS):
+        confidence = (gallery.person_scores(index.embeddings[start : start + SEARCH_CHUNK_ROWS]) + 1.0) / 2.0
+        above = confidence >= min_confidence
+        timestamps = np.asarray(index.meta["timestamp_sec"][start : start + SEARCH_CHUNK_ROWS])
+        matches += above.sum(axis=0)
+        best = np.maximum(best, np.where(above, confidence, -np.inf).max(axis=0))
+        first_seen = np.minimum(first_seen, np.where(above, timestamps[:, None], np.inf).min(axis=0))
+
+    return [
+        {
+            "video_sha256": index.directory.name,
+            "video_path": index.info.get("video_path"),
+            "name": gallery.names[person],
+            "confidence": round(float(best[person]) * 100.0, 2),
+            "first_seen_sec": round(float(first_seen[person]), 2),
+            "matches": int(matches[person]),
+        }
+        for person in np.flatnonzero(matches)
+    ]
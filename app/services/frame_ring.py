@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+FRAME_DTYPE = np.uint8
+
+# What a reader needs to map the ring: block name, slot count and frame shape.
+RingSpec = tuple[str, int, tuple[int, ...]]
+
+
+class FrameRing:
+    # Fixed-size frame slots in one shared-memory block. Only slot indices cross process boundaries:
+    # every process maps the same block and sees a slot as an ndarray view, so frames are never pickled.
+    # The owner hands out slots from its free list; when all of them are held by readers, acquire()
+    # returns None and the writer has to wait for a release.
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, shape: tuple[int, ...], owner: bool) -> None:
+        self.shm = shm
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.owner = owner
+        self._frames = np.ndarray((slots, *self.shape), dtype=FRAME_DTYPE, buffer=shm.buf)
+        self._free = list(range(slots - 1, -1, -1)) if owner else []
+
+    @classmethod
+    def create(cls, slots: int, shape: tuple[int, ...]) -> FrameRing:
+        size = max(1, slots * int(np.prod(shape)) * np.dtype(FRAME_DTYPE).itemsize)
+        return cls(shared_memory.SharedMemory(create=True, size=size), slots, shape, owner=True)
+
+    @classmethod
+    def attach(cls, spec: RingSpec) -> FrameRing:
+        name, slots, shape = spec
+        return cls(shared_memory.SharedMemory(name=name), slots, shape, owner=False)
+
+    @property
+    def spec(self) -> RingSpec:
+        return self.shm.name, self.slots, self.shape
+
+    @property
+    def free(self) -> int:
+        return len(self._free)
+
+    def frame(self, slot: int) -> np.ndarray:
+        return self._frames[slot]
+
+    def acquire(self) -> Optional[int]:
+        return self._free.pop() if self._free else None
+
+    def write(self, slot: int, frame: np.ndarray) -> None:
+        if frame.shape != self.shape:
+            raise RuntimeError(f"frame shape {frame.shape} does not fit ring slots of {self.shape}")
+        np.copyto(self._frames[slot], frame)
+
+    def release(self, slot: int) -> None:
+        self._free.append(slot)
+
+    def close(self) -> None:
+        self._frames = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # A reader unwinding an exception can still hold slot views; its mapping ends with the process.
+            pass
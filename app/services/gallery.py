@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable
+
+import numpy as np
+
+
+class ReferenceGallery:
+    def __init__(self, names: list[str], matrix: np.ndarray, person_index: np.ndarray) -> None:
+        self.names = names
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.person_index = np.ascontiguousarray(person_index, dtype=np.int64)
+        self._fingerprint: str | None = None
+        # Rows are grouped by person, so reduceat over these offsets gives a per-person max.
+        if len(self.person_index):
+            self._offsets = np.flatnonzero(np.r_[True, np.diff(self.person_index) != 0])
+        else:
+            self._offsets = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_embeddings(cls, items: Iterable[tuple[str, np.ndarray]]) -> ReferenceGallery:
+        grouped: dict[str, list[np.ndarray]] = {}
+        for name, embedding in items:
+            grouped.setdefault(name, []).append(np.asarray(embedding, dtype=np.float32).ravel())
+        if not grouped:
+            return cls([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64))
+
+        names = list(grouped)
+        rows = [embedding for name in names for embedding in grouped[name]]
+        person_index = np.repeat(np.arange(len(names)), [len(grouped[name]) for name in names])
+        return cls(names, normalize_rows(np.stack(rows)), person_index)
+
+    def __len__(self) -> int:
+        return len(self.person_index)
+
+    def subset(self, names: Iterable[str]) -> ReferenceGallery:
+        wanted = set(names)
+        keep = np.array([index for index, name in enumerate(self.names) if name in wanted], dtype=np.int64)
+        rows = np.isin(self.person_index, keep)
+        return ReferenceGallery(
+            [self.names[index] for index in keep],
+            self.matrix[rows],
+            np.searchsorted(keep, self.person_index[rows]),
+        )
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            digest.update("\n".join(self.names).encode())
+            digest.update(self.person_index.tobytes())
+            digest.update(self.matrix.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def person_scores(self, embeddings: np.ndarray) -> np.ndarray:
+        queries = normalize_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        similarities = queries @ self.matrix.T
+        return np.maximum.reduceat(similarities, self._offsets, axis=1)
+
+    def match(self, embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not len(self) or not len(embeddings):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.astype(np.float32)
+        scores = self.person_scores(embeddings)
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(best)), best]
+
+    def top_k(self, embeddings: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if not len(self) or not len(embeddings):
+            empty = np.zeros((0, 0), dtype=np.int64)
+            return empty, empty.astype(np.float32)
+        scores = self.person_scores(embeddings)
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def embedding_to_bytes(embedding: np.ndarray) -> bytes:
+    return np.ascontiguousarray(embedding, dtype=np.float32).ravel().tobytes()
+
+
+def embedding_from_bytes(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Person, ReferenceImage
+from app.services.ann_index import (
+    IvfGallery,
+    assign_lists,
+    default_nlist,
+    gallery_index_store,
+    measure_recall,
+    synthetic_queries,
+    train_centroids,
+)
+from app.services.gallery import (
+    ReferenceGallery,
+    embedding_from_bytes,
+    embedding_to_bytes,
+    normalize_rows,
+)
+from app.services.metrics import metrics
+from app.services.model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class GalleryCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = 0
+        self._gallery: Optional[ReferenceGallery] = None
+        # Image ids and IVF list ids of the cached gallery's rows, so an index can be built without a reload.
+        self._rows: Optional[tuple[np.ndarray, np.ndarray]] = None
+        self._ann_gallery: Optional[ReferenceGallery] = None
+        self._gallery_version = -1
+        self._training = False
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def training(self) -> bool:
+        return self._training
+
+    @property
+    def cached(self) -> Optional[ReferenceGallery]:
+        return self._gallery
+
+    def invalidate(self) -> int:
+        with self._lock:
+            self._version += 1
+            self._gallery = None
+            self._rows = None
+            self._ann_gallery = None
+            return self._version
+
+    def get(self, db: Session, ann: bool = False) -> ReferenceGallery:
+        with self._lock:
+            cached = self._gallery is not None and self._gallery_version == self._version
+            if cached and not ann:
+                return self._gallery
+            if cached and self._ann_gallery is not None:
+                return self._ann_gallery
+            version = self._version
+            loaded = (self._gallery, *self._rows) if cached else None
+
+        gallery, image_ids, ann_lists = loaded or load_gallery_rows(db)
+        ann_gallery = None
+        if ann:
+            ann_gallery = build_ann_gallery(db, gallery, image_ids, ann_lists)
+            if ann_gallery is None:
+                # The index needs training: match exactly until it is trained in the background.
+                self._start_training(gallery, image_ids, version)
+        with self._lock:
+            # A reference change during the load makes this gallery stale; serve it once but do not cache it.
+            if self._version == version:
+                self._gallery = gallery
+                self._rows = (image_ids, ann_lists)
+                self._gallery_version = version
+                if ann_gallery is not None:
+                    self._ann_gallery = ann_gallery
+        return ann_gallery if ann_gallery is not None else gallery
+
+    def _start_training(self, gallery: ReferenceGallery, image_ids: np.ndarray, version: int) -> None:
+        with self._lock:
+            if self._training:
+                return
+            self._training = True
+        threading.Thread(target=self._train, args=(gallery, image_ids, version), name="ann-train", daemon=True).start()
+
+    def _train(self, gallery: ReferenceGallery, image_ids: np.ndarray, version: int) -> None:
+        try:
+            ann_gallery = train_ann_gallery(gallery, image_ids)
+            with self._lock:
+                if self._version == version and self._gallery_version == version:
+                    self._ann_gallery = ann_gallery
+        except Exception:
+            logger.exception("Training the ANN index failed")
+        finally:
+            with self._lock:
+                self._training = False
+
+
+gallery_cache = GalleryCache()
+# Reported from the last loaded gallery; a scrape never loads it.
+metrics.gauge(
+    "piv_gallery_embeddings",
+    "Reference embeddings in the loaded gallery.",
+    lambda: len(gallery_cache.cached or ()),
+)
+metrics.gauge(
+    "piv_gallery_people",
+    "People in the loaded gallery.",
+    lambda: len(getattr(gallery_cache.cached, "names", ())),
+)
+
+
+_ann_lock = threading.Lock()
+
+
+def load_reference_gallery(db: Session) -> ReferenceGallery:
+    return load_gallery_rows(db)[0]
+
+
+def load_gallery_rows(db: Session) -> tuple[ReferenceGallery, np.ndarray, np.ndarray]:
+    # Also returns each row's image id and IVF list id (-1 when unassigned).
+    empty = np.zeros(0, dtype=np.int64)
+    rows = db.execute(
+        select(ReferenceImage, Person.name)
+        .join(Person)
+        .order_by(ReferenceImage.person_id, ReferenceImage.id)
+    ).all()
+    if not rows:
+        return ReferenceGallery.from_embeddings([]), empty, empty
+
+    _backfill_missing_embeddings(db, [image for image, _ in rows if image.embedding is None])
+
+    images = [(name, image) for image, name in rows if image.embedding]
+    if not images:
+        return ReferenceGallery.from_embeddings([]), empty, empty
+    dim = len(images[0][1].embedding) // 4
+    images = [(name, image) for name, image in images if len(image.embedding) == dim * 4]
+
+    matrix = np.empty((len(images), dim), dtype=np.float32)
+    person_index = np.empty(len(images), dtype=np.int64)
+    image_ids = np.empty(len(images), dtype=np.int64)
+    ann_lists = np.empty(len(images), dtype=np.int64)
+    names: list[str] = []
+    for row, (name, image) in enumerate(images):
+        if not names or names[-1] != name:
+            names.append(name)
+        matrix[row] = embedding_from_bytes(image.embedding)
+        person_index[row] = len(names) - 1
+        image_ids[row] = image.id
+        ann_lists[row] = image.ann_list if image.ann_list is not None else -1
+    return ReferenceGallery(names, normalize_rows(matrix), person_index), image_ids, ann_lists
+
+
+def build_ann_gallery(
+    db: Session,
+    gallery: ReferenceGallery,
+    image_ids: np.ndarray,
+    ann_lists: np.ndarray,
+) -> Optional[ReferenceGallery]:
+    # Small galleries are matched exactly; an exact scan is cheaper than probing lists.
+    # None when the stored centroids are missing or stale and the index has to be trained first.
+    if len(gallery) < settings.ann_min_rows:
+        return gallery
+    with _ann_lock:
+        loaded = gallery_index_store.load()
+        growth = settings.ann_retrain_growth
+        if (
+            loaded is None
+            or loaded[0].shape[1] != gallery.dim
+            or not loaded[1]["trained_rows"] / growth <= len(gallery) <= loaded[1]["trained_rows"] * growth
+        ):
+            return None
+        centroids = loaded[0]
+        lists = ann_lists.astype(np.int32)
+        changed = (ann_lists < 0) | (ann_lists >= len(centroids))
+        if changed.any():
+            lists[changed] = assign_lists(centroids, gallery.matrix[changed])
+            _store_lists(db, image_ids[changed], lists[changed])
+    return IvfGallery(gallery.names, gallery.matrix, gallery.person_index, centroids, lists, settings.ann_nprobe)
+
+
+def train_ann_gallery(gallery: ReferenceGallery, image_ids: np.ndarray) -> IvfGallery:
+    # k-means over the whole gallery and a list id for every row; run off the request threads.
+    with _ann_lock:
+        centroids = train_centroids(gallery.matrix, default_nlist(len(gallery)))
+        lists = assign_lists(centroids, gallery.matrix)
+        ann_gallery = IvfGallery(
+            gallery.names,
+            gallery.matrix,
+            gallery.person_index,
+            centroids,
+            lists,
+            settings.ann_nprobe,
+        )
+        info = {"trained_rows": len(gallery), "nlist": len(centroids), "dim": gallery.dim}
+        info.update(measure_recall(ann_gallery, synthetic_queries(gallery.matrix, 256)))
+        gallery_index_store.save(centroids, info)
+        with SessionLocal() as db:
+            _store_lists(db, image_ids, lists)
+    return ann_gallery
+
+
+def _store_lists(db: Session, image_ids: np.ndarray, lists: np.ndarray) -> None:
+    db.execute(
+        update(ReferenceImage),
+        [{"id": int(image_id), "ann_list": int(item)} for image_id, item in zip(image_ids, lists)],
+    )
+    db.commit()
+
+
+def _backfill_missing_embeddings(db: Session, images: list[ReferenceImage]) -> None:
+    if not images:
+        return
+    data_dir = Path(settings.data_dir)
+    with registry.checkout_matcher() as matcher:
+        if not matcher.available:
+            return
+        for image in images:
+            embedding = matcher.extract_embedding_from_image_path(str(data_dir / image.image_path))
+            if embedding is not None:
+                image.embedding = embedding_to_bytes(embedding)
+    db.commit()
+
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import errno
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+import anyio
+
+FOLLOW_CHUNK_SIZE = 1 << 20
+
+
+class GrowingFile:
+    # Tracks how much of a file has been written so a reader can follow it while it is still arriving.
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.size = 0
+        self.done = False
+        self.failed = False
+        self._cond = threading.Condition()
+
+    def advance(self, written: int) -> None:
+        with self._cond:
+            self.size += written
+            self._cond.notify_all()
+
+    def finish(self, failed: bool = False) -> None:
+        with self._cond:
+            self.done = True
+            self.failed = failed
+            self._cond.notify_all()
+
+    def wait_done(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout=timeout)
+            return self.done and not self.failed
+
+    def follow(self, stop: threading.Event, chunk_size: int = FOLLOW_CHUNK_SIZE) -> Iterator[bytes]:
+        offset = 0
+        with self.path.open("rb") as handle:
+            while not stop.is_set():
+                with self._cond:
+                    if offset >= self.size and not self.done:
+                        self._cond.wait(timeout=0.5)
+                        continue
+                    available = self.size - offset
+                if available <= 0:
+                    return
+                data = handle.read(min(chunk_size, available))
+                offset += len(data)
+                yield data
+
+
+async def ingest_stream(
+    chunks: AsyncIterator[bytes],
+    target_path: Path,
+    growing: Optional[GrowingFile] = None,
+) -> tuple[str, int]:
+    # One pass over the request body: every chunk is hashed and written straight to its final path.
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(target_path, "wb") as handle:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                digest.update(chunk)
+                await handle.write(chunk)
+                size += len(chunk)
+                if growing is not None:
+                    await handle.flush()
+                    growing.advance(len(chunk))
+    except BaseException:
+        if growing is not None:
+            growing.finish(failed=True)
+        target_path.unlink(missing_ok=True)
+        raise
+    if growing is not None:
+        growing.finish()
+    return digest.hexdigest(), size
+
+
+class LiveUpload:
+    # Feeds a still-arriving upload to the decoder through a named pipe. The feeder reads from the
+    # file on disk, so a slow decoder never stalls the upload and nothing is buffered in memory.
+    def __init__(self, path: Path, fifo_dir: Path) -> None:
+        self.file = GrowingFile(path)
+        fifo_dir.mkdir(parents=True, exist_ok=True)
+        self.fifo_path = fifo_dir / f"{path.stem}.fifo"
+        os.mkfifo(self.fifo_path)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def open_source(self) -> Path:
+        if self.file.done and not self.file.failed:
+            return self.file.path
+        self._thread = threading.Thread(target=self._feed, name=f"fifo-{self.fifo_path.stem}", daemon=True)
+        self._thread.start()
+        return self.fifo_path
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.fifo_path.unlink(missing_ok=True)
+
+    def _feed(self) -> None:
+        fd = None
+        while fd is None:
+            if self._stop.is_set():
+                return
+            try:
+                fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as exc:
+                if exc.errno != errno.ENXIO:
+                    raise
+                time.sleep(0.1)
+        os.set_blocking(fd, True)
+        try:
+            for chunk in self.file.follow(self._stop):
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(fd, view) :]
+        except BrokenPipeError:
+            pass
+        finally:
+            os.close(fd)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import VideoJob
+from app.services.csv_writer import write_results_csv
+from app.services.events import TERMINAL_STATUSES, event_bus
+from app.services.gallery_cache import gallery_cache
+from app.services.ingest import LiveUpload
+from app.services.metrics import metrics
+from app.services.result_cache import process_video_cached
+from app.services.storage import build_abs_path, to_relative_path
+from app.services.timeline import timeline_suffix
+from app.services.video_processor import ProcessingCancelled, ProcessingStats
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobManager:
+    def __init__(self, workers: int, max_pending: int, progress_interval_sec: float = 1.0) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.progress_interval_sec = progress_interval_sec
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._live_uploads: dict[str, LiveUpload] = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._cancel_events)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Batch videos run on the same workers, so together they never need more models than the pool holds.
+        if self._executor is None:
+            raise RuntimeError("job manager is not running")
+        return self._executor
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="video-job")
+        with SessionLocal() as db:
+            unfinished = db.execute(
+                select(VideoJob)
+                .where(VideoJob.status.in_(ACTIVE_STATUSES))
+                .order_by(VideoJob.created_at)
+            ).scalars().all()
+            job_ids = []
+            for job in unfinished:
+                if job.video_sha256 is None:
+                    # Overlap uploads record their hash once the body is complete: this one was cut off.
+                    job.error = "upload did not complete before the restart"
+                    _finish(job, "failed")
+                    continue
+                job.status = "queued"
+                job_ids.append(job.id)
+            db.commit()
+        for job_id in job_ids:
+            self._schedule(job_id)
+        if job_ids:
+            logger.info("Resumed %d unfinished video jobs", len(job_ids))
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(
+        self,
+        video_path: str,
+        params: dict,
+        job_id: Optional[str] = None,
+        video_sha256: Optional[str] = None,
+        live: Optional[LiveUpload] = None,
+    ) -> VideoJob:
+        job_id = job_id or uuid4().hex
+        with self._lock:
+            if len(self._cancel_events) >= self.max_pending:
+                raise JobQueueFull()
+            if job_id in self._cancel_events:
+                raise ValueError("job id already in use")
+            self._cancel_events[job_id] = threading.Event()
+            if live is not None:
+                self._live_uploads[job_id] = live
+
+        try:
+            with SessionLocal() as db:
+                if db.get(VideoJob, job_id) is not None:
+                    raise ValueError("job id already in use")
+                job = VideoJob(
+                    id=job_id,
+                    status="queued",
+                    video_path=video_path,
+                    video_sha256=video_sha256,
+                    params_json=json.dumps(params),
+                )
+                db.add(job)
+                db.commit()
+                db.refresh(job)
+                db.expunge(job)
+        except Exception:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+                self._live_uploads.pop(job_id, None)
+            raise
+        self._submit_to_executor(job_id)
+        return job
+
+    def record_upload(self, job_id: str, video_sha256: str) -> Optional[VideoJob]:
+        with SessionLocal() as db:
+            job = db.get(VideoJob, job_id)
+            if job is None:
+                return None
+            job.video_sha256 = video_sha256
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+            return job
+
+    def cancel(self, job_id: str) -> Optional[VideoJob]:
+        with SessionLocal() as db:
+            job = db.get(VideoJob, job_id)
+            if job is None:
+                return None
+            if job.status in ACTIVE_STATUSES:
+                with self._lock:
+                    event = self._cancel_events.get(job_id)
+                if event is not None:
+                    event.set()
+                if job.status == "queued" or event is None:
+                    _finish(job, "cancelled")
+                    db.commit()
+                    _publish_status(job)
+            db.refresh(job)
+            db.expunge(job)
+            return job
+
+    def _schedule(self, job_id: str) -> None:
+        with self._lock:
+            self._cancel_events.setdefault(job_id, threading.Event())
+        self._submit_to_executor(job_id)
+
+    def _submit_to_executor(self, job_id: str) -> None:
+        self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            cancel_event = self._cancel_events.setdefault(job_id, threading.Event())
+        try:
+            with SessionLocal() as db:
+                job = db.get(VideoJob, job_id)
+                if job is None or job.status != "queued":
+                    return
+                if cancel_event.is_set():
+                    _finish(job, "cancelled")
+                    db.commit()
+                    _publish_status(job)
+                    return
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                db.commit()
+                _publish_status(job)
+                self._execute(db, job, cancel_event)
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+                live = self._live_uploads.pop(job_id, None)
+            if live is not None:
+                live.close()
+
+    def _execute(self, db: Session, job: VideoJob, cancel_event: threading.Event) -> None:
+        data_dir = Path(settings.data_dir)
+        video_path = build_abs_path(data_dir, job.video_path)
+        with self._lock:
+            live = self._live_uploads.get(job.id)
+        params = json.loads(job.params_json)
+        stats = ProcessingStats()
+        last_update = 0.0
+
+        def report_progress(frames_done: int, frames_total: int) -> None:
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update < self.progress_interval_sec and frames_done < frames_total:
+                return
+            last_update = now
+            job.frames_done = frames_done
+            job.frames_total = frames_total
+            db.commit()
+            event_bus.publish(job.id, "progress", {"frames_done": frames_done, "frames_total": frames_total})
+
+        timeline_path = None
+        if params.get("timeline"):
+            timeline_path = data_dir / "results" / f"{job.id}{timeline_suffix(params['timeline_format'])}"
+
+        def run(source: Path, video_sha256: Optional[str] = None) -> list[dict]:
+            return process_video_cached(
+                source,
+                video_sha256,
+                gallery,
+                params,
+                stats=stats,
+                on_result=lambda item: event_bus.publish(job.id, "first_seen", item),
+                on_refined=lambda item: event_bus.publish(job.id, "first_seen_refined", item),
+                timeline_path=timeline_path,
+                progress=report_progress,
+                cancel_event=cancel_event,
+            )
+
+        try:
+            gallery = gallery_cache.get(db, ann=params.get("use_ann", False))
+            if live is None:
+                results = run(video_path, job.video_sha256)
+            else:
+                try:
+                    results = run(live.open_source())
+                except RuntimeError:
+                    if stats.frames_decoded:
+                        raise
+                    # The container cannot be decoded from a pipe (e.g. MP4 with its index at the end):
+                    # wait for the upload to finish and process the file instead.
+                    live.close()
+                    if not live.file.wait_done():
+                        raise RuntimeError("upload did not complete")
+                    results = run(video_path)
+                if not live.file.wait_done():
+                    raise RuntimeError("upload did not complete")
+        except ProcessingCancelled:
+            if self._stopping.is_set():
+                # Interrupted by shutdown rather than by the user: resume on next start.
+                job.status = "queued"
+                job.started_at = None
+            else:
+                _finish(job, "cancelled")
+            db.commit()
+            _publish_status(job)
+            return
+        except Exception as exc:
+            logger.exception("Video job %s failed", job.id)
+            job.error = str(exc)
+            _finish(job, "failed")
+            db.commit()
+            _publish_status(job)
+            return
+
+        csv_path = data_dir / "results" / f"{job.id}.csv"
+        stats.add_time("csv", write_results_csv(csv_path, results))
+        job.results_json = json.dumps(results)
+        job.stats_json = json.dumps(stats.as_dict())
+        job.csv_path = to_relative_path(data_dir, csv_path)
+        if timeline_path is not None and timeline_path.exists():
+            job.timeline_path = to_relative_path(data_dir, timeline_path)
+        _finish(job, "completed")
+        db.commit()
+        _publish_status(job)
+
+
+def _finish(job: VideoJob, status: str) -> None:
+    job.status = status
+    job.finished_at = datetime.utcnow()
+
+
+def _publish_status(job: VideoJob) -> None:
+    event_bus.publish(job.id, "status", {"status": job.status, "error": job.error, "csv_path": job.csv_path})
+    if job.status in TERMINAL_STATUSES:
+        event_bus.close(job.id)
+
+
+job_manager = JobManager(settings.job_workers(), settings.job_max_pending)
+metrics.gauge("piv_jobs_pending", "Video jobs queued or running.", lambda: job_manager.pending)
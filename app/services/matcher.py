@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Optional
 
@@ -8,29 +9,115 @@ import cv2
 import numpy as np
 
 from app.config import settings
+from app.services.gallery import ReferenceGallery
+from app.services.model_cache import face_model_pack
+
+RECOGNITION_BATCH_SIZE = 64
+
+
+@dataclass
+class DetectedFace:
+    bbox: np.ndarray
+    det_score: float
+    embedding: np.ndarray
 
 
 class Matcher:
-    def __init__(self) -> None:
+    def __init__(self, det_size: tuple[int, int] = (640, 640)) -> None:
         self.available = False
         self.app = None
+        self.det_model = None
+        self.rec_model = None
+        self.det_size = det_size
+        self.load_error: Optional[str] = None
+        self._norm_crop = None
         try:
             model_dir = Path(settings.resolved_model_dir())
             model_dir.mkdir(parents=True, exist_ok=True)
             os.environ.setdefault("INSIGHTFACE_HOME", str(model_dir))
             from insightface.app import FaceAnalysis
+            from insightface.utils.face_align import norm_crop
 
-            self.app = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])
-            self.app.prepare(ctx_id=0, det_size=(640, 640))
+            root = Path(os.environ["INSIGHTFACE_HOME"])
+            # Only detection and ArcFace are needed; skipping genderage/landmark heads saves a pass per face.
+            self.app = FaceAnalysis(
+                name=face_model_pack(root),
+                root=str(root),
+                allowed_modules=["detection", "recognition"],
+                providers=["CPUExecutionProvider"],
+            )
+            if settings.inference_threads > 0:
+                # FaceAnalysis takes no session options, so its sessions are reopened with a thread limit.
+                for model in self.app.models.values():
+                    model.session = _limited_session(model.session, settings.inference_threads)
+            self.app.prepare(ctx_id=0, det_size=det_size)
+            self.det_model = self.app.det_model
+            self.rec_model = self.app.models["recognition"]
+            self._norm_crop = norm_crop
             self.available = True
-        except Exception:
+        except Exception as exc:
             self.app = None
+            self.load_error = f"{type(exc).__name__}: {exc}"
 
     def detect_faces(self, frame: np.ndarray) -> list:
         if not self.available or self.app is None:
             return []
         return self.app.get(frame)
 
+    def detect_and_embed(
+        self,
+        regions: list[tuple[np.ndarray, tuple[int, int], float]],
+        det_size: Optional[tuple[int, int]] = None,
+    ) -> list[list[DetectedFace]]:
+        # Regions may come from a downscaled pyramid level: boxes are mapped back to frame pixels with
+        # each region's scale. det_size overrides the detector input size for this call.
+        output: list[list[DetectedFace]] = [[] for _ in regions]
+        if not self.available or self.det_model is None or self.rec_model is None:
+            return output
+
+        image_size = self.rec_model.input_size[0]
+        owners: list[tuple[int, np.ndarray, float]] = []
+        aligned: list[np.ndarray] = []
+        for region_index, (region, (offset_x, offset_y), scale) in enumerate(regions):
+            bboxes, kpss = self.det_model.detect(region, input_size=det_size, max_num=0, metric="default")
+            if bboxes is None or kpss is None:
+                continue
+            for bbox, kps in zip(bboxes, kpss):
+                aligned.append(self._norm_crop(region, landmark=kps, image_size=image_size))
+                frame_box = bbox[:4] * scale + np.array([offset_x, offset_y, offset_x, offset_y], dtype=bbox.dtype)
+                owners.append((region_index, frame_box, float(bbox[4])))
+
+        for start in range(0, len(aligned), RECOGNITION_BATCH_SIZE):
+            embeddings = self.rec_model.get_feat(aligned[start : start + RECOGNITION_BATCH_SIZE])
+            for (region_index, bbox, score), embedding in zip(owners[start:], embeddings):
+                output[region_index].append(DetectedFace(bbox=bbox, det_score=score, embedding=embedding))
+        return output
+
+    def embed_images(self, images: list[Optional[np.ndarray]]) -> list[Optional[np.ndarray]]:
+        # One embedding per image (its most confident face), with recognition batched across images.
+        output: list[Optional[np.ndarray]] = [None] * len(images)
+        if not self.available or self.det_model is None or self.rec_model is None:
+            return output
+
+        image_size = self.rec_model.input_size[0]
+        owners: list[int] = []
+        aligned: list[np.ndarray] = []
+        for image_index, image in enumerate(images):
+            if image is None:
+                continue
+            bboxes, kpss = self.det_model.detect(image, max_num=0, metric="default")
+            if bboxes is None or kpss is None or not len(bboxes):
+                continue
+            best = int(np.argmax(bboxes[:, 4]))
+            aligned.append(self._norm_crop(image, landmark=kpss[best], image_size=image_size))
+            owners.append(image_index)
+
+        for start in range(0, len(aligned), RECOGNITION_BATCH_SIZE):
+            embeddings = self.rec_model.get_feat(aligned[start : start + RECOGNITION_BATCH_SIZE])
+            for image_index, embedding in zip(owners[start:], embeddings):
+                output[image_index] = embedding
+        return output
+
     def extract_embedding_from_image_path(self, image_path: str) -> Optional[np.ndarray]:
         image = cv2.imread(str(image_path))
         if image is None:
@@ -41,31 +128,26 @@ class Matcher:
         face = max(faces, key=lambda f: getattr(f, "det_score", 0.0))
         return getattr(face, "embedding", None)
 
-    def build_gallery(self, items: Iterable[tuple[str, str]]) -> list[dict]:
-        gallery: list[dict] = []
+    def build_gallery(self, items: Iterable[tuple[str, str]]) -> ReferenceGallery:
+        embeddings: list[tuple[str, np.ndarray]] = []
         for name, image_path in items:
             embedding = self.extract_embedding_from_image_path(image_path)
             if embedding is None:
                 continue
-            gallery.append({"name": name, "embedding": embedding})
-        return gallery
-
-    def match(self, embedding: np.ndarray, gallery: list[dict]) -> tuple[Optional[dict], float]:
-        best: Optional[dict] = None
-        best_score = -1.0
-        for item in gallery:
-            score = cosine_similarity(embedding, item["embedding"])
-            if score > best_score:
-                best = item
-                best_score = score
-        return best, best_score
+            embeddings.append((name, embedding))
+        return ReferenceGallery.from_embeddings(embeddings)
 
+    def match(self, embedding: np.ndarray, gallery: ReferenceGallery) -> tuple[Optional[str], float]:
+        person_ids, scores = gallery.match(np.atleast_2d(embedding))
+        if not len(person_ids):
+            return None, -1.0
+        return gallery.names[int(person_ids[0])], float(scores[0])
 
-def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b)) + 1e-8
-    return float(np.dot(a, b) / denom)
 
+def _limited_session(session, threads: int):
+    import onnxruntime
 
-def warm_up_models() -> bool:
-    matcher = Matcher()
-    return matcher.available
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return onnxruntime.InferenceSession(session._model_path, sess_options=options, providers=session.get_providers())
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from typing import Callable
+
+from app.config import settings
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0)
+COUNT_BUCKETS = (0.0, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labels: tuple[str, ...]) -> None:
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def _label_text(self, values: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._label_text(key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    # Read through a callback at scrape time, so nothing is recorded on the hot path.
+    kind = "gauge"
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, read: Callable[[], float]) -> None:
+        super().__init__(registry, name, help_text, ())
+        self.read = read
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {_number(self.read())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...],
+    ) -> None:
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not self.registry.enabled or math.isnan(value):
+            return
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                bucket_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    # Observations are no-ops when disabled; with metrics enabled each one is a bisect and a few
+    # additions under a lock, recorded once per job or model load rather than per frame.
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(self, name, help_text, read))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: tuple[float, ...],
+        labels: tuple[str, ...] = (),
+    ) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+metrics = MetricsRegistry(settings.metrics_enabled)
+
+stage_frame_seconds = metrics.histogram(
+    "piv_video_stage_seconds_per_frame",
+    "Seconds one video spent in a processing stage, divided by its decoded frames.",
+    LATENCY_BUCKETS,
+    ("stage",),
+)
+job_seconds = metrics.histogram("piv_video_seconds", "Wall time to process one video.", DURATION_BUCKETS)
+frames_per_second = metrics.histogram(
+    "piv_video_frames_per_second",
+    "Decoded frames per second of wall time for one video.",
+    RATE_BUCKETS,
+)
+faces_per_frame = metrics.histogram(
+    "piv_video_faces_per_frame",
+    "Average faces found per decoded frame of one video.",
+    COUNT_BUCKETS,
+)
+csv_write_seconds = metrics.histogram("piv_csv_write_seconds", "Time to write one result CSV.", LATENCY_BUCKETS)
+model_load_seconds = metrics.histogram(
+    "piv_model_load_seconds",
+    "Time to construct one model instance.",
+    DURATION_BUCKETS,
+    ("model",),
+)
+videos_processed = metrics.counter(
+    "piv_videos_processed_total",
+    "Videos processed, by result cache outcome.",
+    ("cache",),
+)
+
+
+def record_video_metrics(stats, wall_sec: float) -> None:
+    if not metrics.enabled:
+        return
+    job_seconds.observe(wall_sec)
+    if not stats.frames_decoded:
+        return
+    frames_per_second.observe(stats.frames_decoded / max(wall_sec, 1e-9))
+    faces_per_frame.observe(stats.faces_detected / stats.frames_decoded)
+    for stage, seconds in stats.timings.items():
+        if stage != "total":
+            stage_frame_seconds.observe(seconds / stats.frames_decoded, stage)
+
+
+def timed_factory(model: str, factory: Callable, *args):
+    started = time.perf_counter()
+    instance = factory(*args)
+    if getattr(instance, "available", False):
+        model_load_seconds.observe(time.perf_counter() - started, model)
+    return instance
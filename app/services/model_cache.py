@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+FACE_PACK = "buffalo_l"
+# FaceAnalysis opens an ONNX session for every model in a pack before it filters by allowed_modules;
+# a pack holding only detection and recognition skips loading the three unused models on every boot.
+FACE_PACK_FILES = {"buffalo_l": ("det_10g.onnx", "w600k_r50.onnx")}
+YOLO_EXPORT_SUFFIXES = {"onnx": ".onnx", "openvino": "_openvino_model"}
+
+_export_lock = threading.Lock()
+
+
+def face_model_pack(root: Path, name: str = FACE_PACK) -> str:
+    files = FACE_PACK_FILES.get(name)
+    models_dir = root / "models"
+    slim_name = f"{name}_slim"
+    slim_dir = models_dir / slim_name
+    if files is None:
+        return name
+    if all((slim_dir / file).is_file() for file in files):
+        return slim_name
+    source_dir = models_dir / name
+    if not all((source_dir / file).is_file() for file in files):
+        # Not downloaded yet: FaceAnalysis fetches the full pack and the next load slims it.
+        return name
+    tmp_dir = models_dir / f".{slim_name}.{uuid4().hex}.tmp"
+    tmp_dir.mkdir(parents=True)
+    try:
+        for file in files:
+            try:
+                os.link(source_dir / file, tmp_dir / file)
+            except OSError:
+                shutil.copy2(source_dir / file, tmp_dir / file)
+        if slim_dir.exists():
+            shutil.rmtree(slim_dir, ignore_errors=True)
+        tmp_dir.rename(slim_dir)
+    except OSError:
+        # Another process built it first, or the model directory is read-only.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not all((slim_dir / file).is_file() for file in files):
+            return name
+    return slim_name
+
+
+def yolo_artifact(weights: Path, export_format: str) -> Path:
+    # The exported model is kept next to the weights, so conversion only runs on the first boot.
+    suffix = YOLO_EXPORT_SUFFIXES.get(export_format)
+    if suffix is None:
+        return weights
+    target = weights.with_name(f"{weights.stem}{suffix}")
+    if target.exists():
+        return target
+    with _export_lock:
+        if target.exists():
+            return target
+        try:
+            from ultralytics import YOLO
+
+            exported = Path(YOLO(str(weights)).export(format=export_format, dynamic=True, verbose=False))
+            if exported != target:
+                os.replace(exported, target)
+        except Exception:
+            logger.warning("YOLO %s export failed; loading %s", export_format, weights.name, exc_info=True)
+            return weights
+    return target
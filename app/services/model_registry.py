@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Generic, Hashable, Iterator, Optional, TypeVar
+
+from app.config import settings
+from app.services.matcher import Matcher
+from app.services.metrics import metrics, timed_factory
+from app.services.yolo_detector import YoloConfig, YoloDetector
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_DET_SIZE = (640, 640)
+
+
+class ModelPool(Generic[T]):
+    def __init__(self, factory: Callable[[], T], size: int) -> None:
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle: queue.LifoQueue[T] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def fill(self) -> bool:
+        while True:
+            with self._lock:
+                if self._created >= self._size:
+                    return True
+                self._created += 1
+            instance = self._factory()
+            if not getattr(instance, "available", False):
+                self.last_error = getattr(instance, "load_error", None)
+                with self._lock:
+                    self._created -= 1
+                return False
+            self._idle.put(instance)
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[T]:
+        instance = self._acquire(timeout)
+        try:
+            yield instance
+        finally:
+            self._release(instance)
+
+    def _acquire(self, timeout: Optional[float]) -> T:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self._size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty as exc:
+            raise RuntimeError("timed out waiting for a model instance") from exc
+
+    def _release(self, instance: T) -> None:
+        if getattr(instance, "available", False):
+            self._idle.put(instance)
+            return
+        # Unusable instances are dropped so the next checkout retries the load.
+        with self._lock:
+            self._created -= 1
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        pool_size: int,
+        matcher_factory: Callable[[tuple[int, int]], Matcher] = Matcher,
+        yolo_factory: Callable[[YoloConfig], YoloDetector] = lambda config: YoloDetector(config=config),
+    ) -> None:
+        self.pool_size = pool_size
+        self._matcher_factory = matcher_factory
+        self._yolo_factory = yolo_factory
+        self._pools: dict[Hashable, ModelPool] = {}
+        self._lock = threading.Lock()
+
+    def matcher_pool(self, det_size: Optional[tuple[int, int]] = None) -> ModelPool[Matcher]:
+        size = tuple(det_size or DEFAULT_DET_SIZE)
+        return self._pool(("matcher", size), lambda: timed_factory("insightface", self._matcher_factory, size))
+
+    def yolo_pool(self) -> ModelPool[YoloDetector]:
+        # Confidence and IoU are predict-time arguments, so one pool of loaded weights serves every config.
+        return self._pool(("yolo",), lambda: timed_factory("yolo", self._yolo_factory, default_yolo_config()))
+
+    def checkout_matcher(self, det_size: Optional[tuple[int, int]] = None):
+        return self.matcher_pool(det_size).checkout()
+
+    @contextmanager
+    def checkout_yolo(self, config: Optional[YoloConfig] = None) -> Iterator[YoloDetector]:
+        with self.yolo_pool().checkout() as detector:
+            detector.config = config or default_yolo_config()
+            yield detector
+
+    def _pool(self, key: Hashable, factory: Callable[[], T]) -> ModelPool[T]:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ModelPool(factory, self.pool_size)
+                self._pools[key] = pool
+            return pool
+
+
+def default_yolo_config() -> YoloConfig:
+    return YoloConfig(confidence=settings.yolo_confidence, iou=settings.yolo_iou)
+
+
+registry = ModelRegistry(settings.model_pool_size)
+
+
+def warm_up_models() -> bool:
+    return registry.matcher_pool().fill()
+
+
+@dataclass
+class ModelLoadState:
+    state: str = "pending"
+    duration_sec: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ModelWarmup:
+    # Each model pool is filled on its own thread, so the InsightFace and YOLO imports and weight
+    # loads overlap and the app can serve /health (and report progress on /ready) meanwhile.
+    def __init__(self, pools: dict[str, Callable[[], ModelPool]]) -> None:
+        self.pools = pools
+        self.states = {name: ModelLoadState() for name in pools}
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def ready(self) -> bool:
+        return all(state.state == "ready" for state in self.states.values())
+
+    def start(self) -> None:
+        for name, pool in self.pools.items():
+            thread = threading.Thread(target=self._load, args=(name, pool), name=f"warm-up-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        for thread in self._threads:
+            thread.join(timeout)
+        return self.ready
+
+    def status(self) -> dict[str, dict]:
+        return {name: asdict(state) for name, state in self.states.items()}
+
+    def _load(self, name: str, pool: Callable[[], ModelPool]) -> None:
+        state = self.states[name]
+        state.state = "loading"
+        started = time.perf_counter()
+        try:
+            model_pool = pool()
+            loaded = model_pool.fill()
+            error = None if loaded else model_pool.last_error or "model is not available"
+        except Exception as exc:
+            loaded, error = False, f"{type(exc).__name__}: {exc}"
+        state.duration_sec = round(time.perf_counter() - started, 3)
+        state.error = error
+        state.state = "ready" if loaded else "failed"
+        if not loaded:
+            logger.warning("%s warm-up failed; model may be unavailable: %s", name, error)
+
+
+model_warmup = ModelWarmup({"insightface": registry.matcher_pool, "yolo": registry.yolo_pool})
+metrics.gauge("piv_models_ready", "1 once every model has been loaded at startup.", lambda: float(model_warmup.ready))
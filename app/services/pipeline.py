@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from functools import partial
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class StageQueue:
+    def __init__(self, name: str, maxsize: int, stop: threading.Event) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._halt = stop
+        self._puts = 0
+        self._depth_total = 0
+        self.max_depth = 0
+        self.put_wait_sec = 0.0
+        self.get_wait_sec = 0.0
+
+    def put(self, item) -> None:
+        started = time.perf_counter()
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._halt.is_set():
+                    raise PipelineStopped()
+        self.put_wait_sec += time.perf_counter() - started
+        depth = self._queue.qsize()
+        self._puts += 1
+        self._depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def get(self):
+        started = time.perf_counter()
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._halt.is_set():
+                    raise PipelineStopped()
+        self.get_wait_sec += time.perf_counter() - started
+        return item
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.maxsize,
+            "max_depth": self.max_depth,
+            "mean_depth": round(self._depth_total / self._puts, 3) if self._puts else 0.0,
+            "producer_blocked_sec": round(self.put_wait_sec, 3),
+            "consumer_starved_sec": round(self.get_wait_sec, 3),
+        }
+
+
+class _Stage(threading.Thread):
+    def __init__(
+        self,
+        name: str,
+        body: Callable[[_Stage], None],
+        errors: list[BaseException],
+        stop: threading.Event,
+    ) -> None:
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage_name = name
+        self.busy_sec = 0.0
+        self.items = 0
+        self._body = body
+        self._errors = errors
+        self._halt = stop
+
+    def run(self) -> None:
+        try:
+            self._body(self)
+        except PipelineStopped:
+            pass
+        except BaseException as exc:
+            self._errors.append(exc)
+            self._halt.set()
+
+
+def run_pipeline(
+    frames: Iterable[tuple[int, np.ndarray]],
+    stage_fns: list[tuple[str, Callable]],
+    queue_size: int,
+    stage_stats: dict[str, dict] | None = None,
+) -> Iterator[tuple[int, object]]:
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    queues = [StageQueue(name, queue_size, stop) for name, _ in stage_fns]
+    queues.append(StageQueue("output", queue_size, stop))
+
+    stages = [_Stage("decode", partial(_source_loop, frames, queues[0]), errors, stop)]
+    for index, (name, fn) in enumerate(stage_fns):
+        body = partial(_transform_loop, fn, queues[index], queues[index + 1])
+        stages.append(_Stage(name, body, errors, stop))
+    for stage in stages:
+        stage.start()
+
+    try:
+        while True:
+            try:
+                item = queues[-1].get()
+            except PipelineStopped:
+                break
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        if stage_stats is not None:
+            for stage, inbox in zip(stages, [None, *queues[:-1]]):
+                stage_stats[stage.stage_name] = {
+                    "items": stage.items,
+                    "busy_sec": round(stage.busy_sec, 3),
+                    "input_queue": inbox.snapshot() if inbox is not None else None,
+                }
+            stage_stats["consumer"] = {"input_queue": queues[-1].snapshot()}
+
+    if errors:
+        raise errors[0]
+
+
+def _source_loop(frames: Iterable, outbox: StageQueue, stage: _Stage) -> None:
+    iterator = iter(frames)
+    while True:
+        started = time.perf_counter()
+        item = next(iterator, _DONE)
+        stage.busy_sec += time.perf_counter() - started
+        outbox.put(item)
+        if item is _DONE:
+            return
+        stage.items += 1
+
+
+def _transform_loop(fn: Callable, inbox: StageQueue, outbox: StageQueue, stage: _Stage) -> None:
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            outbox.put(_DONE)
+            return
+        key, payload = item
+        started = time.perf_counter()
+        result = fn(payload)
+        stage.busy_sec += time.perf_counter() - started
+        stage.items += 1
+        outbox.put((key, result))
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import IO, Iterable, Iterator, Optional
+from uuid import uuid4
+
+import cv2
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Person, ReferenceImage
+from app.services.ann_index import gallery_index_store
+from app.services.gallery import embedding_to_bytes
+from app.services.model_registry import registry
+from app.services.storage import to_relative_path
+
+INGEST_CHUNK_SIZE = 32
+DB_COMMIT_ROWS = 500
+METADATA_FILE = "metadata.json"
+METADATA_MAX_BYTES = 1024 * 1024
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+@dataclass
+class BulkItem:
+    index: int
+    name: str
+    filename: str
+    # None when the image is larger than PIV_REFERENCE_MAX_MB or has no person; it is reported as invalid.
+    data: Optional[bytes]
+
+    def __post_init__(self) -> None:
+        self.name = self.name.strip()
+
+
+@dataclass
+class BulkResult:
+    index: int
+    name: str
+    filename: str
+    status: str
+    person_id: Optional[int] = None
+    image_id: Optional[int] = None
+
+
+@dataclass
+class _Embedded:
+    content_sha256: str
+    embedding: Optional[np.ndarray]
+    decoded: bool
+
+
+def read_zip_archive(archive: IO[bytes]) -> tuple[Iterator[BulkItem], dict[str, dict]]:
+    # `<name>/<image>` files belong to person `name`, also below a wrapping directory such as
+    # `people/<name>/<image>`; images at the top level are named after the file. Images in a directory
+    # that also holds person directories belong to nobody and are reported as invalid.
+    # An optional top-level metadata.json maps person names to metadata objects.
+    bundle = zipfile.ZipFile(archive)
+    metadata: dict[str, dict] = {}
+    if METADATA_FILE in bundle.namelist():
+        info = bundle.getinfo(METADATA_FILE)
+        raw = None
+        if info.file_size <= METADATA_MAX_BYTES:
+            with bundle.open(info) as member:
+                raw = member.read(METADATA_MAX_BYTES + 1)
+        if raw is None or len(raw) > METADATA_MAX_BYTES:
+            raise ValueError(f"metadata.json is larger than {METADATA_MAX_BYTES} bytes")
+        metadata = json.loads(raw)
+        if not isinstance(metadata, dict):
+            raise ValueError("metadata.json must map person names to objects")
+
+    paths = []
+    for info in bundle.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.name.startswith(".") or path.parts[0] == "__MACOSX":
+            continue
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        paths.append((path, info))
+    containers = {path.parent.parent for path, _ in paths if len(path.parts) > 2}
+
+    members = []
+    for path, info in paths:
+        if len(path.parts) == 1:
+            members.append((path.stem, info))
+        elif path.parent in containers:
+            members.append(("", info))
+        else:
+            members.append((path.parent.name, info))
+
+    def items() -> Iterator[BulkItem]:
+        with bundle:
+            for index, (name, info) in enumerate(members):
+                data = None
+                # file_size is only what the archive claims, so the read itself is capped as well.
+                if name and info.file_size <= reference_max_bytes():
+                    with bundle.open(info) as member:
+                        data = read_limited(member)
+                yield BulkItem(index, name, info.filename, data)
+
+    return items(), metadata
+
+
+def reference_max_bytes() -> int:
+    return int(settings.reference_max_mb * 1024 * 1024)
+
+
+def read_limited(handle: IO[bytes]) -> Optional[bytes]:
+    limit = reference_max_bytes()
+    data = handle.read(limit + 1)
+    return data if len(data) <= limit else None
+
+
+def ingest_references(
+    db: Session,
+    items: Iterable[BulkItem],
+    metadata: Optional[dict[str, dict]] = None,
+    workers: Optional[int] = None,
+) -> list[BulkResult]:
+    # Images are decoded and embedded on a thread pool (ONNX runtime releases the GIL) while the
+    # calling thread writes finished chunks; rows are committed every DB_COMMIT_ROWS images.
+    metadata = metadata or {}
+    workers = workers or settings.model_pool_size
+    writer = _ReferenceWriter(db, metadata)
+    pending: deque[tuple[list[BulkItem], Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reference-ingest") as executor:
+        try:
+            for chunk in _chunks(items, INGEST_CHUNK_SIZE):
+                pending.append((chunk, executor.submit(_embed_chunk, chunk)))
+                if len(pending) >= workers * 2:
+                    chunk, future = pending.popleft()
+                    writer.write(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                writer.write(chunk, future.result())
+            writer.commit()
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            writer.rollback()
+            raise
+    return writer.results
+
+
+def _chunks(items: Iterable[BulkItem], size: int) -> Iterator[list[BulkItem]]:
+    chunk: list[BulkItem] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _embed_chunk(chunk: list[BulkItem]) -> list[_Embedded]:
+    images = [
+        cv2.imdecode(np.frombuffer(item.data, dtype=np.uint8), cv2.IMREAD_COLOR) if item.data else None
+        for item in chunk
+    ]
+    with registry.checkout_matcher() as matcher:
+        if not matcher.available:
+            raise RuntimeError("face model is not available")
+        embeddings = matcher.embed_images(images)
+    return [
+        _Embedded(hashlib.sha256(item.data or b"").hexdigest(), embedding, image is not None)
+        for item, image, embedding in zip(chunk, images, embeddings)
+    ]
+
+
+class _ReferenceWriter:
+    def __init__(self, db: Session, metadata: dict[str, dict]) -> None:
+        self.db = db
+        self.metadata = metadata
+        self.data_dir = Path(settings.data_dir)
+        self.results: list[BulkResult] = []
+        self._persons: dict[str, Person] = {}
+        self._hashes: dict[int, set[str]] = {}
+        self._uncommitted_rows = 0
+        self._uncommitted_files: list[Path] = []
+
+    def write(self, chunk: list[BulkItem], embedded: list[_Embedded]) -> None:
+        added: list[tuple[BulkResult, ReferenceImage]] = []
+        for item, result in zip(chunk, embedded):
+            report = BulkResult(item.index, item.name, item.filename, "ok")
+            self.results.append(report)
+            if not result.decoded or not item.name:
+                report.status = "invalid"
+                continue
+            if result.embedding is None:
+                report.status = "no_face"
+                continue
+            person = self._person(item.name)
+            report.person_id = person.id
+            known = self._known_hashes(person)
+            if result.content_sha256 in known:
+                report.status = "duplicate"
+                continue
+            known.add(result.content_sha256)
+
+            target_dir = self.data_dir / "references" / str(person.id)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            image_path = target_dir / f"{uuid4().hex}{Path(item.filename).suffix}"
+            image_path.write_bytes(item.data)
+            self._uncommitted_files.append(image_path)
+            image = ReferenceImage(
+                person_id=person.id,
+                image_path=to_relative_path(self.data_dir, image_path),
+                embedding=embedding_to_bytes(result.embedding),
+                ann_list=gallery_index_store.assign(result.embedding),
+                content_sha256=result.content_sha256,
+            )
+            self.db.add(image)
+            added.append((report, image))
+
+        if added:
+            self.db.flush()
+            for report, image in added:
+                report.image_id = image.id
+            self._uncommitted_rows += len(added)
+        if self._uncommitted_rows >= DB_COMMIT_ROWS:
+            self.commit()
+
+    def commit(self) -> None:
+        self.db.commit()
+        self._uncommitted_rows = 0
+        self._uncommitted_files = []
+
+    def rollback(self) -> None:
+        self.db.rollback()
+        for path in self._uncommitted_files:
+            path.unlink(missing_ok=True)
+        self._uncommitted_files = []
+
+    def _person(self, name: str) -> Person:
+        person = self._persons.get(name)
+        if person is not None:
+            return person
+        person = self.db.execute(select(Person).where(Person.name == name)).scalar_one_or_none()
+        person_metadata = self.metadata.get(name)
+        if person is None:
+            person = Person(name=name, metadata_json=json.dumps(person_metadata) if person_metadata else None)
+            self.db.add(person)
+            self.db.flush()
+        elif person_metadata is not None:
+            person.metadata_json = json.dumps(person_metadata)
+        self._persons[name] = person
+        return person
+
+    def _known_hashes(self, person: Person) -> set[str]:
+        known = self._hashes.get(person.id)
+        if known is None:
+            rows = self.db.execute(
+                select(ReferenceImage.content_sha256).where(
+                    ReferenceImage.person_id == person.id,
+                    ReferenceImage.content_sha256.is_not(None),
+                )
+            ).scalars()
+            known = self._hashes[person.id] = set(rows)
+        return known
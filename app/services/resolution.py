@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.config import settings
+
+# A face region: the crop, its top-left corner in frame pixels, and frame pixels per crop pixel.
+Region = tuple[np.ndarray, tuple[int, int], float]
+
+DET_SIZE_STEP = 32
+MIN_DET_SIDE = 160
+MAX_PYRAMID_LEVELS = 3
+
+
+@dataclass(frozen=True)
+class ResolutionPolicy:
+    # Person detection sees frames shrunk once to detect_max_side on the long side (0 keeps them
+    # native); the face detector runs at det_side and gets its regions from the pyramid level
+    # closest to that size, so neither model resizes a full-resolution frame on every call.
+    detect_max_side: int
+    det_side: int
+
+    @property
+    def det_size(self) -> tuple[int, int]:
+        return self.det_side, self.det_side
+
+
+def resolution_policy(
+    width: int,
+    height: int,
+    use_yolo: bool,
+    detect_max_side: Optional[int] = None,
+    face_det_size: Optional[int] = None,
+) -> ResolutionPolicy:
+    if detect_max_side is None:
+        detect_max_side = settings.detect_max_side
+    if face_det_size:
+        det_side = face_det_size
+    elif not settings.face_det_auto or width <= 0 or height <= 0:
+        det_side = settings.face_det_max_side
+    else:
+        # The detector input never has to be larger than the biggest region it is given: the whole
+        # frame without YOLO, at most a full-height person crop with it.
+        largest = height if use_yolo else max(width, height)
+        det_side = min(settings.face_det_max_side, max(MIN_DET_SIDE, _round_up(largest, DET_SIZE_STEP)))
+    return ResolutionPolicy(detect_max_side, det_side)
+
+
+def downscale(frame: np.ndarray, max_side: int) -> tuple[np.ndarray, float]:
+    height, width = frame.shape[:2]
+    if max_side <= 0 or max(width, height) <= max_side:
+        return frame, 1.0
+    ratio = max_side / max(width, height)
+    size = (max(1, int(round(width * ratio))), max(1, int(round(height * ratio))))
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return small, width / small.shape[1]
+
+
+class FramePyramid:
+    # Half-resolution levels are built on first use and shared by every region of the frame.
+    def __init__(self, frame: np.ndarray) -> None:
+        self.levels = [frame]
+
+    @property
+    def frame(self) -> np.ndarray:
+        return self.levels[0]
+
+    def level(self, index: int) -> np.ndarray:
+        while len(self.levels) <= index:
+            previous = self.levels[-1]
+            height, width = previous.shape[:2]
+            size = (max(1, width // 2), max(1, height // 2))
+            self.levels.append(cv2.resize(previous, size, interpolation=cv2.INTER_AREA))
+        return self.levels[index]
+
+    def region(self, box: tuple[int, int, int, int], det_side: int) -> Region:
+        # The smallest level at which the box still covers det_side, so the detector only ever
+        # shrinks the crop by less than half.
+        x1, y1, x2, y2 = box
+        index = 0
+        while index < MAX_PYRAMID_LEVELS and max(x2 - x1, y2 - y1) >> (index + 1) >= det_side:
+            index += 1
+        image = self.level(index)
+        height, width = image.shape[:2]
+        left, top = min(x1 >> index, width - 1), min(y1 >> index, height - 1)
+        right, bottom = max(left + 1, min(width, x2 >> index)), max(top + 1, min(height, y2 >> index))
+        scale = 1 << index
+        return image[top:bottom, left:right], (left * scale, top * scale), float(scale)
+
+
+def _round_up(value: float, step: int) -> int:
+    return int(math.ceil(value / step)) * step
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+from app.services.face_index import FaceIndex, face_index_path
+from app.services.gallery import ReferenceGallery
+from app.services.metrics import videos_processed
+from app.services.video_processor import ProcessingStats, ResultCallback, process_video
+
+# segment_workers, shared_decode, pipelined and yolo_batch_size change how a video is scanned, not what is found.
+RESULT_PARAMS = (
+    "min_confidence",
+    "frame_interval_sec",
+    "use_yolo",
+    "use_tracking",
+    "motion_gate",
+    "yolo_confidence",
+    "yolo_iou",
+    "adaptive",
+    "idle_tail_sec",
+    "use_ann",
+    "detect_max_side",
+    "face_det_size",
+)
+
+
+class ResultCache:
+    # One JSON file per (video hash, gallery fingerprint, params) key; file mtime is the LRU clock.
+    def __init__(self, cache_dir: Path, max_bytes: int, max_entries: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def key(self, video_sha256: str, gallery: ReferenceGallery, params: dict) -> str:
+        payload = {
+            "video": video_sha256,
+            "gallery": gallery.fingerprint(),
+            "params": {name: params.get(name) for name in RESULT_PARAMS},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        path = self.cache_dir / f"{key}.json"
+        try:
+            results = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return results
+
+    def put(self, key: str, results: list[dict]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(results), encoding="utf-8")
+        tmp_path.replace(path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort(key=lambda entry: entry[0], reverse=True)
+            total = 0
+            for index, (_, size, path) in enumerate(entries):
+                total += size
+                if index >= self.max_entries or total > self.max_bytes:
+                    path.unlink(missing_ok=True)
+
+
+result_cache = ResultCache(
+    Path(settings.data_dir) / "cache" / "results",
+    int(settings.result_cache_max_mb * 1024 * 1024),
+    settings.result_cache_max_entries,
+)
+
+
+def process_video_cached(
+    video_path: Path,
+    video_sha256: Optional[str],
+    gallery: ReferenceGallery,
+    params: dict,
+    stats: Optional[ProcessingStats] = None,
+    on_result: Optional[ResultCallback] = None,
+    timeline_path: Optional[Path] = None,
+    **kwargs,
+) -> list[dict]:
+    key_params = params
+    params = dict(params)
+    index_faces = params.pop("index_faces", False)
+    # The caller selects the gallery implementation; use_ann only has to reach the cache key.
+    params.pop("use_ann", None)
+    params.pop("timeline", None)
+    if timeline_path is not None:
+        kwargs["timeline_path"] = timeline_path
+    else:
+        params.pop("timeline_format", None)
+    # A timeline is written while the video is scanned, so a cached first-seen list cannot provide one.
+    if video_sha256 is None or timeline_path is not None:
+        videos_processed.inc("uncached")
+        return process_video(video_path, gallery, stats=stats, on_result=on_result, **params, **kwargs)
+
+    face_index_dir = face_index_path(video_sha256) if index_faces else None
+    key = result_cache.key(video_sha256, gallery, key_params)
+    results = result_cache.get(key)
+    if face_index_dir is not None and FaceIndex.open(face_index_dir) is None:
+        # The index has to be built by scanning the video, so a cached result is not enough.
+        results = None
+    if results is not None:
+        videos_processed.inc("hit")
+        if stats is not None:
+            stats.cache_hit = True
+        if on_result is not None:
+            for item in results:
+                on_result(item)
+        return results
+
+    videos_processed.inc("miss")
+    results = process_video(
+        video_path,
+        gallery,
+        face_index_dir=face_index_dir,
+        stats=stats,
+        on_result=on_result,
+        **params,
+        **kwargs,
+    )
+    result_cache.put(key, results)
+    return results
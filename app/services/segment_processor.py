@@ -0,0 +1,566 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.services import model_registry
+from app.services.ann_index import IvfGallery
+from app.services.face_index import FaceIndexWriter, build_face_index
+from app.services.frame_ring import FrameRing, RingSpec
+from app.services.gallery import ReferenceGallery
+from app.services.resolution import resolution_policy
+from app.services.video_processor import (
+    FrameSampler,
+    MotionGate,
+    ProcessingCancelled,
+    ProcessingStats,
+    ProgressCallback,
+    ResultCallback,
+    batch_frame_faces,
+    batch_frame_regions,
+    checkout_models,
+    finish_video_stats,
+    format_result,
+    format_results,
+    probe_video,
+    process_video,
+    record_matches,
+    scan_video,
+)
+
+SEGMENTS_PER_WORKER = 2
+GALLERY_EXPORTS_KEPT = 4
+
+_worker_gallery: Optional[tuple[tuple, ReferenceGallery]] = None
+_exports_lock = threading.Lock()
+_exports_in_use: dict[Path, int] = {}
+
+
+class SegmentPool:
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+                self._manager = self._context.Manager()
+            return self._executor, self._manager.Event()
+
+    def queue(self):
+        # Pool tasks can only be handed manager queues; call after acquire().
+        return self._manager.Queue()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+
+segment_pool = SegmentPool(settings.segment_workers)
+
+
+def process_video_segments(
+    video_path: Path,
+    gallery: ReferenceGallery,
+    workers: int,
+    min_confidence: float = 0.6,
+    frame_interval_sec: float = 1.0,
+    use_yolo: bool = True,
+    use_tracking: bool = False,
+    motion_gate: bool = False,
+    yolo_confidence: float | None = None,
+    yolo_iou: float | None = None,
+    pipelined: bool = False,
+    yolo_batch_size: int | None = None,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    face_index_dir: Path | None = None,
+    progress: ProgressCallback | None = None,
+    on_result: ResultCallback | None = None,
+    on_refined: ResultCallback | None = None,
+    cancel_event: threading.Event | None = None,
+    stats: ProcessingStats | None = None,
+) -> list[dict]:
+    if not len(gallery) and face_index_dir is None:
+        return []
+
+    fps, frames_total = probe_video(video_path)
+    frame_interval = max(1, int(round(frame_interval_sec * fps)))
+    segments = split_segments(frames_total, frame_interval, workers * SEGMENTS_PER_WORKER)
+    if len(segments) <= 1:
+        # Unknown frame count or a video too short to split: fall back to the sequential scan.
+        return process_video(
+            video_path,
+            gallery,
+            min_confidence=min_confidence,
+            frame_interval_sec=frame_interval_sec,
+            use_yolo=use_yolo,
+            use_tracking=use_tracking,
+            motion_gate=motion_gate,
+            yolo_confidence=yolo_confidence,
+            yolo_iou=yolo_iou,
+            pipelined=pipelined,
+            yolo_batch_size=yolo_batch_size,
+            detect_max_side=detect_max_side,
+            face_det_size=face_det_size,
+            face_index_dir=face_index_dir,
+            progress=progress,
+            on_result=on_result,
+            on_refined=on_refined,
+            cancel_event=cancel_event,
+            stats=stats,
+        )
+
+    stats = stats if stats is not None else ProcessingStats()
+    started = time.perf_counter()
+    scan_kwargs = {
+        "min_confidence": min_confidence,
+        "frame_interval_sec": frame_interval_sec,
+        "use_yolo": use_yolo,
+        "tracking": use_tracking,
+        "motion_gate": motion_gate,
+        "yolo_confidence": yolo_confidence,
+        "yolo_iou": yolo_iou,
+        "pipelined": pipelined,
+        "batch_size": yolo_batch_size or settings.yolo_batch_size,
+        "detect_max_side": detect_max_side,
+        "face_det_size": face_det_size,
+    }
+    executor, worker_cancel = segment_pool.acquire()
+    stats.frames_total = frames_total
+
+    parts_dir = None
+    if face_index_dir is not None:
+        parts_dir = face_index_dir.parent / f".{face_index_dir.name}.parts.{os.getpid()}.{threading.get_ident()}"
+
+    results: dict[str, dict] = {}
+    frames_done = 0
+    pending = {}
+    gallery_ref, export_paths = export_gallery(gallery)
+    try:
+        for start, end in segments:
+            part_dir = str(parts_dir / f"{start:012d}") if parts_dir is not None else None
+            future = executor.submit(
+                _scan_segment, str(video_path), start, end, gallery_ref, scan_kwargs, part_dir, worker_cancel
+            )
+            pending[future] = (start, end)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessingCancelled()
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, end = pending.pop(future)
+                segment_results, segment_stats = future.result()
+                known = set(results)
+                for name in merge_first_seen(results, segment_results):
+                    # A segment that finishes later can move an already reported person to an earlier frame.
+                    callback = on_refined if name in known else on_result
+                    if callback is not None:
+                        callback(format_result(results[name]))
+                stats.frames_read += segment_stats.frames_read
+                stats.frames_decoded += segment_stats.frames_decoded
+                stats.frames_skipped += segment_stats.frames_skipped
+                stats.regions_detected += segment_stats.regions_detected
+                stats.regions_embedded += segment_stats.regions_embedded
+                stats.faces_detected += segment_stats.faces_detected
+                # Summed over workers, so stage times are CPU-side totals rather than wall time.
+                for stage, seconds in segment_stats.timings.items():
+                    stats.add_time(stage, seconds)
+                frames_done += (end if end is not None else frames_total) - start
+                if progress is not None:
+                    progress(frames_done, frames_total)
+    except BaseException:
+        worker_cancel.set()
+        for future in pending:
+            future.cancel()
+        if parts_dir is not None:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+        raise
+    finally:
+        for path in export_paths:
+            release_gallery_export(path)
+
+    if parts_dir is not None:
+        index_info = {"video_path": str(video_path), "frame_interval_sec": frame_interval_sec}
+        try:
+            with build_face_index(face_index_dir, index_info) as face_index:
+                for part_dir in sorted(parts_dir.iterdir()):
+                    face_index.append_index(part_dir)
+        finally:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+    finish_video_stats(stats, started)
+    return format_results(results)
+
+
+def process_video_shared(
+    video_path: Path,
+    gallery: ReferenceGallery,
+    workers: int,
+    min_confidence: float = 0.6,
+    frame_interval_sec: float = 1.0,
+    use_yolo: bool = True,
+    use_tracking: bool = False,
+    motion_gate: bool = False,
+    yolo_confidence: float | None = None,
+    yolo_iou: float | None = None,
+    pipelined: bool = False,
+    yolo_batch_size: int | None = None,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    face_index_dir: Path | None = None,
+    progress: ProgressCallback | None = None,
+    on_result: ResultCallback | None = None,
+    on_refined: ResultCallback | None = None,
+    cancel_event: threading.Event | None = None,
+    stats: ProcessingStats | None = None,
+) -> list[dict]:
+    # This process is the only decoder: sampled frames go into a shared-memory ring and the pool's
+    # workers detect and embed straight from their slots. Workers finish frames out of order, so there
+    # is no tracking (use_tracking and pipelined are ignored); replies are put back in frame order
+    # before matching, so first sightings and the face index are those of a sequential scan and are
+    # never refined later.
+    if not len(gallery) and face_index_dir is None:
+        return []
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError("unable to open video")
+    stats = stats if stats is not None else ProcessingStats()
+    started = time.perf_counter()
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_interval = max(1, int(round(frame_interval_sec * fps)))
+    frames_total = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    batch_size = yolo_batch_size or settings.yolo_batch_size
+    sampler = FrameSampler(cap, frame_interval, cancel_event=cancel_event)
+    gate = None
+    frames = sampler
+    if motion_gate:
+        gate = MotionGate(sampler, settings.motion_threshold, int(round(settings.motion_refresh_sec * fps)))
+        frames = gate
+    frames = iter(frames)
+    infer_kwargs = {
+        "use_yolo": use_yolo,
+        "yolo_confidence": yolo_confidence,
+        "yolo_iou": yolo_iou,
+        "batch_size": batch_size,
+        "detect_max_side": detect_max_side,
+        "face_det_size": face_det_size,
+    }
+
+    results: dict[str, dict] = {}
+    ring: Optional[FrameRing] = None
+    futures = []
+    worker_cancel = None
+    try:
+        index_info = {"video_path": str(video_path), "frame_interval_sec": frame_interval_sec}
+        with build_face_index(face_index_dir, index_info) as face_index:
+            decode_started = time.perf_counter()
+            pending_frame = next(frames, None)
+            stats.add_time("decode", time.perf_counter() - decode_started)
+            if pending_frame is not None:
+                # Slots are sized from the first decoded frame: containers and pipes may not report it.
+                slots = settings.frame_ring_slots or workers * (batch_size + 1)
+                ring = FrameRing.create(slots, pending_frame[1].shape)
+                executor, worker_cancel = segment_pool.acquire()
+                tasks, replies = segment_pool.queue(), segment_pool.queue()
+                futures = [
+                    executor.submit(_infer_ring_frames, ring.spec, tasks, replies, infer_kwargs, worker_cancel)
+                    for _ in range(workers)
+                ]
+            in_flight: deque[int] = deque()
+            ready: dict[int, tuple[int, list]] = {}
+            while pending_frame is not None or in_flight:
+                # Decode while a slot is free; once every slot is held by a worker, wait for replies.
+                while pending_frame is not None and ring.free:
+                    frame_index, frame = pending_frame
+                    slot = ring.acquire()
+                    ring.write(slot, frame)
+                    tasks.put((slot, frame_index))
+                    in_flight.append(frame_index)
+                    decode_started = time.perf_counter()
+                    pending_frame = next(frames, None)
+                    stats.add_time("decode", time.perf_counter() - decode_started)
+                    if pending_frame is None:
+                        for _ in futures:
+                            tasks.put(None)
+                if not in_flight:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ProcessingCancelled()
+                try:
+                    batch, timings = replies.get(timeout=0.5)
+                except queue.Empty:
+                    for future in futures:
+                        if future.done():
+                            future.result()
+                    if all(future.done() for future in futures):
+                        raise RuntimeError("inference workers exited with frames in flight")
+                    continue
+                for slot, frame_index, regions, faces in batch:
+                    ring.release(slot)
+                    ready[frame_index] = (regions, faces)
+                # Summed over workers, so stage times are CPU-side totals rather than wall time.
+                for stage, seconds in timings.items():
+                    stats.add_time(stage, seconds)
+                while in_flight and in_flight[0] in ready:
+                    frame_index = in_flight.popleft()
+                    regions, faces = ready.pop(frame_index)
+                    if face_index is not None:
+                        index_started = time.perf_counter()
+                        face_index.add(frame_index, frame_index / fps, faces)
+                        stats.add_time("index", time.perf_counter() - index_started)
+                    match_started = time.perf_counter()
+                    added = record_matches(results, gallery, faces, frame_index, fps, min_confidence)
+                    stats.add_time("match", time.perf_counter() - match_started)
+                    stats.regions_detected += regions
+                    stats.regions_embedded += regions
+                    stats.faces_detected += len(faces)
+                    if on_result is not None:
+                        for name in added:
+                            on_result(format_result(results[name]))
+                    if progress is not None:
+                        progress(frame_index + 1, frames_total)
+    except BaseException:
+        if worker_cancel is not None:
+            worker_cancel.set()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        if ring is not None:
+            ring.close()
+        cap.release()
+
+    stats.frames_total = frames_total
+    stats.frames_read += sampler.position
+    stats.frames_decoded += sampler.decoded
+    stats.frames_skipped += gate.skipped if gate is not None else 0
+    if progress is not None:
+        progress(sampler.position, max(frames_total, sampler.position))
+    finish_video_stats(stats, started)
+    return format_results(results)
+
+
+def split_segments(frames_total: int, frame_interval: int, count: int) -> list[tuple[int, Optional[int]]]:
+    # Boundaries sit on sampled frames so every segment samples exactly the frames the sequential scan would.
+    # The last segment reads to the end of the stream, since containers can under-report their frame count.
+    sampled_total = math.ceil(frames_total / frame_interval)
+    if sampled_total <= 0:
+        return []
+    count = max(1, min(count, sampled_total))
+    bounds = np.linspace(0, sampled_total, count + 1).round().astype(int) * frame_interval
+    segments: list[tuple[int, Optional[int]]] = [
+        (int(start), int(end)) for start, end in zip(bounds[:-2], bounds[1:-1]) if end > start
+    ]
+    segments.append((int(bounds[-2]), None))
+    return segments
+
+
+def merge_first_seen(results: dict[str, dict], segment_results: dict[str, dict]) -> list[str]:
+    changed: list[str] = []
+    for name, item in segment_results.items():
+        current = results.get(name)
+        if current is None or item["first_seen_sec"] < current["first_seen_sec"]:
+            results[name] = item
+            changed.append(name)
+    return changed
+
+
+def export_gallery(gallery: ReferenceGallery) -> tuple[tuple, list[Path]]:
+    # Returns what workers need to rebuild the gallery, and the exports to release afterwards. An IVF
+    # gallery also exports its list-sorted matrix, so workers do not each build a private copy.
+    matrix_path = export_gallery_array(gallery.fingerprint(), gallery.matrix)
+    paths = [matrix_path]
+    ann_ref = None
+    if isinstance(gallery, IvfGallery):
+        centroids, lists, nprobe = gallery.state()
+        digest = hashlib.sha1(centroids.tobytes() + lists.tobytes()).hexdigest()
+        list_path = export_gallery_array(f"{gallery.fingerprint()}.ivf-{digest[:16]}", gallery.list_matrix)
+        paths.append(list_path)
+        ann_ref = (str(list_path), centroids, lists, nprobe)
+    return (str(matrix_path), gallery.names, gallery.person_index, ann_ref), paths
+
+
+def export_gallery_array(name: str, array: np.ndarray) -> Path:
+    # Workers memory-map the exports, so every process shares one page-cached copy. An export stays
+    # referenced until release_gallery_export(), and referenced exports are never evicted.
+    cache_dir = Path(settings.data_dir) / "cache" / "galleries"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{name}.npy"
+    with _exports_lock:
+        _exports_in_use[path] = _exports_in_use.get(path, 0) + 1
+        if path.exists():
+            # Reuse counts as recent, so other processes sharing the directory keep it too.
+            os.utime(path)
+            return path
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as handle:
+            np.save(handle, array)
+        tmp_path.replace(path)
+        exports = sorted(cache_dir.glob("*.npy"), key=lambda item: item.stat().st_mtime, reverse=True)
+        for stale in exports[GALLERY_EXPORTS_KEPT:]:
+            if stale not in _exports_in_use:
+                stale.unlink(missing_ok=True)
+    return path
+
+
+def release_gallery_export(path: Path) -> None:
+    with _exports_lock:
+        count = _exports_in_use.pop(path, 0) - 1
+        if count > 0:
+            _exports_in_use[path] = count
+
+
+def _init_worker(threads: int) -> None:
+    # Every worker gets its share of the CPUs; inherited thread settings would oversubscribe them.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    settings.inference_threads = threads
+    cv2.setNumThreads(threads)
+    model_registry.registry.pool_size = 1
+    model_registry.warm_up_models()
+
+
+def _load_worker_gallery(gallery_ref: tuple) -> ReferenceGallery:
+    global _worker_gallery
+    matrix_path, names, person_index, ann_ref = gallery_ref
+    # The list export is named after the centroids and lists, so a retrain gives a new key.
+    cache_key = (matrix_path, ann_ref[0], ann_ref[3]) if ann_ref is not None else (matrix_path,)
+    if _worker_gallery is None or _worker_gallery[0] != cache_key:
+        matrix = np.load(matrix_path, mmap_mode="r")
+        if ann_ref is not None:
+            list_path, centroids, lists, nprobe = ann_ref
+            list_matrix = np.load(list_path, mmap_mode="r")
+            gallery = IvfGallery(names, matrix, person_index, centroids, lists, nprobe, list_matrix)
+        else:
+            gallery = ReferenceGallery(names, matrix, person_index)
+        _worker_gallery = (cache_key, gallery)
+    return _worker_gallery[1]
+
+
+def _scan_segment(
+    video_path: str,
+    start_frame: int,
+    end_frame: int | None,
+    gallery_ref: tuple,
+    scan_kwargs: dict,
+    face_index_part: str | None,
+    cancel_event,
+) -> tuple[dict[str, dict], ProcessingStats]:
+    gallery = _load_worker_gallery(gallery_ref)
+    kwargs = dict(scan_kwargs)
+    stats = ProcessingStats()
+    face_index = FaceIndexWriter(Path(face_index_part)) if face_index_part is not None else None
+    try:
+        with checkout_models(
+            model_registry.registry,
+            kwargs.pop("use_yolo"),
+            kwargs.pop("yolo_confidence"),
+            kwargs.pop("yolo_iou"),
+        ) as (matcher, yolo_detector):
+            results = scan_video(
+                Path(video_path),
+                gallery,
+                matcher,
+                yolo_detector,
+                start_frame=start_frame,
+                end_frame=end_frame,
+                face_index=face_index,
+                cancel_event=cancel_event,
+                stats=stats,
+                **kwargs,
+            )
+    except BaseException:
+        if face_index is not None:
+            face_index.abort()
+        raise
+    if face_index is not None:
+        face_index.close({})
+    return results, stats
+
+
+def _infer_ring_frames(
+    ring_spec: RingSpec,
+    tasks,
+    replies,
+    infer_kwargs: dict,
+    cancel_event,
+) -> None:
+    # Frames are read as views of the shared slots, and the pyramid crops handed to the face models
+    # are views of those, so nothing frame-sized is copied or pickled; only faces go back.
+    ring = FrameRing.attach(ring_spec)
+    kwargs = dict(infer_kwargs)
+    batch_size = kwargs.pop("batch_size")
+    try:
+        with checkout_models(
+            model_registry.registry,
+            kwargs.pop("use_yolo"),
+            kwargs.pop("yolo_confidence"),
+            kwargs.pop("yolo_iou"),
+        ) as (matcher, yolo_detector):
+            height, width = ring.shape[:2]
+            policy = resolution_policy(
+                width, height, yolo_detector is not None, kwargs["detect_max_side"], kwargs["face_det_size"]
+            )
+            finished = False
+            while not finished and not cancel_event.is_set():
+                try:
+                    batch = [tasks.get(timeout=0.5)]
+                except queue.Empty:
+                    continue
+                while len(batch) < batch_size and batch[-1] is not None:
+                    try:
+                        batch.append(tasks.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    finished = True
+                    batch.pop()
+                if not batch:
+                    continue
+                started = time.perf_counter()
+                per_frame = batch_frame_regions([ring.frame(slot) for slot, _ in batch], yolo_detector, policy)
+                detected = time.perf_counter()
+                faces = batch_frame_faces(per_frame, matcher, policy.det_size)
+                timings = {"detect": detected - started, "embed": time.perf_counter() - detected}
+                replies.put(
+                    (
+                        [
+                            (slot, frame_index, len(regions), frame_faces)
+                            for (slot, frame_index), regions, frame_faces in zip(batch, per_frame, faces)
+                        ],
+                        timings,
+                    )
+                )
+                del per_frame
+    finally:
+        ring.close()
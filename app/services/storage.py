@@ -1,23 +1,60 @@
 from __future__ import annotations
 
+import hashlib
 import shutil
 from pathlib import Path
 from uuid import uuid4
 
 from fastapi import UploadFile
 
+COPY_CHUNK_SIZE = 1 << 20
+
 
 def save_upload(upload: UploadFile, target_dir: Path) -> Path:
-    target_dir.mkdir(parents=True, exist_ok=True)
-    suffix = Path(upload.filename or "").suffix
-    filename = f"{uuid4().hex}{suffix}"
-    target_path = target_dir / filename
+    target_path = new_upload_path(target_dir, upload.filename)
     with target_path.open("wb") as handle:
         upload.file.seek(0)
         shutil.copyfileobj(upload.file, handle)
     return target_path
 
 
+def save_upload_deduplicated(upload: UploadFile, target_dir: Path) -> tuple[Path, str]:
+    # Hashes while copying, then stores the file under its SHA-256 so identical uploads share one copy.
+    target_dir.mkdir(parents=True, exist_ok=True)
+    partial_path = target_dir / f".{uuid4().hex}.part"
+    digest = hashlib.sha256()
+    with partial_path.open("wb") as handle:
+        upload.file.seek(0)
+        for chunk in iter(lambda: upload.file.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            handle.write(chunk)
+    content_hash = digest.hexdigest()
+    return store_by_hash(partial_path, content_hash, upload.filename), content_hash
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_by_hash(partial_path: Path, content_hash: str, filename: str | None) -> Path:
+    target_path = partial_path.parent / f"{content_hash}{Path(filename or '').suffix.lower()}"
+    if target_path.exists():
+        partial_path.unlink(missing_ok=True)
+    else:
+        partial_path.replace(target_path)
+    return target_path
+
+
+def new_upload_path(target_dir: Path, filename: str | None) -> Path:
+    target_dir.mkdir(parents=True, exist_ok=True)
+    suffix = Path(filename or "").suffix
+    return target_dir / f"{uuid4().hex}{suffix}"
+
+
 def to_relative_path(base_dir: Path, path: Path) -> str:
     return str(path.relative_to(base_dir))
 
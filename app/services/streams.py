@@ -0,0 +1,480 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+from uuid import uuid4
+
+import cv2
+import numpy as np
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import VideoStream
+from app.services.events import event_bus
+from app.services.gallery import ReferenceGallery
+from app.services.gallery_cache import gallery_cache
+from app.services.metrics import LATENCY_BUCKETS, metrics
+from app.services.model_registry import ModelRegistry, registry as default_registry
+from app.services.resolution import resolution_policy
+from app.services.storage import build_abs_path
+from app.services.tracker import IouTracker
+from app.services.video_processor import (
+    FrameEmbedder,
+    TrackedFace,
+    batch_frame_regions,
+    checkout_models,
+    match_sightings,
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_TERMINAL_STATUSES = ("completed", "failed", "stopped")
+STREAM_SCHEMES = ("rtsp", "rtsps", "rtmp", "http", "https", "udp", "tcp", "srt")
+STATS_INTERVAL_SEC = 1.0
+# Paced file sources that fall further than this behind real time skip ahead instead of bursting.
+MAX_PACING_LAG_SEC = 1.0
+# A reader can block inside grab() on a stalled network source; its daemon thread is left behind.
+JOIN_TIMEOUT_SEC = 5.0
+
+# Summed over all streams: stream ids are unbounded, so per-stream counts stay on /streams/{id}.
+stream_frames = metrics.counter(
+    "piv_stream_frames_total",
+    "Frames of live streams by outcome: read, sampled, processed, dropped_behind or dropped_stale.",
+    ("outcome",),
+)
+stream_latency_seconds = metrics.histogram(
+    "piv_stream_latency_seconds",
+    "Seconds from reading a live stream frame to publishing its sightings.",
+    (*LATENCY_BUCKETS, 10.0),
+)
+
+
+class StreamLimitReached(Exception):
+    pass
+
+
+@dataclass
+class StreamCounters:
+    frames_read: int = 0
+    frames_sampled: int = 0
+    frames_processed: int = 0
+    # Sampled frames replaced by a newer one before the worker got to them.
+    frames_dropped_behind: int = 0
+    # Frames already older than the latency target when the worker picked them up.
+    frames_dropped_stale: int = 0
+    faces_detected: int = 0
+    reconnects: int = 0
+    latency_sec_last: float = 0.0
+    latency_sec_max: float = 0.0
+    latency_sec_total: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        elapsed = max(time.monotonic() - data.pop("started"), 1e-9)
+        latency_total = data.pop("latency_sec_total")
+        dropped = self.frames_dropped_behind + self.frames_dropped_stale
+        data["processed_fps"] = round(self.frames_processed / elapsed, 3)
+        data["drop_rate"] = round(dropped / self.frames_sampled, 4) if self.frames_sampled else 0.0
+        data["latency_sec_avg"] = round(latency_total / self.frames_processed, 4) if self.frames_processed else 0.0
+        data["latency_sec_last"] = round(self.latency_sec_last, 4)
+        data["latency_sec_max"] = round(self.latency_sec_max, 4)
+        return data
+
+
+@dataclass
+class SampledFrame:
+    position: int
+    read_at: float
+    frame: np.ndarray
+
+
+class LatestFrame:
+    # Single-slot handoff from a stream's reader to its worker: a newer sample replaces one that has
+    # not been picked up yet, so a worker that falls behind sheds frames instead of queueing them.
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._item: Optional[SampledFrame] = None
+        self._closed = False
+
+    def put(self, item: SampledFrame) -> bool:
+        with self._cond:
+            replaced = self._item is not None
+            self._item = item
+            self._cond.notify()
+            return replaced
+
+    def take(self) -> Optional[SampledFrame]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed)
+            item, self._item = self._item, None
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def resolve_stream_source(source: str) -> str:
+    # Stored sources are URLs or paths relative to the data directory.
+    if urlparse(source).scheme.lower() in STREAM_SCHEMES:
+        return source
+    return str(build_abs_path(Path(settings.data_dir), source))
+
+
+def is_file_source(source: str) -> bool:
+    return Path(source).is_file()
+
+
+class StreamWorker:
+    # A reader thread decodes the source at its own pace and offers one frame per sampling interval;
+    # an inference thread runs the detect/embed/match stages on the latest offer, checking the models
+    # out per frame so any number of streams share the model pools.
+    def __init__(
+        self,
+        stream_id: str,
+        source: str,
+        params: dict,
+        on_exit,
+        registry: Optional[ModelRegistry] = None,
+    ) -> None:
+        self.stream_id = stream_id
+        self.source = resolve_stream_source(source)
+        self.params = params
+        self.on_exit = on_exit
+        self.registry = registry or default_registry
+        self.counters = StreamCounters()
+        self.error: Optional[str] = None
+        self.status = "running"
+        self._stop = threading.Event()
+        self._slot = LatestFrame()
+        self._reader = threading.Thread(target=self._read, name=f"stream-read-{stream_id[:8]}", daemon=True)
+        self._worker = threading.Thread(target=self._run, name=f"stream-infer-{stream_id[:8]}", daemon=True)
+        self._fps = 30.0
+        self._published: dict[str, int] = {}
+
+    def start(self) -> None:
+        self._reader.start()
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._slot.close()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self._reader.join(timeout)
+        self._worker.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+
+    def _read(self) -> None:
+        file_source = is_file_source(self.source)
+        # Anything that is not a local file or pipe is a network source and is reconnected when it drops.
+        local = file_source or Path(self.source).exists()
+        interval = self.params["frame_interval_sec"]
+        position = 0
+        opened = False
+        try:
+            while not self._stop.is_set():
+                cap = cv2.VideoCapture(self.source)
+                if not cap.isOpened():
+                    cap.release()
+                    if not opened:
+                        raise RuntimeError("unable to open stream")
+                    self._reconnect_wait()
+                    continue
+                opened = True
+                self._fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                next_due = time.monotonic()
+                last_sample: Optional[float] = None
+                try:
+                    while not self._stop.is_set():
+                        if file_source:
+                            # Local files stand in for cameras, so they are played back in real time.
+                            next_due += 1.0 / self._fps
+                            delay = next_due - time.monotonic()
+                            if delay > 0:
+                                self._stop.wait(delay)
+                            elif delay < -MAX_PACING_LAG_SEC:
+                                next_due = time.monotonic()
+                        if not cap.grab():
+                            break
+                        position += 1
+                        self.counters.frames_read += 1
+                        now = time.monotonic()
+                        if last_sample is not None and now - last_sample < interval:
+                            continue
+                        ret, frame = cap.retrieve()
+                        if not ret:
+                            continue
+                        last_sample = now
+                        self.counters.frames_sampled += 1
+                        if self._slot.put(SampledFrame(position, now, frame)):
+                            self.counters.frames_dropped_behind += 1
+                finally:
+                    cap.release()
+                if self._stop.is_set():
+                    break
+                if file_source and self.params.get("loop"):
+                    continue
+                if local:
+                    self.status = "completed"
+                    break
+                self._reconnect_wait()
+        except Exception as exc:
+            logger.exception("Stream %s reader failed", self.stream_id)
+            self.error = str(exc)
+            self.status = "failed"
+        finally:
+            self._slot.close()
+
+    def _reconnect_wait(self) -> None:
+        self.counters.reconnects += 1
+        stream_frames.inc("reconnect")
+        self._stop.wait(settings.stream_reconnect_sec)
+
+    def _run(self) -> None:
+        try:
+            self._infer()
+        except Exception as exc:
+            logger.exception("Stream %s failed", self.stream_id)
+            self.error = str(exc)
+            self.status = "failed"
+            self.stop()
+        self._reader.join(JOIN_TIMEOUT_SEC)
+        if self._stop.is_set() and self.status == "running":
+            self.status = "stopped"
+        self.on_exit(self)
+
+    def _infer(self) -> None:
+        params = self.params
+        max_latency = params.get("max_latency_sec") or settings.stream_max_latency_sec
+        min_confidence = params["min_confidence"]
+        reseen_sec = settings.stream_reseen_sec
+        gallery, gallery_version = self._load_gallery()
+        embedder: Optional[FrameEmbedder] = None
+        policy = None
+        last_seen: dict[str, float] = {}
+        last_stats = 0.0
+
+        while True:
+            sample = self._slot.take()
+            if sample is None:
+                break
+            if time.monotonic() - sample.read_at > max_latency:
+                self.counters.frames_dropped_stale += 1
+                continue
+            if gallery_cache.version != gallery_version:
+                gallery, gallery_version = self._load_gallery()
+                if embedder is not None:
+                    embedder.gallery = gallery
+
+            models = checkout_models(self.registry, params["use_yolo"], params["yolo_confidence"], params["yolo_iou"])
+            with models as (matcher, yolo_detector):
+                if policy is None:
+                    height, width = sample.frame.shape[:2]
+                    policy = resolution_policy(
+                        width,
+                        height,
+                        yolo_detector is not None,
+                        params["detect_max_side"],
+                        params["face_det_size"],
+                    )
+                    embedder = self._embedder(matcher, gallery, yolo_detector is not None, policy.det_size)
+                embedder.matcher = matcher
+                regions = batch_frame_regions([sample.frame], yolo_detector, policy)
+                faces = embedder(((sample.position,), regions))[0]
+            tracked = [face for face in faces if isinstance(face, TrackedFace)]
+            detected = [face for face in faces if not isinstance(face, TrackedFace)]
+            sightings = match_sightings(gallery, detected, min_confidence, tracked) if len(gallery) else {}
+
+            now = time.monotonic()
+            latency = now - sample.read_at
+            counters = self.counters
+            counters.frames_processed += 1
+            counters.faces_detected += len(detected)
+            counters.latency_sec_last = latency
+            counters.latency_sec_max = max(counters.latency_sec_max, latency)
+            counters.latency_sec_total += latency
+            stream_latency_seconds.observe(latency)
+
+            for name, (confidence, _) in sightings.items():
+                previous = last_seen.get(name)
+                last_seen[name] = now
+                if previous is not None and now - previous <= reseen_sec:
+                    continue
+                event_bus.publish(
+                    self.stream_id,
+                    "first_seen" if previous is None else "re_seen",
+                    {
+                        "name": name,
+                        "confidence": round(confidence * 100.0, 2),
+                        "stream_sec": round(sample.read_at - counters.started, 2),
+                        "seen_at": datetime.utcnow().isoformat(),
+                        "latency_sec": round(latency, 4),
+                    },
+                )
+            if now - last_stats >= STATS_INTERVAL_SEC:
+                last_stats = now
+                self._publish_stats()
+        self._publish_stats()
+
+    def _embedder(
+        self,
+        matcher,
+        gallery: ReferenceGallery,
+        use_yolo: bool,
+        det_size: tuple[int, int],
+    ) -> FrameEmbedder:
+        tracker = None
+        if self.params["use_tracking"] and use_yolo:
+            tracker = IouTracker(
+                iou_threshold=settings.track_iou,
+                max_missed=int(settings.track_max_age_sec / self.params["frame_interval_sec"]),
+            )
+        return FrameEmbedder(
+            matcher,
+            gallery,
+            self.params["min_confidence"],
+            tracker,
+            int(round(settings.track_reverify_sec * self._fps)),
+            det_size,
+            report_tracks=True,
+        )
+
+    def _load_gallery(self) -> tuple[ReferenceGallery, int]:
+        version = gallery_cache.version
+        with SessionLocal() as db:
+            return gallery_cache.get(db, ann=self.params.get("use_ann", False)), version
+
+    def _publish_stats(self) -> None:
+        # Prometheus counters are advanced here, once a second, rather than per frame.
+        counters = self.counters.as_dict()
+        for outcome in ("read", "sampled", "processed", "dropped_behind", "dropped_stale"):
+            key = f"frames_{outcome}"
+            delta = counters[key] - self._published.get(key, 0)
+            if delta:
+                stream_frames.inc(outcome, amount=delta)
+            self._published[key] = counters[key]
+        event_bus.publish(self.stream_id, "progress", counters)
+
+
+class StreamManager:
+    # Live streams run until stopped. Streams still running at shutdown are left "running" in the
+    # database and restarted on the next startup, like unfinished video jobs.
+    def __init__(self, max_streams: int) -> None:
+        self.max_streams = max_streams
+        self._workers: dict[str, StreamWorker] = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return len(self._workers)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        with SessionLocal() as db:
+            streams = db.execute(
+                select(VideoStream).where(VideoStream.status == "running").order_by(VideoStream.created_at)
+            ).scalars().all()
+            resumed = [(stream.id, stream.source, json.loads(stream.params_json)) for stream in streams]
+        for stream_id, source, params in resumed[: self.max_streams]:
+            self._launch(stream_id, source, params)
+        if resumed:
+            logger.info("Resumed %d live streams", min(len(resumed), self.max_streams))
+        overflow = [stream_id for stream_id, _, _ in resumed[self.max_streams :]]
+        if overflow:
+            logger.warning("Not resuming %d live streams above PIV_STREAM_MAX", len(overflow))
+            with SessionLocal() as db:
+                for stream in db.execute(select(VideoStream).where(VideoStream.id.in_(overflow))).scalars():
+                    stream.status = "failed"
+                    stream.error = "too many live streams running at startup"
+                    stream.finished_at = datetime.utcnow()
+                db.commit()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + JOIN_TIMEOUT_SEC
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+    def submit(self, source: str, params: dict) -> VideoStream:
+        stream_id = uuid4().hex
+        with self._lock:
+            if len(self._workers) >= self.max_streams:
+                raise StreamLimitReached()
+            with SessionLocal() as db:
+                stream = VideoStream(
+                    id=stream_id,
+                    status="running",
+                    source=source,
+                    params_json=json.dumps(params),
+                    started_at=datetime.utcnow(),
+                )
+                db.add(stream)
+                db.commit()
+                db.refresh(stream)
+                db.expunge(stream)
+            self._launch_locked(stream_id, source, params)
+        return stream
+
+    def stop(self, stream_id: str) -> Optional[VideoStream]:
+        with self._lock:
+            worker = self._workers.get(stream_id)
+        if worker is not None:
+            worker.stop()
+            worker.join(JOIN_TIMEOUT_SEC)
+        with SessionLocal() as db:
+            stream = db.get(VideoStream, stream_id)
+            if stream is not None:
+                db.expunge(stream)
+            return stream
+
+    def counters(self, stream_id: str) -> Optional[dict]:
+        with self._lock:
+            worker = self._workers.get(stream_id)
+        return worker.counters.as_dict() if worker is not None else None
+
+    def _launch(self, stream_id: str, source: str, params: dict) -> None:
+        with self._lock:
+            self._launch_locked(stream_id, source, params)
+
+    def _launch_locked(self, stream_id: str, source: str, params: dict) -> None:
+        worker = StreamWorker(stream_id, source, params, self._on_exit)
+        self._workers[stream_id] = worker
+        worker.start()
+
+    def _on_exit(self, worker: StreamWorker) -> None:
+        with self._lock:
+            self._workers.pop(worker.stream_id, None)
+        if self._stopping.is_set() and worker.status == "stopped":
+            # Interrupted by shutdown rather than by the user: restart on next start.
+            return
+        with SessionLocal() as db:
+            stream = db.get(VideoStream, worker.stream_id)
+            if stream is not None:
+                stream.status = worker.status
+                stream.error = worker.error
+                stream.stats_json = json.dumps(worker.counters.as_dict())
+                stream.finished_at = datetime.utcnow()
+                db.commit()
+        event_bus.publish(worker.stream_id, "status", {"status": worker.status, "error": worker.error})
+        event_bus.close(worker.stream_id)
+
+
+stream_manager = StreamManager(settings.stream_max)
+metrics.gauge("piv_streams_running", "Live streams currently running.", lambda: stream_manager.running)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator, Optional
+from uuid import uuid4
+
+import numpy as np
+
+from app.config import settings
+
+TIMELINE_FORMATS = ("parquet", "jsonl")
+
+# name -> (confidence, box) for one sampled frame.
+Sightings = dict[str, tuple[float, np.ndarray]]
+
+
+@dataclass
+class Interval:
+    name: str
+    start_frame: int
+    end_frame: int
+    max_confidence: float
+    box: np.ndarray
+    sightings: int = 1
+
+    def row(self, fps: float) -> dict:
+        x1, y1, x2, y2 = (round(float(value), 1) for value in self.box[:4])
+        return {
+            "name": self.name,
+            "start_sec": round(self.start_frame / fps, 3),
+            "end_sec": round(self.end_frame / fps, 3),
+            "start_frame": self.start_frame,
+            "end_frame": self.end_frame,
+            "max_confidence": round(self.max_confidence * 100.0, 2),
+            "x1": x1,
+            "y1": y1,
+            "x2": x2,
+            "y2": y2,
+            "sightings": self.sightings,
+        }
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class TimelineWriter:
+    # Consecutive sightings of a name are merged into one interval while the scan runs; an interval
+    # is closed once the name is missing from a processed frame more than gap_frames after it was
+    # last seen. Only open intervals and one row group of closed ones are held in memory.
+    def __init__(self, path: Path, fps: float, gap_frames: int, fmt: str, row_group_rows: int) -> None:
+        if fmt not in TIMELINE_FORMATS:
+            raise ValueError(f"unknown timeline format: {fmt}")
+        self.path = path
+        self.fps = fps
+        self.gap_frames = max(0, gap_frames)
+        self.fmt = fmt
+        self.row_group_rows = max(1, row_group_rows)
+        self.rows_written = 0
+        self._open: dict[str, Interval] = {}
+        self._closed: list[dict] = []
+        self._parquet = None
+        self._jsonl: Optional[IO[str]] = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "jsonl":
+            self._jsonl = path.open("w", encoding="utf-8")
+
+    def add(self, frame_index: int, sightings: Sightings) -> None:
+        for name, (confidence, box) in sightings.items():
+            interval = self._open.get(name)
+            if interval is None:
+                self._open[name] = Interval(name, frame_index, frame_index, confidence, np.asarray(box))
+                continue
+            interval.end_frame = frame_index
+            interval.sightings += 1
+            if confidence > interval.max_confidence:
+                interval.max_confidence = confidence
+                interval.box = np.asarray(box)
+        expired = [
+            name
+            for name, interval in self._open.items()
+            if name not in sightings and frame_index - interval.end_frame > self.gap_frames
+        ]
+        for name in expired:
+            self._close(self._open.pop(name))
+
+    def close(self) -> int:
+        for interval in sorted(self._open.values(), key=lambda item: item.start_frame):
+            self._close(interval, flush=False)
+        self._open = {}
+        self._flush()
+        if self._parquet is not None:
+            self._parquet.close()
+        elif self.fmt == "parquet":
+            # No intervals at all: still leave a readable, empty file with the full schema.
+            self._parquet_writer().close()
+        if self._jsonl is not None:
+            self._jsonl.close()
+        return self.rows_written
+
+    def abort(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._jsonl is not None:
+            self._jsonl.close()
+        self.path.unlink(missing_ok=True)
+
+    def _close(self, interval: Interval, flush: bool = True) -> None:
+        self._closed.append(interval.row(self.fps))
+        if flush and len(self._closed) >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._closed:
+            return
+        if self._jsonl is not None:
+            self._jsonl.writelines(json.dumps(row) + "\n" for row in self._closed)
+            self._jsonl.flush()
+        else:
+            import pyarrow as pa
+
+            writer = self._parquet_writer()
+            writer.write_table(pa.Table.from_pylist(self._closed, schema=writer.schema))
+        self.rows_written += len(self._closed)
+        self._closed = []
+
+    def _parquet_writer(self):
+        if self._parquet is None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema(
+                [
+                    ("name", pa.string()),
+                    ("start_sec", pa.float64()),
+                    ("end_sec", pa.float64()),
+                    ("start_frame", pa.int64()),
+                    ("end_frame", pa.int64()),
+                    ("max_confidence", pa.float64()),
+                    ("x1", pa.float64()),
+                    ("y1", pa.float64()),
+                    ("x2", pa.float64()),
+                    ("y2", pa.float64()),
+                    ("sightings", pa.int64()),
+                ]
+            )
+            self._parquet = pq.ParquetWriter(str(self.path), schema)
+        return self._parquet
+
+
+@contextmanager
+def build_timeline(
+    target: Optional[Path],
+    fps: float,
+    frame_interval: int,
+    fmt: str,
+) -> Iterator[Optional[TimelineWriter]]:
+    # Written next to the target and renamed into place only when the scan succeeds.
+    if target is None:
+        yield None
+        return
+    gap_frames = int(round(settings.timeline_gap_sec * fps)) if settings.timeline_gap_sec > 0 else 0
+    writer = TimelineWriter(
+        target.parent / f".{target.name}.{uuid4().hex}.part",
+        fps,
+        max(gap_frames, frame_interval),
+        fmt,
+        settings.timeline_row_group_rows,
+    )
+    try:
+        yield writer
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    writer.path.replace(target)
+
+
+def timeline_suffix(fmt: str) -> str:
+    return ".timeline.parquet" if fmt == "parquet" else ".timeline.jsonl"
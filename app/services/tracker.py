@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray
+    hits: int = 1
+    missed: int = 0
+    name: Optional[str] = None
+    confidence: float = 0.0
+    verified_at: int = 0
+    # Box of the verified face, relative to the top-left corner of the track box at verification.
+    face_offset: Optional[np.ndarray] = None
+
+    @property
+    def identified(self) -> bool:
+        return self.name is not None
+
+
+class IouTracker:
+    # Greedy IoU association, with a centroid-distance fallback for boxes that moved too far
+    # between samples to overlap. One update() call per sampled frame, in frame order.
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2, centroid_ratio: float = 0.5) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.centroid_ratio = centroid_ratio
+        self.tracks: list[Track] = []
+        self._next_id = 1
+
+    def update(self, boxes: np.ndarray) -> list[Track]:
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        assigned: list[Optional[Track]] = [None] * len(boxes)
+        matched: set[int] = set()
+
+        if self.tracks and len(boxes):
+            previous = np.stack([track.box for track in self.tracks])
+            overlaps = iou_matrix(previous, boxes)
+            for track_index, box_index in _greedy_pairs(overlaps, overlaps >= self.iou_threshold, descending=True):
+                if track_index not in matched and assigned[box_index] is None:
+                    matched.add(track_index)
+                    assigned[box_index] = self.tracks[track_index]
+
+            distances = centroid_distance_matrix(previous, boxes)
+            close = distances <= self.centroid_ratio
+            for track_index, box_index in _greedy_pairs(distances, close, descending=False):
+                if track_index not in matched and assigned[box_index] is None:
+                    matched.add(track_index)
+                    assigned[box_index] = self.tracks[track_index]
+
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matched:
+                track.missed += 1
+        for box, track in zip(boxes, assigned):
+            if track is not None:
+                track.box = box
+                track.hits += 1
+                track.missed = 0
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        for box_index, box in enumerate(boxes):
+            if assigned[box_index] is None:
+                track = Track(track_id=self._next_id, box=box)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[box_index] = track
+        return assigned  # type: ignore[return-value]
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def centroid_distance_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Distance between centres, relative to the diagonal of the track's previous box.
+    centres_a = (a[:, :2] + a[:, 2:]) / 2.0
+    centres_b = (b[:, :2] + b[:, 2:]) / 2.0
+    diagonal = np.maximum(np.hypot(a[:, 2] - a[:, 0], a[:, 3] - a[:, 1]), 1.0)
+    return np.linalg.norm(centres_a[:, None, :] - centres_b[None, :, :], axis=2) / diagonal[:, None]
+
+
+def _greedy_pairs(values: np.ndarray, mask: np.ndarray, descending: bool) -> list[tuple[int, int]]:
+    rows, cols = np.nonzero(mask)
+    order = np.argsort(values[rows, cols], kind="stable")
+    if descending:
+        order = order[::-1]
+    return [(int(rows[index]), int(cols[index])) for index in order]
@@ -1,125 +1,770 @@
 from __future__ import annotations
 
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 import cv2
 import numpy as np
 
 from app.config import settings
-from app.services.matcher import Matcher
+from app.services.face_index import FaceIndexWriter, build_face_index
+from app.services.gallery import ReferenceGallery
+from app.services.matcher import DetectedFace, Matcher
+from app.services.metrics import record_video_metrics
+from app.services.model_registry import ModelRegistry, registry as default_registry
+from app.services.pipeline import run_pipeline
+from app.services.resolution import FramePyramid, Region, ResolutionPolicy, downscale, resolution_policy
+from app.services.timeline import Sightings, build_timeline
+from app.services.tracker import IouTracker
 from app.services.yolo_detector import YoloConfig, YoloDetector
 
+ProgressCallback = Callable[[int, int], None]
+ResultCallback = Callable[[dict], None]
+
+
+class ProcessingCancelled(Exception):
+    pass
+
+
+@dataclass
+class ProcessingStats:
+    frames_total: int = 0
+    frames_read: int = 0
+    frames_decoded: int = 0
+    frames_skipped: int = 0
+    cache_hit: bool = False
+    refine_probes: int = 0
+    regions_detected: int = 0
+    regions_embedded: int = 0
+    faces_detected: int = 0
+    timeline_intervals: int = 0
+    stopped_at_frame: int | None = None
+    # Seconds per stage; pipelined stages overlap, so they can add up to more than "total".
+    timings: dict[str, float] = field(default_factory=dict)
+    stages: dict[str, dict] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["timings"] = {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        return data
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
 
 def process_video(
     video_path: Path,
-    reference_items: list[dict],
+    gallery: ReferenceGallery,
     min_confidence: float = 0.6,
     frame_interval_sec: float = 1.0,
     use_yolo: bool = True,
+    use_tracking: bool = False,
+    motion_gate: bool = False,
     yolo_confidence: float | None = None,
     yolo_iou: float | None = None,
+    segment_workers: int = 1,
+    shared_decode: bool = False,
+    pipelined: bool = False,
+    yolo_batch_size: int | None = None,
+    adaptive: bool = False,
+    idle_tail_sec: float | None = None,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    face_index_dir: Path | None = None,
+    timeline_path: Path | None = None,
+    timeline_format: str = "parquet",
+    registry: ModelRegistry | None = None,
+    progress: ProgressCallback | None = None,
+    on_result: ResultCallback | None = None,
+    on_refined: ResultCallback | None = None,
+    cancel_event: threading.Event | None = None,
+    stats: ProcessingStats | None = None,
 ) -> list[dict]:
-    matcher = Matcher()
-    if not matcher.available:
-        raise RuntimeError("face model is not available")
+    # on_result gets each person once, when first found; on_refined gets a person again whenever
+    # their first sighting is later moved to an earlier frame.
+    if face_index_dir is not None:
+        # The index keeps every sampled face, so no frame or region may skip the face models.
+        use_tracking = motion_gate = False
+    stats = stats if stats is not None else ProcessingStats()
+    if not len(gallery) and face_index_dir is None:
+        # Nothing to match against, but the video still counts in the per-video metrics.
+        finish_video_stats(stats, time.perf_counter())
+        return []
+    # Adaptive mode depends on seeing identities in order, so it always scans sequentially.
+    if segment_workers > 1 and not adaptive:
+        from app.services.segment_processor import process_video_segments, process_video_shared
+
+        process_parallel = process_video_shared if shared_decode else process_video_segments
+        return process_parallel(
+            video_path,
+            gallery,
+            segment_workers,
+            min_confidence=min_confidence,
+            frame_interval_sec=frame_interval_sec,
+            use_yolo=use_yolo,
+            use_tracking=use_tracking,
+            motion_gate=motion_gate,
+            yolo_confidence=yolo_confidence,
+            yolo_iou=yolo_iou,
+            pipelined=pipelined,
+            yolo_batch_size=yolo_batch_size,
+            detect_max_side=detect_max_side,
+            face_det_size=face_det_size,
+            face_index_dir=face_index_dir,
+            progress=progress,
+            on_result=on_result,
+            on_refined=on_refined,
+            cancel_event=cancel_event,
+            stats=stats,
+        )
+
+    started = time.perf_counter()
+    with checkout_models(registry or default_registry, use_yolo, yolo_confidence, yolo_iou) as (
+        matcher,
+        yolo_detector,
+    ):
+        index_info = {"video_path": str(video_path), "frame_interval_sec": frame_interval_sec}
+        with build_face_index(face_index_dir, index_info) as face_index:
+            results = scan_video(
+                video_path,
+                gallery,
+                matcher,
+                yolo_detector,
+                min_confidence=min_confidence,
+                frame_interval_sec=frame_interval_sec,
+                pipelined=pipelined,
+                batch_size=yolo_batch_size or settings.yolo_batch_size,
+                tracking=use_tracking,
+                motion_gate=motion_gate,
+                stop_when_complete=adaptive,
+                idle_tail_sec=idle_tail_sec if adaptive else None,
+                detect_max_side=detect_max_side,
+                face_det_size=face_det_size,
+                face_index=face_index,
+                timeline_path=timeline_path,
+                timeline_format=timeline_format,
+                progress=progress,
+                on_result=on_result,
+                cancel_event=cancel_event,
+                stats=stats,
+            )
+        if adaptive:
+            refine_started = time.perf_counter()
+            refine_first_seen(
+                video_path,
+                results,
+                gallery,
+                matcher,
+                yolo_detector,
+                min_confidence=min_confidence,
+                frame_interval_sec=frame_interval_sec,
+                detect_max_side=detect_max_side,
+                face_det_size=face_det_size,
+                on_refined=on_refined,
+                cancel_event=cancel_event,
+                stats=stats,
+            )
+            stats.add_time("refine", time.perf_counter() - refine_started)
+    finish_video_stats(stats, started)
+    return format_results(results)
+
 
-    yolo_detector: YoloDetector | None = None
+def finish_video_stats(stats: ProcessingStats, started: float) -> None:
+    stats.timings["total"] = time.perf_counter() - started
+    record_video_metrics(stats, stats.timings["total"])
+
+
+@contextmanager
+def checkout_models(
+    registry: ModelRegistry,
+    use_yolo: bool,
+    yolo_confidence: float | None = None,
+    yolo_iou: float | None = None,
+) -> Iterator[tuple[Matcher, YoloDetector | None]]:
+    yolo_checkout = nullcontext(None)
     if use_yolo:
-        config = None
-        if yolo_confidence is not None or yolo_iou is not None:
-            config = YoloConfig(
-                confidence=yolo_confidence
-                if yolo_confidence is not None
-                else settings.yolo_confidence,
+        yolo_checkout = registry.checkout_yolo(
+            YoloConfig(
+                confidence=yolo_confidence if yolo_confidence is not None else settings.yolo_confidence,
                 iou=yolo_iou if yolo_iou is not None else settings.yolo_iou,
             )
-        yolo_detector = YoloDetector(config=config)
-        if not yolo_detector.available:
+        )
+    with registry.checkout_matcher() as matcher, yolo_checkout as yolo_detector:
+        if not matcher.available:
+            raise RuntimeError("face model is not available")
+        if yolo_detector is not None and not yolo_detector.available:
             raise RuntimeError("YOLO model is not available")
+        yield matcher, yolo_detector
 
-    gallery = build_reference_gallery(matcher, reference_items)
-    if not gallery:
-        return []
 
+def probe_video(video_path: Path) -> tuple[float, int]:
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError("unable to open video")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return fps, max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+
+def video_resolution_policy(
+    cap: cv2.VideoCapture,
+    use_yolo: bool,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+) -> ResolutionPolicy:
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    return resolution_policy(width, height, use_yolo, detect_max_side, face_det_size)
+
+
+def scan_video(
+    video_path: Path,
+    gallery: ReferenceGallery,
+    matcher: Matcher,
+    yolo_detector: YoloDetector | None,
+    min_confidence: float,
+    frame_interval_sec: float,
+    start_frame: int = 0,
+    end_frame: int | None = None,
+    pipelined: bool = False,
+    batch_size: int = 1,
+    tracking: bool = False,
+    motion_gate: bool = False,
+    stop_when_complete: bool = False,
+    idle_tail_sec: float | None = None,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    face_index: FaceIndexWriter | None = None,
+    timeline_path: Path | None = None,
+    timeline_format: str = "parquet",
+    progress: ProgressCallback | None = None,
+    on_result: ResultCallback | None = None,
+    cancel_event: threading.Event | None = None,
+    stats: ProcessingStats | None = None,
+) -> dict[str, dict]:
     cap = cv2.VideoCapture(str(video_path))
     if not cap.isOpened():
         raise RuntimeError("unable to open video")
 
     fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
     frame_interval = max(1, int(round(frame_interval_sec * fps)))
+    frames_total = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    policy = video_resolution_policy(cap, yolo_detector is not None, detect_max_side, face_det_size)
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
 
-    results: dict[str, dict] = {}
-    frame_index = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_index % frame_interval == 0:
-            embeddings = list(_iter_frame_embeddings(frame, matcher, yolo_detector))
-            for embedding in embeddings:
-                best, score = matcher.match(embedding, gallery)
-                if best is None:
-                    continue
-                confidence = (score + 1.0) / 2.0
-                if confidence < min_confidence:
-                    continue
-                name = best["name"]
-                if name not in results:
-                    results[name] = {
-                        "name": name,
-                        "confidence": confidence,
-                        "first_seen_sec": frame_index / fps,
-                    }
-        frame_index += 1
-
-    cap.release()
-
-    output = []
-    for item in results.values():
-        output.append(
-            {
-                "name": item["name"],
-                "confidence": round(item["confidence"] * 100.0, 2),
-                "first_seen_sec": round(item["first_seen_sec"], 2),
-            }
+    stats = stats if stats is not None else ProcessingStats()
+    sampler = FrameSampler(cap, frame_interval, start_frame, end_frame, cancel_event)
+    gate = None
+    frames: Iterable[tuple[int, np.ndarray]] = sampler
+    if motion_gate:
+        gate = MotionGate(sampler, settings.motion_threshold, int(round(settings.motion_refresh_sec * fps)))
+        frames = gate
+    frames = _timed_frames(frames, stats)
+    # Stages receive the frame indices with each batch so the tracker can age tracks in video time.
+    batches = ((indices, (indices, batch)) for indices, batch in iter_frame_batches(frames, batch_size))
+    tracker = None
+    if tracking and yolo_detector is not None:
+        tracker = IouTracker(
+            iou_threshold=settings.track_iou,
+            max_missed=int(settings.track_max_age_sec / frame_interval_sec),
         )
+    embedder = FrameEmbedder(
+        matcher,
+        gallery,
+        min_confidence,
+        tracker,
+        int(round(settings.track_reverify_sec * fps)),
+        policy.det_size,
+        # Identified tracks skip the face models, but the timeline still has to see them in every frame.
+        report_tracks=timeline_path is not None,
+    )
+
+    def detect(batch: tuple[tuple[int, ...], list[np.ndarray]]) -> tuple[tuple[int, ...], list[list[Region]]]:
+        return batch[0], batch_frame_regions(batch[1], yolo_detector, policy)
+
+    stage_fns = [
+        ("detect", _timed_stage(stats, "detect", detect)),
+        ("embed", _timed_stage(stats, "embed", embedder)),
+    ]
+    stage_stats: dict[str, dict] = {}
+    if pipelined:
+        analyzed = run_pipeline(batches, stage_fns, settings.pipeline_queue_size, stage_stats)
+    else:
+        analyzed = (_run_stages(stage_fns, key, frames) for key, frames in batches)
+
+    idle_tail_frames = int(round(idle_tail_sec * fps)) if idle_tail_sec is not None else None
+    # The idle countdown starts with the first identity, so a late first appearance is still found.
+    last_new_frame: int | None = None
+    stopped_at_frame = None
+    results: dict[str, dict] = {}
+    try:
+        with build_timeline(timeline_path, fps, frame_interval, timeline_format) as timeline:
+            for frame_indices, batch_faces in analyzed:
+                for frame_index, faces in zip(frame_indices, batch_faces):
+                    tracked: list[TrackedFace] = []
+                    if timeline is not None:
+                        tracked = [face for face in faces if isinstance(face, TrackedFace)]
+                        faces = [face for face in faces if not isinstance(face, TrackedFace)]
+                    if face_index is not None:
+                        started = time.perf_counter()
+                        face_index.add(frame_index, frame_index / fps, faces)
+                        stats.add_time("index", time.perf_counter() - started)
+                    started = time.perf_counter()
+                    if timeline is None:
+                        added = record_matches(results, gallery, faces, frame_index, fps, min_confidence)
+                        stats.add_time("match", time.perf_counter() - started)
+                    else:
+                        # First sightings come from the same per-frame sightings the timeline is built from.
+                        sightings = match_sightings(gallery, faces, min_confidence, tracked)
+                        added = record_sightings(results, sightings, frame_index, fps)
+                        stats.add_time("match", time.perf_counter() - started)
+                        started = time.perf_counter()
+                        timeline.add(frame_index, sightings)
+                        stats.add_time("timeline", time.perf_counter() - started)
+                    stats.faces_detected += len(faces)
+                    if added:
+                        last_new_frame = frame_index
+                    if on_result is not None:
+                        for name in added:
+                            on_result(format_result(results[name]))
+                if progress is not None:
+                    progress(frame_indices[-1] + 1, frames_total)
+                complete = stop_when_complete and len(results) == len(gallery.names)
+                idle = (
+                    idle_tail_frames is not None
+                    and last_new_frame is not None
+                    and frame_indices[-1] - last_new_frame >= idle_tail_frames
+                )
+                if complete or idle:
+                    stopped_at_frame = frame_indices[-1]
+                    break
+        if timeline is not None:
+            stats.timeline_intervals = timeline.rows_written
+    finally:
+        analyzed.close()
+        cap.release()
+
+    stats.frames_total = frames_total
+    stats.frames_read += sampler.position - start_frame
+    stats.frames_decoded += sampler.decoded
+    stats.frames_skipped += gate.skipped if gate is not None else 0
+    stats.stopped_at_frame = stopped_at_frame
+    stats.regions_detected += embedder.regions_detected
+    stats.regions_embedded += embedder.regions_embedded
+    stats.stages.update(stage_stats)
+    if progress is not None:
+        frames_done = sampler.position if stopped_at_frame is None else max(frames_total, sampler.position)
+        progress(frames_done, max(frames_total, sampler.position))
+    return results
+
+
+def refine_first_seen(
+    video_path: Path,
+    results: dict[str, dict],
+    gallery: ReferenceGallery,
+    matcher: Matcher,
+    yolo_detector: YoloDetector | None,
+    min_confidence: float,
+    frame_interval_sec: float,
+    detect_max_side: int | None = None,
+    face_det_size: int | None = None,
+    on_refined: ResultCallback | None = None,
+    cancel_event: threading.Event | None = None,
+    stats: ProcessingStats | None = None,
+) -> None:
+    # Bisects between the last sampled miss and the first sampled hit. Presence is assumed not to
+    # flicker inside one interval; if it does, this lands on a miss-to-hit edge, not necessarily the first.
+    pending = sorted(
+        (item for item in results.values() if item["frame_index"] > 0),
+        key=lambda item: item["frame_index"],
+    )
+    if not pending:
+        return
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError("unable to open video")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_interval = max(1, int(round(frame_interval_sec * fps)))
+    policy = video_resolution_policy(cap, yolo_detector is not None, detect_max_side, face_det_size)
+    probes: dict[int, dict[str, float]] = {}
+
+    def probe(frame_index: int) -> dict[str, float]:
+        if frame_index not in probes:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessingCancelled()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            matches: dict[str, float] = {}
+            if ret:
+                regions = batch_frame_regions([frame], yolo_detector, policy)
+                faces = batch_frame_faces(regions, matcher, policy.det_size)[0]
+                matches = match_faces(gallery, faces, min_confidence)
+            probes[frame_index] = matches
+        return probes[frame_index]
+
+    try:
+        for item in pending:
+            low = max(0, item["frame_index"] - frame_interval)
+            high = item["frame_index"]
+            while high - low > 1:
+                mid = (low + high) // 2
+                confidence = probe(mid).get(item["name"])
+                if confidence is None:
+                    low = mid
+                else:
+                    high = mid
+                    item["confidence"] = confidence
+            if high != item["frame_index"]:
+                item["frame_index"] = high
+                item["first_seen_sec"] = high / fps
+                if on_refined is not None:
+                    on_refined(format_result(item))
+    finally:
+        cap.release()
+
+    if stats is not None:
+        stats.frames_decoded += len(probes)
+        stats.refine_probes += len(probes)
+
 
+class FrameSampler:
+    # Frames between samples are only grab()bed, so they are never converted to BGR.
+    def __init__(
+        self,
+        cap: cv2.VideoCapture,
+        frame_interval: int,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> None:
+        self.cap = cap
+        self.frame_interval = frame_interval
+        self.end_frame = end_frame
+        self.cancel_event = cancel_event
+        self.position = start_frame
+        self.decoded = 0
+
+    def __iter__(self) -> Iterator[tuple[int, np.ndarray]]:
+        while self.end_frame is None or self.position < self.end_frame:
+            frame_index = self.position
+            if frame_index % self.frame_interval == 0:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise ProcessingCancelled()
+                ret, frame = self.cap.read()
+                if not ret:
+                    return
+                self.position += 1
+                self.decoded += 1
+                yield frame_index, frame
+            else:
+                if not self.cap.grab():
+                    return
+                self.position += 1
+
+
+class MotionGate:
+    # Drops sampled frames whose small grayscale thumbnail barely differs from the last frame let through.
+    # A frame is always let through once refresh_frames have passed, so slow changes are not missed.
+    PIXEL_DELTA = 25
+    THUMB_WIDTH = 96
+
+    def __init__(self, frames: Iterable[tuple[int, np.ndarray]], threshold: float, refresh_frames: int) -> None:
+        self.frames = frames
+        self.threshold = threshold
+        self.refresh_frames = refresh_frames
+        self.skipped = 0
+        self._last: np.ndarray | None = None
+        self._last_index = 0
+
+    def __iter__(self) -> Iterator[tuple[int, np.ndarray]]:
+        for frame_index, frame in self.frames:
+            thumb = self._thumbnail(frame)
+            if (
+                self._last is not None
+                and frame_index - self._last_index < self.refresh_frames
+                and self.changed_fraction(thumb, self._last) < self.threshold
+            ):
+                self.skipped += 1
+                continue
+            self._last = thumb
+            self._last_index = frame_index
+            yield frame_index, frame
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        thumb_width = min(self.THUMB_WIDTH, width)
+        size = (thumb_width, max(1, round(height * thumb_width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def changed_fraction(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.count_nonzero(cv2.absdiff(a, b) > self.PIXEL_DELTA)) / a.size
+
+
+def format_results(results: dict[str, dict]) -> list[dict]:
+    output = [format_result(item) for item in results.values()]
     output.sort(key=lambda x: x["first_seen_sec"])
     return output
 
 
-def _iter_frame_embeddings(
-    frame: np.ndarray,
-    matcher: Matcher,
+def format_result(item: dict) -> dict:
+    return {
+        "name": item["name"],
+        "confidence": round(item["confidence"] * 100.0, 2),
+        "first_seen_sec": round(item["first_seen_sec"], 2),
+    }
+
+
+def record_matches(
+    results: dict[str, dict],
+    gallery: ReferenceGallery,
+    faces: list[DetectedFace],
+    frame_index: int,
+    fps: float,
+    min_confidence: float,
+) -> list[str]:
+    added: list[str] = []
+    for name, confidence in match_faces(gallery, faces, min_confidence).items():
+        if name not in results:
+            results[name] = {
+                "name": name,
+                "confidence": confidence,
+                "first_seen_sec": frame_index / fps,
+                "frame_index": frame_index,
+            }
+            added.append(name)
+    return added
+
+
+def record_sightings(
+    results: dict[str, dict],
+    sightings: Sightings,
+    frame_index: int,
+    fps: float,
+) -> list[str]:
+    added: list[str] = []
+    for name, (confidence, _) in sightings.items():
+        if name not in results:
+            results[name] = {
+                "name": name,
+                "confidence": confidence,
+                "first_seen_sec": frame_index / fps,
+                "frame_index": frame_index,
+            }
+            added.append(name)
+    return added
+
+
+def match_sightings(
+    gallery: ReferenceGallery,
+    faces: list[DetectedFace],
+    min_confidence: float,
+    tracked: list[TrackedFace] | None = None,
+) -> Sightings:
+    # The best-scoring box per name in one frame; tracked faces count with their last verified confidence.
+    sightings: Sightings = {}
+    if faces:
+        person_ids, scores = gallery.match(np.stack([face.embedding for face in faces]))
+        for face, person_id, score in zip(faces, person_ids, scores):
+            confidence = (float(score) + 1.0) / 2.0
+            name = gallery.names[person_id]
+            if confidence >= min_confidence and confidence > sightings.get(name, (-1.0,))[0]:
+                sightings[name] = (confidence, face.bbox)
+    for face in tracked or ():
+        if face.confidence > sightings.get(face.name, (-1.0,))[0]:
+            sightings[face.name] = (face.confidence, face.bbox)
+    return sightings
+
+
+def match_faces(
+    gallery: ReferenceGallery,
+    faces: list[DetectedFace],
+    min_confidence: float,
+) -> dict[str, float]:
+    matches: dict[str, float] = {}
+    if not faces:
+        return matches
+    person_ids, scores = gallery.match(np.stack([face.embedding for face in faces]))
+    for person_id, score in zip(person_ids, scores):
+        confidence = (float(score) + 1.0) / 2.0
+        if confidence < min_confidence:
+            continue
+        matches.setdefault(gallery.names[person_id], confidence)
+    return matches
+
+
+def iter_frame_batches(
+    frames: Iterable[tuple[int, np.ndarray]],
+    batch_size: int,
+) -> Iterator[tuple[tuple[int, ...], list[np.ndarray]]]:
+    batch: list[tuple[int, np.ndarray]] = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield tuple(index for index, _ in batch), [frame for _, frame in batch]
+            batch = []
+    if batch:
+        yield tuple(index for index, _ in batch), [frame for _, frame in batch]
+
+
+def _timed_frames(
+    frames: Iterable[tuple[int, np.ndarray]],
+    stats: ProcessingStats,
+) -> Iterator[tuple[int, np.ndarray]]:
+    iterator = iter(frames)
+    while True:
+        started = time.perf_counter()
+        item = next(iterator, None)
+        stats.add_time("decode", time.perf_counter() - started)
+        if item is None:
+            return
+        yield item
+
+
+def _timed_stage(stats: ProcessingStats, stage: str, fn: Callable) -> Callable:
+    def run(payload):
+        started = time.perf_counter()
+        try:
+            return fn(payload)
+        finally:
+            stats.add_time(stage, time.perf_counter() - started)
+
+    return run
+
+
+def _run_stages(stage_fns: list[tuple[str, Callable]], key, payload):
+    for _, fn in stage_fns:
+        payload = fn(payload)
+    return key, payload
+
+
+def batch_frame_regions(
+    frames: list[np.ndarray],
     yolo_detector: YoloDetector | None,
-) -> list[np.ndarray]:
+    policy: ResolutionPolicy | list[ResolutionPolicy],
+) -> list[list[Region]]:
+    # A list of policies gives each frame its own, for batches that mix videos.
+    policies = policy if isinstance(policy, list) else [policy] * len(frames)
+    pyramids = [FramePyramid(frame) for frame in frames]
     if yolo_detector is None:
         return [
-            embedding
-            for embedding in _extract_embeddings_from_faces(matcher.detect_faces(frame))
+            [pyramid.region((0, 0, frame.shape[1], frame.shape[0]), frame_policy.det_side)]
+            for pyramid, frame, frame_policy in zip(pyramids, frames, policies)
         ]
 
-    height, width = frame.shape[:2]
-    embeddings: list[np.ndarray] = []
-    boxes = yolo_detector.detect_person_boxes(frame)
-    for box in boxes:
-        x1, y1, x2, y2 = _clip_box(box, width, height)
-        if x2 <= x1 or y2 <= y1:
-            continue
-        crop = frame[y1:y2, x1:x2]
-        faces = matcher.detect_faces(crop)
-        embeddings.extend(_extract_embeddings_from_faces(faces))
-    return embeddings
+    scaled = [downscale(frame, frame_policy.detect_max_side) for frame, frame_policy in zip(frames, policies)]
+    batch_boxes = yolo_detector.detect_person_boxes_batch([small for small, _ in scaled])
+    output: list[list[Region]] = []
+    for pyramid, frame_policy, (_, scale), boxes in zip(pyramids, policies, scaled, batch_boxes):
+        height, width = pyramid.frame.shape[:2]
+        regions: list[Region] = []
+        for box in np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale:
+            x1, y1 = np.floor(box[:2]).astype(int)
+            x2, y2 = np.ceil(box[2:]).astype(int)
+            x1, y1, x2, y2 = _clip_box((int(x1), int(y1), int(x2), int(y2)), width, height)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            regions.append(pyramid.region((x1, y1, x2, y2), frame_policy.det_side))
+        output.append(regions)
+    return output
 
 
-def _extract_embeddings_from_faces(faces: list) -> list[np.ndarray]:
-    embeddings: list[np.ndarray] = []
-    for face in faces:
-        embedding = getattr(face, "embedding", None)
-        if embedding is None:
-            continue
-        embeddings.append(embedding)
-    return embeddings
+def batch_frame_faces(
+    per_frame: list[list[Region]],
+    matcher: Matcher,
+    det_size: tuple[int, int] | None = None,
+) -> list[list[DetectedFace]]:
+    # One detector pass per region, then a single recognition batch across every frame in the batch.
+    flat = [region for regions in per_frame for region in regions]
+    faces_per_region = iter(matcher.detect_and_embed(flat, det_size))
+    output: list[list[DetectedFace]] = []
+    for regions in per_frame:
+        faces: list[DetectedFace] = []
+        for _ in regions:
+            faces.extend(next(faces_per_region))
+        output.append(faces)
+    return output
+
+
+@dataclass
+class TrackedFace:
+    bbox: np.ndarray
+    name: str
+    confidence: float
+
+
+class FrameEmbedder:
+    # With a tracker, regions whose track is already identified skip the face models until the
+    # track is due for re-verification, so per-frame face work scales with new people, not all people.
+    def __init__(
+        self,
+        matcher: Matcher,
+        gallery: ReferenceGallery,
+        min_confidence: float,
+        tracker: IouTracker | None = None,
+        reverify_frames: int = 0,
+        det_size: tuple[int, int] | None = None,
+        report_tracks: bool = False,
+    ) -> None:
+        self.matcher = matcher
+        self.gallery = gallery
+        self.min_confidence = min_confidence
+        self.tracker = tracker
+        self.reverify_frames = reverify_frames
+        self.det_size = det_size
+        self.report_tracks = report_tracks
+        self.regions_detected = 0
+        self.regions_embedded = 0
+
+    def __call__(self, batch: tuple[tuple[int, ...], list[list[Region]]]) -> list[list[DetectedFace]]:
+        frame_indices, per_frame = batch
+        self.regions_detected += sum(len(regions) for regions in per_frame)
+        if self.tracker is None:
+            self.regions_embedded += sum(len(regions) for regions in per_frame)
+            return batch_frame_faces(per_frame, self.matcher, self.det_size)
+
+        pending = []
+        output: list[list[DetectedFace]] = [[] for _ in per_frame]
+        for frame_pos, (frame_index, regions) in enumerate(zip(frame_indices, per_frame)):
+            boxes = np.array([_region_box(region) for region in regions], dtype=np.float32).reshape(-1, 4)
+            for track, region in zip(self.tracker.update(boxes), regions):
+                if track.identified and frame_index - track.verified_at < self.reverify_frames:
+                    if self.report_tracks:
+                        # The verified face box, moved along with the person box it was found in.
+                        face_box = track.face_offset + np.tile(track.box[:2], 2)
+                        output[frame_pos].append(TrackedFace(face_box, track.name, track.confidence))
+                    continue
+                pending.append((frame_pos, frame_index, track, region))
+
+        self.regions_embedded += len(pending)
+        faces_per_region = self.matcher.detect_and_embed([region for *_, region in pending], self.det_size)
+        for (frame_pos, frame_index, track, _), faces in zip(pending, faces_per_region):
+            output[frame_pos].extend(faces)
+            sightings = match_sightings(self.gallery, faces, self.min_confidence)
+            if sightings:
+                track.name, (track.confidence, face_box) = max(sightings.items(), key=lambda item: item[1][0])
+                track.face_offset = np.asarray(face_box, dtype=np.float32)[:4] - np.tile(track.box[:2], 2)
+            else:
+                # A failed re-check may mean a different person now owns the box: embed it again until resolved.
+                track.name = None
+            track.verified_at = frame_index
+        return output
+
+
+def _region_box(region: Region) -> tuple[int, int, int, int]:
+    crop, (x1, y1), scale = region
+    height, width = crop.shape[:2]
+    return x1, y1, x1 + int(width * scale), y1 + int(height * scale)
 
 
 def _clip_box(
@@ -134,22 +779,3 @@ def _clip_box(
     y2 = max(0, min(height, y2))
     return x1, y1, x2, y2
 
-
-def build_reference_gallery(matcher: Matcher, reference_items: list[dict]) -> list[dict]:
-    gallery: list[dict] = []
-    for item in reference_items:
-        name = item.get("name")
-        if not name:
-            continue
-        embedding = item.get("embedding")
-        if embedding is None:
-            image_path = item.get("image_path")
-            if image_path is None:
-                continue
-            embedding = matcher.extract_embedding_from_image_path(str(image_path))
-        if embedding is None:
-            continue
-        if not isinstance(embedding, np.ndarray):
-            embedding = np.array(embedding, dtype=np.float32)
-        gallery.append({"name": name, "embedding": embedding})
-    return gallery
@@ -7,6 +7,7 @@ from typing import Optional
 import numpy as np
 
 from app.config import settings
+from app.services.model_cache import yolo_artifact
 
 
 @dataclass
@@ -23,6 +24,7 @@ class YoloDetector:
     ) -> None:
         self.available = False
         self.model = None
+        self.load_error: Optional[str] = None
         self.config = config or YoloConfig(
             confidence=settings.yolo_confidence,
             iou=settings.yolo_iou,
@@ -32,35 +34,44 @@ class YoloDetector:
 
             resolved_path = Path(model_path or settings.resolved_yolo_model_path())
             resolved_path.parent.mkdir(parents=True, exist_ok=True)
-            self.model = YOLO(str(resolved_path))
+            artifact = yolo_artifact(resolved_path, settings.yolo_export_format)
+            self.model = YOLO(str(artifact), task="detect")
+            if settings.inference_threads > 0:
+                # Ultralytics builds its runtime session internally, so the PyTorch pool is what can be capped.
+                import torch
+
+                torch.set_num_threads(settings.inference_threads)
             self.available = True
-        except Exception:
+        except Exception as exc:
             self.model = None
+            self.load_error = f"{type(exc).__name__}: {exc}"
 
     def detect_person_boxes(self, frame: np.ndarray) -> list[tuple[int, int, int, int]]:
-        if not self.available or self.model is None:
-            return []
+        boxes = self.detect_person_boxes_batch([frame])[0]
+        corners = np.hstack([np.floor(boxes[:, :2]), np.ceil(boxes[:, 2:])]).astype(int)
+        return [tuple(box) for box in corners.tolist()]
+
+    def detect_person_boxes_batch(self, frames: list[np.ndarray]) -> list[np.ndarray]:
+        # Boxes stay in float pixels: callers that scale them to another resolution round only once.
+        empty = [np.zeros((0, 4), dtype=np.float32) for _ in frames]
+        if not self.available or self.model is None or not frames:
+            return empty
 
         results = self.model.predict(
-            frame,
+            frames,
             verbose=False,
             conf=self.config.confidence,
             iou=self.config.iou,
             classes=[0],
         )
         if not results:
-            return []
-        boxes = results[0].boxes
-        if boxes is None:
-            return []
+            return empty
 
-        xyxy = boxes.xyxy.cpu().numpy()
-        output: list[tuple[int, int, int, int]] = []
-        for x1, y1, x2, y2 in xyxy:
-            output.append((int(x1), int(y1), int(x2), int(y2)))
+        output: list[np.ndarray] = []
+        for result, fallback in zip(results, empty):
+            boxes = result.boxes
+            if boxes is None or not len(boxes):
+                output.append(fallback)
+                continue
+            output.append(boxes.xyxy.cpu().numpy().astype(np.float32))
         return output
-
-
-def warm_up_yolo() -> bool:
-    detector = YoloDetector()
-    return detector.available
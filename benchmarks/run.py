@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+CACHE_DIR = BENCH_DIR / ".cache"
+
+# Settings are read at import time, and spawned case and segment processes re-import this module,
+# so the environment and the stub models have to be in place before anything from app is imported.
+os.environ.setdefault("PIV_DATA_DIR", str(CACHE_DIR / "data"))
+os.environ.setdefault("PIV_SEGMENT_WORKERS", "2")
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import multiprocessing  # noqa: E402
+import platform  # noqa: E402
+import resource  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from concurrent.futures import ProcessPoolExecutor  # noqa: E402
+from dataclasses import asdict  # noqa: E402
+from typing import Optional  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from benchmarks.stubs import EMBEDDING_DIM, PROFILE_ENV, PROFILES, identity_embedding, install_stubs  # noqa: E402
+from benchmarks.synthetic import Scenario, appearances, ensure_video  # noqa: E402
+
+install_stubs()
+
+from app.services.gallery import ReferenceGallery  # noqa: E402
+from app.services.segment_processor import segment_pool  # noqa: E402
+from app.services.video_processor import ProcessingStats, process_video  # noqa: E402
+
+DISTRACTOR_PEOPLE = 1000
+REFERENCES_PER_PERSON = 3
+REFERENCE_SIMILARITY = 0.8
+FRAME_INTERVAL_SEC = 0.5
+DEFAULT_TOLERANCE = 0.15
+
+SUITES = {
+    "quick": [
+        Scenario("360p-20s-4p", 640, 360, 20.0, 4),
+        Scenario("720p-20s-8p", 1280, 720, 20.0, 8),
+    ],
+    "full": [
+        Scenario(f"{label}-{int(duration)}s-{people}p", width, height, duration, people)
+        for label, width, height in (("360p", 640, 360), ("720p", 1280, 720), ("1080p", 1920, 1080))
+        for duration in (30.0, 120.0)
+        for people in (4, 24)
+    ],
+}
+
+MODES = {
+    "sequential": {"use_tracking": False},
+    "pipelined": {"use_tracking": False, "pipelined": True},
+    "tracking": {"use_tracking": True},
+    "motion_gate": {"use_tracking": True, "motion_gate": True},
+    "adaptive": {"use_tracking": True, "adaptive": True},
+    "segments": {"use_tracking": True, "segment_workers": 2},
+    "shared_decode": {"use_tracking": False, "segment_workers": 2, "shared_decode": True},
+}
+
+
+def build_gallery(scenario: Scenario) -> ReferenceGallery:
+    # The scenario's identities plus seeded random distractors; reference rows are the identity
+    # embedding with noise, so matches land around REFERENCE_SIMILARITY like real photos do.
+    rng = np.random.default_rng(scenario.seed + 1)
+    scale = np.sqrt((1.0 / REFERENCE_SIMILARITY**2 - 1.0) / EMBEDDING_DIM)
+    items = []
+    for person in appearances(scenario):
+        base = identity_embedding(person.color)
+        base = base / np.linalg.norm(base)
+        items.extend(
+            (person.name, base + rng.normal(scale=scale, size=EMBEDDING_DIM)) for _ in range(REFERENCES_PER_PERSON)
+        )
+    for index in range(DISTRACTOR_PEOPLE):
+        items.extend(
+            (f"distractor-{index:04d}", rng.normal(size=EMBEDDING_DIM)) for _ in range(REFERENCES_PER_PERSON)
+        )
+    return ReferenceGallery.from_embeddings(items)
+
+
+def score_results(scenario: Scenario, results: list[dict]) -> dict:
+    expected = {person.name: person.enter_sec for person in appearances(scenario)}
+    found = {item["name"]: item["first_seen_sec"] for item in results}
+    errors = [abs(found[name] - enter) for name, enter in expected.items() if name in found]
+    return {
+        "recall": round(sum(name in found for name in expected) / max(1, len(expected)), 4),
+        "false_positives": sum(name not in expected for name in found),
+        "first_seen_error_sec": round(max(errors), 3) if errors else None,
+    }
+
+
+def run_case(video_path: str, scenario: Scenario, mode: str, repeat: int) -> dict:
+    # Runs in a fresh process so peak RSS belongs to this case alone; segment workers are children.
+    gallery = build_gallery(scenario)
+    best: Optional[tuple[float, ProcessingStats, list[dict]]] = None
+    for _ in range(repeat):
+        stats = ProcessingStats()
+        started = time.perf_counter()
+        results = process_video(
+            Path(video_path),
+            gallery,
+            frame_interval_sec=FRAME_INTERVAL_SEC,
+            stats=stats,
+            **MODES[mode],
+        )
+        wall = time.perf_counter() - started
+        if best is None or wall < best[0]:
+            best = (wall, stats, results)
+    segment_pool.shutdown()
+
+    wall, stats, results = best
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {
+        "case": f"{scenario.name}/{mode}",
+        "scenario": asdict(scenario),
+        "mode": mode,
+        "wall_sec": round(wall, 4),
+        "frames_decoded": stats.frames_decoded,
+        "frames_per_sec": round(stats.frames_decoded / max(wall, 1e-9), 2),
+        "realtime_factor": round(scenario.duration_sec / max(wall, 1e-9), 2),
+        "peak_rss_mb": round(peak_kb / 1024.0, 1),
+        "timings": {stage: round(seconds, 4) for stage, seconds in sorted(stats.timings.items())},
+        "accuracy": score_results(scenario, results),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    if baseline.get("profile") != report["profile"]:
+        return [f"baseline profile {baseline.get('profile')!r} does not match {report['profile']!r}"]
+    previous = {case["case"]: case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in report["cases"]:
+        old = previous.get(case["case"])
+        if old is None:
+            continue
+        if case["frames_per_sec"] < old["frames_per_sec"] * (1.0 - tolerance):
+            regressions.append(f"{case['case']}: frames/sec {old['frames_per_sec']} -> {case['frames_per_sec']}")
+        if case["peak_rss_mb"] > old["peak_rss_mb"] * (1.0 + tolerance):
+            regressions.append(f"{case['case']}: peak RSS {old['peak_rss_mb']} MB -> {case['peak_rss_mb']} MB")
+        if case["accuracy"]["recall"] < old["accuracy"]["recall"]:
+            regressions.append(f"{case['case']}: recall {old['accuracy']['recall']} -> {case['accuracy']['recall']}")
+    return regressions
+
+
+def print_header() -> None:
+    print(f"{'case':<28} {'wall s':>8} {'frames/s':>9} {'x real':>7} {'RSS MB':>7} {'recall':>6}  stages (s)")
+
+
+def print_row(case: dict) -> None:
+    stages = " ".join(f"{stage}={seconds:.3f}" for stage, seconds in case["timings"].items())
+    print(
+        f"{case['case']:<28} {case['wall_sec']:>8.3f} {case['frames_per_sec']:>9.1f} "
+        f"{case['realtime_factor']:>7.1f} {case['peak_rss_mb']:>7.1f} {case['accuracy']['recall']:>6.2f}  {stages}",
+        flush=True,
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline on synthetic videos with stub models.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated subset of: " + ", ".join(MODES))
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=os.environ.get(PROFILE_ENV, "cpu"))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported")
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="compare against this report and exit 1 on regression")
+    parser.add_argument("--save-baseline", type=Path, help="also write the report here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+    # Children inherit the environment, which is where the stubs read their latency profile from.
+    os.environ[PROFILE_ENV] = args.profile
+
+    print_header()
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for scenario in SUITES[args.suite]:
+        video_path = ensure_video(scenario, CACHE_DIR / "videos")
+        for mode in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(run_case, str(video_path), scenario, mode, max(1, args.repeat)).result()
+            cases.append(case)
+            print_row(case)
+
+    report = {
+        "suite": args.suite,
+        "profile": args.profile,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cases": cases,
+    }
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline is not None:
+        regressions = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
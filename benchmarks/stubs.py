@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.services import model_registry
+from app.services.matcher import DetectedFace
+from app.services.yolo_detector import YoloConfig
+from benchmarks.synthetic import quantize_color
+
+PROFILE_ENV = "PIV_BENCH_PROFILE"
+EMBEDDING_DIM = 512
+MIN_FACE_AREA = 16
+COLOR_SPREAD_THRESHOLD = 40
+PERSON_LUMA_THRESHOLD = 90
+REFERENCE_DET_AREA = 640 * 640
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    # Milliseconds slept per call / per item; sleeping releases the GIL the way ONNX and torch do.
+    # detect_region_ms is for a 640x640 face detector input.
+    yolo_call_ms: float
+    yolo_frame_ms: float
+    detect_region_ms: float
+    recognize_call_ms: float
+    recognize_face_ms: float
+
+
+PROFILES = {
+    "zero": LatencyProfile(0.0, 0.0, 0.0, 0.0, 0.0),
+    "cpu": LatencyProfile(10.0, 25.0, 6.0, 2.0, 3.0),
+    "gpu": LatencyProfile(3.0, 1.5, 1.0, 1.0, 0.2),
+}
+
+
+def identity_embedding(color: tuple[int, int, int]) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha1(bytes(color)).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(size=EMBEDDING_DIM).astype(np.float32)
+
+
+def find_faces(image: np.ndarray) -> list[tuple[np.ndarray, tuple[int, int, int]]]:
+    # Faces are the strongly colored blobs; gray bodies and the dark background have little channel spread.
+    spread = image.max(axis=2).astype(np.int16) - image.min(axis=2)
+    mask = (spread > COLOR_SPREAD_THRESHOLD).astype(np.uint8)
+    count, labels, boxes, _ = cv2.connectedComponentsWithStats(mask)
+    faces = []
+    for label in range(1, count):
+        x, y, width, height, area = boxes[label]
+        if area < MIN_FACE_AREA:
+            continue
+        color = np.median(image[labels == label], axis=0)
+        faces.append((np.array([x, y, x + width, y + height], dtype=np.float32), quantize_color(color)))
+    return faces
+
+
+def _sleep(milliseconds: float) -> None:
+    if milliseconds > 0:
+        time.sleep(milliseconds / 1000.0)
+
+
+class StubMatcher:
+    def __init__(self, det_size: tuple[int, int] = (640, 640), profile: Optional[LatencyProfile] = None) -> None:
+        self.available = True
+        self.det_size = det_size
+        self.profile = profile or active_profile()
+
+    def detect_faces(self, frame: np.ndarray) -> list[DetectedFace]:
+        return self.detect_and_embed([(frame, (0, 0), 1.0)])[0]
+
+    def detect_and_embed(
+        self,
+        regions: list[tuple[np.ndarray, tuple[int, int], float]],
+        det_size: Optional[tuple[int, int]] = None,
+    ) -> list[list[DetectedFace]]:
+        # Detector latency scales with the input area, like a fully convolutional detector's does.
+        width, height = det_size or self.det_size
+        detect_ms = self.profile.detect_region_ms * width * height / REFERENCE_DET_AREA
+        output: list[list[DetectedFace]] = []
+        found = 0
+        for region, (offset_x, offset_y), scale in regions:
+            _sleep(detect_ms)
+            offset = np.array([offset_x, offset_y, offset_x, offset_y], dtype=np.float32)
+            faces = [
+                DetectedFace(bbox=bbox * scale + offset, det_score=0.9, embedding=identity_embedding(color))
+                for bbox, color in find_faces(region)
+            ]
+            found += len(faces)
+            output.append(faces)
+        if found:
+            _sleep(self.profile.recognize_call_ms + self.profile.recognize_face_ms * found)
+        return output
+
+    def embed_images(self, images: list[Optional[np.ndarray]]) -> list[Optional[np.ndarray]]:
+        output = []
+        for image in images:
+            faces = self.detect_faces(image) if image is not None else []
+            output.append(faces[0].embedding if faces else None)
+        return output
+
+    def extract_embedding_from_image_path(self, image_path: str) -> Optional[np.ndarray]:
+        return self.embed_images([cv2.imread(str(image_path))])[0]
+
+
+class StubYolo:
+    def __init__(self, config: Optional[YoloConfig] = None, profile: Optional[LatencyProfile] = None) -> None:
+        self.available = True
+        self.config = config
+        self.profile = profile or active_profile()
+
+    def detect_person_boxes(self, frame: np.ndarray) -> list[tuple[int, int, int, int]]:
+        return [tuple(int(value) for value in box) for box in self.detect_person_boxes_batch([frame])[0]]
+
+    def detect_person_boxes_batch(self, frames: list[np.ndarray]) -> list[np.ndarray]:
+        if not frames:
+            return []
+        _sleep(self.profile.yolo_call_ms + self.profile.yolo_frame_ms * len(frames))
+        output = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            mask = (gray > PERSON_LUMA_THRESHOLD).astype(np.uint8)
+            count, _, boxes, _ = cv2.connectedComponentsWithStats(mask)
+            people = [
+                (x, y, x + width, y + height)
+                for x, y, width, height, area in boxes[1:count]
+                if area >= MIN_FACE_AREA
+            ]
+            output.append(np.array(people, dtype=np.int32).reshape(-1, 4))
+        return output
+
+
+def active_profile() -> LatencyProfile:
+    return PROFILES[os.environ.get(PROFILE_ENV, "zero")]
+
+
+def install_stubs() -> None:
+    # Replaces the model factories of the shared registry; segment workers import this module's
+    # caller as their main module, so they install the same stubs with the profile from the environment.
+    model_registry.registry._matcher_factory = StubMatcher
+    model_registry.registry._yolo_factory = StubYolo
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Face colors are drawn from this grid; stub models map a face's color back to an identity, so the
+# channel levels are far enough apart to survive MJPG compression.
+COLOR_LEVELS = (112, 144, 176, 208, 240)
+MIN_COLOR_SPREAD = 64
+MOVE_SEC = 2.0
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    width: int
+    height: int
+    duration_sec: float
+    people: int
+    fps: float = 25.0
+    seed: int = 0
+
+    def key(self) -> str:
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class Appearance:
+    name: str
+    color: tuple[int, int, int]
+    enter_sec: float
+
+
+def identity_palette() -> list[tuple[int, int, int]]:
+    return [
+        (b, g, r)
+        for b in COLOR_LEVELS
+        for g in COLOR_LEVELS
+        for r in COLOR_LEVELS
+        if max(b, g, r) - min(b, g, r) >= MIN_COLOR_SPREAD
+    ]
+
+
+def quantize_color(color: np.ndarray) -> tuple[int, int, int]:
+    levels = np.asarray(COLOR_LEVELS)
+    return tuple(int(levels[np.abs(levels - float(value)).argmin()]) for value in color)
+
+
+def appearances(scenario: Scenario) -> list[Appearance]:
+    # People enter one after another over the first two thirds of the video and stay until the end.
+    palette = identity_palette()
+    rng = np.random.default_rng(scenario.seed)
+    colors = rng.choice(len(palette), scenario.people, replace=False)
+    spacing = scenario.duration_sec * 2 / 3 / max(1, scenario.people)
+    return [
+        Appearance(f"person-{int(index):03d}", palette[int(index)], round(order * spacing, 3))
+        for order, index in enumerate(colors)
+    ]
+
+
+def render_video(scenario: Scenario, path: Path) -> None:
+    # Dark static background, mid-gray bodies with a colored face square on top. Each person gets a
+    # cell of a grid so nobody occludes anyone else, walks across it for MOVE_SEC after entering and
+    # then stands still, so static stretches exercise the motion gate.
+    rng = np.random.default_rng(scenario.seed)
+    width, height = scenario.width, scenario.height
+    background = rng.integers(16, 48, size=(height, width, 3), dtype=np.uint8)
+    people = appearances(scenario)
+    cols = max(1, math.ceil(math.sqrt(len(people) * width / height)))
+    rows = max(1, math.ceil(len(people) / cols))
+    cell_w, cell_h = width // cols, height // rows
+    body_w = max(8, min(width // 14, cell_w // 2))
+    body_h = max(16, min(height // 4, cell_h * 3 // 5))
+    face = max(6, body_w // 2)
+    cells = rng.permutation(cols * rows)[: len(people)]
+    tops = [(cell // cols) * cell_h + rng.integers(face, max(face + 1, cell_h - body_h)) for cell in cells]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp.avi")
+    writer = cv2.VideoWriter(str(tmp_path), cv2.VideoWriter_fourcc(*"MJPG"), scenario.fps, (width, height))
+    try:
+        for frame_index in range(int(round(scenario.duration_sec * scenario.fps))):
+            now = frame_index / scenario.fps
+            frame = background.copy()
+            for person, cell, y in zip(people, cells, tops):
+                if now < person.enter_sec:
+                    continue
+                walked = min(now - person.enter_sec, MOVE_SEC) / MOVE_SEC
+                x = (cell % cols) * cell_w + int(walked * (cell_w - body_w - 2))
+                y = int(y)
+                cv2.rectangle(frame, (x, y), (x + body_w - 1, y + body_h - 1), (128, 128, 128), -1)
+                fx = x + (body_w - face) // 2
+                cv2.rectangle(frame, (fx, y - face), (fx + face - 1, y - 1), person.color, -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    tmp_path.replace(path)
+
+
+def ensure_video(scenario: Scenario, video_dir: Path) -> Path:
+    path = video_dir / f"{scenario.name}-{scenario.key()}.avi"
+    if not path.exists():
+        render_video(scenario, path)
+    return path
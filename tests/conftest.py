@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when app.config is first imported, so the data directory has to be set before any test
+# module imports the app.
+os.environ["PIV_DATA_DIR"] = tempfile.mkdtemp(prefix="piv-tests-")
+os.environ.setdefault("PIV_METRICS_ENABLED", "false")
+
+
+@pytest.fixture
+def db():
+    from app.db import SessionLocal, engine, init_db
+    from app.models import Base
+
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services.ann_index import IvfGallery, assign_lists, synthetic_queries, train_centroids
+from app.services.gallery import ReferenceGallery, normalize_rows
+
+
+def gallery(rows: int = 60, dim: int = 16, seed: int = 0) -> ReferenceGallery:
+    rng = np.random.default_rng(seed)
+    matrix = normalize_rows(rng.standard_normal((rows, dim)).astype(np.float32))
+    names = [f"person{index}" for index in range(rows // 3)]
+    return ReferenceGallery(names, matrix, np.repeat(np.arange(len(names)), 3))
+
+
+def ivf(exact: ReferenceGallery, centroids: np.ndarray, nprobe: int) -> IvfGallery:
+    lists = assign_lists(centroids, exact.matrix)
+    return IvfGallery(exact.names, exact.matrix, exact.person_index, centroids, lists, nprobe)
+
+
+def test_probing_every_list_is_an_exact_scan():
+    exact = gallery()
+    index = ivf(exact, train_centroids(exact.matrix, 6), nprobe=6)
+    queries = synthetic_queries(exact.matrix, 12)
+
+    best, scores = index.match(queries)
+    expected_best, expected_scores = exact.match(queries)
+
+    np.testing.assert_array_equal(best, expected_best)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def test_queries_near_a_row_find_it_with_few_probes():
+    exact = gallery()
+    index = ivf(exact, train_centroids(exact.matrix, 6), nprobe=2)
+    queries = synthetic_queries(exact.matrix, 12, similarity=0.95)
+
+    best, scores = index.match(queries)
+    expected_best, expected_scores = exact.match(queries)
+
+    np.testing.assert_array_equal(best, expected_best)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def test_queries_whose_probed_lists_are_empty_fall_back_to_an_exact_scan():
+    exact = gallery(dim=4)
+    # Every row sits in the first list; the second centroid owns no rows at all.
+    centroids = np.array([[1, 0, 0, 0], [-1, 0, 0, 0]], dtype=np.float32)
+    lists = np.zeros(len(exact.matrix), dtype=np.int32)
+    index = IvfGallery(exact.names, exact.matrix, exact.person_index, centroids, lists, nprobe=1)
+    queries = np.array([[-1, 0.1, 0, 0], [1, 0, 0.2, 0]], dtype=np.float32)
+
+    best, scores = index.match(queries)
+    expected_best, expected_scores = exact.match(queries)
+
+    np.testing.assert_array_equal(best, expected_best)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+    assert np.isfinite(scores).all()
+
+
+def test_with_nprobe_keeps_the_index_and_clamps_to_the_list_count():
+    exact = gallery()
+    index = ivf(exact, train_centroids(exact.matrix, 4), nprobe=1)
+
+    wider = index.with_nprobe(10)
+
+    assert wider.nprobe == 4
+    assert wider.list_matrix is index.list_matrix
+    np.testing.assert_array_equal(wider.lists, index.lists)
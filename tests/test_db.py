@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+from app.db import _migrate_json_embeddings
+from app.models import Person, ReferenceImage
+from app.services.gallery import embedding_from_bytes, embedding_to_bytes
+
+
+def test_json_embeddings_are_moved_to_float32_blobs(db):
+    person = Person(name="alice")
+    db.add(person)
+    db.flush()
+    vectors = [[0.5, -1.25, 2.0], [1.0, 0.0, -0.5], [0.25, 0.25, 0.25]]
+    legacy = [
+        ReferenceImage(person_id=person.id, image_path=f"references/{index}.jpg", embedding_json=json.dumps(vector))
+        for index, vector in enumerate(vectors)
+    ]
+    current = ReferenceImage(
+        person_id=person.id,
+        image_path="references/current.jpg",
+        embedding=embedding_to_bytes(np.array([3.0, 2.0, 1.0])),
+    )
+    db.add_all([*legacy, current])
+    db.commit()
+
+    # A batch smaller than the row count also covers the batched UPDATE.
+    _migrate_json_embeddings(batch_size=2)
+    db.expire_all()
+
+    for image, vector in zip(legacy, vectors):
+        assert image.embedding_json is None
+        stored = embedding_from_bytes(image.embedding)
+        assert stored.dtype == np.float32
+        np.testing.assert_array_equal(stored, np.asarray(vector, dtype=np.float32))
+    np.testing.assert_array_equal(embedding_from_bytes(current.embedding), [3.0, 2.0, 1.0])
+
+
+def test_migration_skips_rows_without_any_embedding(db):
+    person = Person(name="bob")
+    db.add(person)
+    db.flush()
+    image = ReferenceImage(person_id=person.id, image_path="references/empty.jpg")
+    db.add(image)
+    db.commit()
+
+    _migrate_json_embeddings()
+    db.expire_all()
+
+    assert image.embedding is None and image.embedding_json is None
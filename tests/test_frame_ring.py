@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from app.services.frame_ring import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(2, (2, 3, 3))
+    yield ring
+    ring.close()
+
+
+def test_acquire_hands_out_slots_in_order_until_exhausted(ring):
+    assert ring.free == 2
+    assert ring.acquire() == 0
+    assert ring.acquire() == 1
+    assert ring.acquire() is None
+
+    ring.release(1)
+    assert ring.free == 1
+    assert ring.acquire() == 1
+
+
+def test_reader_sees_written_frames(ring):
+    frame = np.arange(18, dtype=np.uint8).reshape(2, 3, 3)
+    slot = ring.acquire()
+    ring.write(slot, frame)
+
+    reader = FrameRing.attach(ring.spec)
+    try:
+        assert reader.free == 0
+        np.testing.assert_array_equal(reader.frame(slot), frame)
+    finally:
+        reader.close()
+
+
+def test_write_rejects_frames_of_another_shape(ring):
+    with pytest.raises(RuntimeError, match="does not fit"):
+        ring.write(0, np.zeros((3, 2, 3), dtype=np.uint8))
+
+
+def test_owner_close_unlinks_the_block():
+    ring = FrameRing.create(1, (1, 1, 3))
+    name = ring.spec[0]
+    ring.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
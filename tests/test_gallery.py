@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services.gallery import ReferenceGallery, normalize_rows
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_match_takes_the_best_row_of_each_person():
+    gallery = ReferenceGallery.from_embeddings(
+        [
+            ("alice", unit(1, 0, 0)),
+            ("alice", unit(0, 1, 0)),
+            ("bob", unit(0, 0, 1)),
+            ("bob", unit(1, 1, 0)),
+            ("carol", unit(1, 0, 1)),
+        ]
+    )
+    queries = np.stack([unit(0, 1, 0), unit(0, 0, 1), unit(1, 0.1, 0.9)])
+
+    best, scores = gallery.match(queries)
+
+    assert [gallery.names[person] for person in best] == ["alice", "bob", "carol"]
+    expected = normalize_rows(queries) @ gallery.matrix.T
+    np.testing.assert_allclose(scores, expected.max(axis=1), rtol=1e-6)
+
+
+def test_person_scores_reduce_rows_per_person():
+    gallery = ReferenceGallery.from_embeddings(
+        [("alice", unit(1, 0)), ("bob", unit(0, 1)), ("alice", unit(1, 1)), ("bob", unit(-1, 1))]
+    )
+    scores = gallery.person_scores(unit(1, 0.2)[None, :])
+
+    assert gallery.names == ["alice", "bob"]
+    assert scores.shape == (1, 2)
+    similarities = normalize_rows(unit(1, 0.2)[None, :]) @ gallery.matrix.T
+    np.testing.assert_allclose(scores[0, 0], similarities[0, gallery.person_index == 0].max(), rtol=1e-6)
+    np.testing.assert_allclose(scores[0, 1], similarities[0, gallery.person_index == 1].max(), rtol=1e-6)
+
+
+def test_match_on_an_empty_gallery_or_batch():
+    empty = ReferenceGallery.from_embeddings([])
+    best, scores = empty.match(unit(1, 0)[None, :])
+    assert best.shape == (0,) and scores.shape == (0,)
+
+    gallery = ReferenceGallery.from_embeddings([("alice", unit(1, 0))])
+    best, scores = gallery.match(np.zeros((0, 2), dtype=np.float32))
+    assert best.shape == (0,) and scores.shape == (0,)
+
+
+def test_subset_keeps_people_and_renumbers_rows():
+    gallery = ReferenceGallery.from_embeddings(
+        [("alice", unit(1, 0, 0)), ("bob", unit(0, 1, 0)), ("carol", unit(0, 0, 1)), ("carol", unit(1, 0, 1))]
+    )
+    subset = gallery.subset(["carol", "alice"])
+
+    assert subset.names == ["alice", "carol"]
+    assert subset.person_index.tolist() == [0, 1, 1]
+    best, _ = subset.match(unit(0.1, 0, 1)[None, :])
+    assert subset.names[best[0]] == "carol"
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.video import ProcessParams, validate_process_params
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def segment_workers(monkeypatch):
+    monkeypatch.setattr(settings, "segment_workers", 4)
+
+
+def rejected(**overrides) -> str:
+    with pytest.raises(HTTPException) as raised:
+        validate_process_params(ProcessParams(**overrides))
+    assert raised.value.status_code == 400
+    return raised.value.detail
+
+
+def test_defaults_are_valid():
+    options = validate_process_params(ProcessParams())
+    assert options["segment_workers"] == 1 and options["face_det_size"] is None
+
+
+@pytest.mark.parametrize(
+    "overrides, detail",
+    [
+        ({"min_confidence": 1.5}, "min_confidence"),
+        ({"frame_interval_sec": 0}, "frame_interval_sec"),
+        ({"yolo_iou": -0.1}, "yolo_iou"),
+        ({"segment_workers": 5}, "between 1 and 4"),
+        ({"yolo_batch_size": 65}, "yolo_batch_size"),
+        ({"idle_tail_sec": 0}, "idle_tail_sec"),
+        ({"detect_max_side": 100}, "detect_max_side"),
+        ({"face_det_size": 150}, "face_det_size"),
+        ({"face_det_size": 650}, "face_det_size"),
+        ({"face_det_size": 1312}, "face_det_size"),
+        ({"timeline_format": "csv"}, "timeline_format"),
+    ],
+)
+def test_out_of_range_values_are_rejected(overrides, detail):
+    assert detail in rejected(**overrides)
+
+
+@pytest.mark.parametrize(
+    "overrides, detail",
+    [
+        ({"shared_decode": True}, "shared_decode requires"),
+        ({"adaptive": True, "segment_workers": 2}, "adaptive mode requires"),
+        ({"index_faces": True, "adaptive": True}, "index_faces requires"),
+        ({"timeline": True, "timeline_format": "jsonl", "segment_workers": 2}, "timeline requires"),
+    ],
+)
+def test_conflicting_options_are_rejected(overrides, detail):
+    assert detail in rejected(**overrides)
+
+
+def test_valid_combinations_pass_through():
+    options = validate_process_params(
+        ProcessParams(segment_workers=4, shared_decode=True, detect_max_side=0, face_det_size=320)
+    )
+    assert options["shared_decode"] and options["face_det_size"] == 320
+    options = validate_process_params(ProcessParams(timeline=True, timeline_format="jsonl"))
+    assert options["timeline"]
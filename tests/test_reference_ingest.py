@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.services.reference_ingest import METADATA_MAX_BYTES, BulkItem, read_zip_archive
+
+
+def archive(entries: dict[str, bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as bundle:
+        for name, data in entries.items():
+            bundle.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def read(entries: dict[str, bytes]) -> tuple[list[BulkItem], dict]:
+    items, metadata = read_zip_archive(archive(entries))
+    return list(items), metadata
+
+
+def test_people_are_named_after_their_directory_or_file():
+    items, metadata = read(
+        {
+            "alice/1.jpg": b"a1",
+            "alice/2.PNG": b"a2",
+            "bob.jpg": b"b",
+            "people/carol/1.jpg": b"c",
+        }
+    )
+
+    assert [(item.index, item.name, item.filename, item.data) for item in items] == [
+        (0, "alice", "alice/1.jpg", b"a1"),
+        (1, "alice", "alice/2.PNG", b"a2"),
+        (2, "bob", "bob.jpg", b"b"),
+        (3, "carol", "people/carol/1.jpg", b"c"),
+    ]
+    assert metadata == {}
+
+
+def test_images_next_to_person_directories_belong_to_nobody():
+    items, _ = read({"people/alice/1.jpg": b"a", "people/group.jpg": b"g"})
+
+    loose = next(item for item in items if item.filename == "people/group.jpg")
+    assert loose.name == "" and loose.data is None
+    assert [item.name for item in items if item.data is not None] == ["alice"]
+
+
+def test_non_images_and_hidden_entries_are_skipped():
+    items, _ = read(
+        {
+            "alice/notes.txt": b"x",
+            "alice/.hidden.jpg": b"x",
+            "__MACOSX/alice/._1.jpg": b"x",
+            "alice/1.jpg": b"a",
+        }
+    )
+    assert [item.filename for item in items] == ["alice/1.jpg"]
+
+
+def test_person_names_are_stripped():
+    items, _ = read({" alice /1.jpg": b"a"})
+    assert items[0].name == "alice"
+    assert BulkItem(0, "  bob\t", "bob.jpg", b"b").name == "bob"
+
+
+def test_oversized_images_have_no_data(monkeypatch):
+    monkeypatch.setattr(settings, "reference_max_mb", 10 / (1024 * 1024))
+    items, _ = read({"alice/small.jpg": b"0123456789", "alice/big.jpg": b"0123456789x"})
+    assert [item.data for item in items] == [b"0123456789", None]
+
+
+def test_metadata_maps_people_to_objects():
+    _, metadata = read({"metadata.json": json.dumps({"alice": {"team": "red"}}).encode(), "alice/1.jpg": b"a"})
+    assert metadata == {"alice": {"team": "red"}}
+
+
+def test_invalid_metadata_is_rejected():
+    with pytest.raises(ValueError, match="must map"):
+        read({"metadata.json": b"[1, 2]"})
+    with pytest.raises(ValueError, match="larger than"):
+        read({"metadata.json": b" " * (METADATA_MAX_BYTES + 1)})
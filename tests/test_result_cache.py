@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+from app.services.gallery import ReferenceGallery
+from app.services.result_cache import ResultCache
+
+PARAMS = {"min_confidence": 0.6, "frame_interval_sec": 1.0, "use_yolo": True, "segment_workers": 1}
+
+
+def gallery(*names: str) -> ReferenceGallery:
+    rng = np.random.default_rng(0)
+    return ReferenceGallery.from_embeddings((name, rng.normal(size=8)) for name in names)
+
+
+def age(cache: ResultCache, key: str, mtime: float) -> None:
+    os.utime(cache.cache_dir / f"{key}.json", (mtime, mtime))
+
+
+def test_key_depends_on_video_gallery_and_result_params(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20, 10)
+    people = gallery("alice", "bob")
+    key = cache.key("a" * 64, people, PARAMS)
+
+    assert cache.key("a" * 64, gallery("alice", "bob"), dict(PARAMS)) == key
+    assert cache.key("b" * 64, people, PARAMS) != key
+    assert cache.key("a" * 64, gallery("alice"), PARAMS) != key
+    assert cache.key("a" * 64, people, {**PARAMS, "min_confidence": 0.7}) != key
+    assert cache.key("a" * 64, people, {**PARAMS, "use_tracking": True}) != key
+
+
+def test_key_ignores_how_the_video_is_scanned(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20, 10)
+    people = gallery("alice")
+    key = cache.key("a" * 64, people, PARAMS)
+
+    scanned = {**PARAMS, "segment_workers": 4, "shared_decode": True, "pipelined": True, "yolo_batch_size": 8}
+    assert cache.key("a" * 64, people, scanned) == key
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResultCache(tmp_path / "results", 1 << 20, 10)
+    results = [{"name": "alice", "confidence": 0.9, "first_seen_sec": 1.5}]
+
+    assert cache.get("missing") is None
+    cache.put("k", results)
+
+    assert cache.get("k") == results
+    assert list((tmp_path / "results").glob("*.tmp")) == []
+
+
+def test_oldest_entries_are_evicted_past_max_entries(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20, 2)
+    for index, key in enumerate(("a", "b")):
+        cache.put(key, [])
+        age(cache, key, 1000.0 + index)
+
+    cache.put("c", [])
+
+    assert cache.get("a") is None
+    assert cache.get("b") == [] and cache.get("c") == []
+
+
+def test_get_refreshes_an_entry(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20, 2)
+    for index, key in enumerate(("a", "b")):
+        cache.put(key, [])
+        age(cache, key, 1000.0 + index)
+
+    cache.get("a")
+    cache.put("c", [])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == []
+
+
+def test_entries_are_evicted_past_max_bytes(tmp_path):
+    payload = [{"name": "x" * 100}]
+    size = len(b'[{"name": "' + b"x" * 100 + b'"}]')
+    cache = ResultCache(tmp_path, size * 2, 10)
+    for index, key in enumerate(("a", "b")):
+        cache.put(key, payload)
+        age(cache, key, 1000.0 + index)
+
+    cache.put("c", payload)
+
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == ["b", "c"]
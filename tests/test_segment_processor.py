@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.segment_processor import merge_first_seen, split_segments
+
+
+def sampled(start: int, end: int, frame_interval: int) -> list[int]:
+    return [frame for frame in range(start, end) if frame % frame_interval == 0]
+
+
+@pytest.mark.parametrize(
+    ("frames_total", "frame_interval", "count"),
+    [(3000, 30, 8), (3001, 30, 8), (100, 7, 3), (95, 10, 4), (10, 1, 10)],
+)
+def test_segments_cover_the_sampled_frames_once(frames_total, frame_interval, count):
+    segments = split_segments(frames_total, frame_interval, count)
+
+    assert len(segments) == min(count, -(-frames_total // frame_interval))
+    assert segments[0][0] == 0
+    assert segments[-1][1] is None
+    for (_, end), (next_start, _) in zip(segments, segments[1:]):
+        assert end == next_start
+    for start, _ in segments:
+        assert start % frame_interval == 0
+    frames = [frame for start, end in segments for frame in sampled(start, end or frames_total, frame_interval)]
+    assert frames == sampled(0, frames_total, frame_interval)
+
+
+def test_segment_count_is_capped_by_the_sampled_frames():
+    assert split_segments(90, 30, 8) == [(0, 30), (30, 60), (60, None)]
+    assert split_segments(50, 100, 4) == [(0, None)]
+
+
+def test_no_segments_for_an_unknown_frame_count():
+    assert split_segments(0, 30, 4) == []
+
+
+def test_merge_keeps_the_earliest_first_sighting():
+    results = {
+        "alice": {"name": "alice", "first_seen_sec": 12.0},
+        "bob": {"name": "bob", "first_seen_sec": 3.0},
+    }
+    segment = {
+        "alice": {"name": "alice", "first_seen_sec": 4.0},
+        "bob": {"name": "bob", "first_seen_sec": 30.0},
+        "carol": {"name": "carol", "first_seen_sec": 31.0},
+    }
+
+    changed = merge_first_seen(results, segment)
+
+    assert sorted(changed) == ["alice", "carol"]
+    assert {name: item["first_seen_sec"] for name, item in results.items()} == {
+        "alice": 4.0,
+        "bob": 3.0,
+        "carol": 31.0,
+    }
+
+
+def test_merge_order_does_not_change_the_result():
+    segments = [
+        {"alice": {"first_seen_sec": 50.0}},
+        {"alice": {"first_seen_sec": 10.0}, "bob": {"first_seen_sec": 20.0}},
+        {"bob": {"first_seen_sec": 70.0}},
+    ]
+    forward: dict[str, dict] = {}
+    backward: dict[str, dict] = {}
+    for segment in segments:
+        merge_first_seen(forward, segment)
+    for segment in reversed(segments):
+        merge_first_seen(backward, segment)
+
+    assert forward == backward == {"alice": {"first_seen_sec": 10.0}, "bob": {"first_seen_sec": 20.0}}
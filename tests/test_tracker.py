@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services.tracker import IouTracker, centroid_distance_matrix, iou_matrix
+
+
+def boxes(*rows: tuple[float, float, float, float]) -> np.ndarray:
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 4)
+
+
+def test_iou_matrix():
+    a = boxes((0, 0, 10, 10), (100, 100, 110, 110))
+    b = boxes((5, 0, 15, 10), (0, 0, 10, 10))
+
+    overlaps = iou_matrix(a, b)
+
+    np.testing.assert_allclose(overlaps, [[50 / 150, 1.0], [0.0, 0.0]], rtol=1e-6)
+
+
+def test_centroid_distance_is_relative_to_the_track_diagonal():
+    distances = centroid_distance_matrix(boxes((0, 0, 30, 40)), boxes((30, 40, 60, 80)))
+    np.testing.assert_allclose(distances, [[1.0]], rtol=1e-6)
+
+
+def test_overlapping_boxes_keep_their_tracks():
+    tracker = IouTracker()
+    first = tracker.update(boxes((0, 0, 100, 200), (300, 0, 400, 200)))
+    second = tracker.update(boxes((310, 5, 410, 205), (5, 0, 105, 200)))
+
+    assert [track.track_id for track in first] == [1, 2]
+    assert [track.track_id for track in second] == [2, 1]
+    assert second[1].hits == 2
+    np.testing.assert_array_equal(second[0].box, [310, 5, 410, 205])
+
+
+def test_best_overlap_wins_a_contested_box():
+    tracker = IouTracker()
+    tracker.update(boxes((0, 0, 100, 100), (60, 0, 160, 100)))
+    assigned = tracker.update(boxes((55, 0, 155, 100)))
+
+    assert assigned[0].track_id == 2
+    assert [track.missed for track in tracker.tracks] == [1, 0]
+
+
+def test_a_box_that_moved_too_far_to_overlap_matches_by_centroid():
+    tracker = IouTracker(iou_threshold=0.3, centroid_ratio=0.5)
+    tracker.update(boxes((0, 0, 100, 100)))
+    # IoU 0.25 is below the threshold, but the centre moved 0.42 of the box diagonal.
+    assigned = tracker.update(boxes((60, 0, 160, 100)))
+    assert assigned[0].track_id == 1
+
+    far = tracker.update(boxes((400, 400, 500, 500)))
+    assert far[0].track_id == 2
+
+
+def test_tracks_are_dropped_after_max_missed_frames():
+    tracker = IouTracker(max_missed=2)
+    tracker.update(boxes((0, 0, 50, 50)))
+    for _ in range(2):
+        tracker.update(boxes())
+    assert [track.track_id for track in tracker.tracks] == [1]
+
+    tracker.update(boxes())
+    assert tracker.tracks == []
+    assert tracker.update(boxes((0, 0, 50, 50)))[0].track_id == 2
+
+
+def test_identity_stays_with_the_track():
+    tracker = IouTracker()
+    track = tracker.update(boxes((0, 0, 100, 100)))[0]
+    track.name, track.confidence = "alice", 0.9
+
+    followed = tracker.update(boxes((10, 0, 110, 100)))[0]
+
+    assert followed is track and followed.identified and followed.name == "alice"